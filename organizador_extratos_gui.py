@@ -15,11 +15,23 @@ import os
 import sys
 import json
 import shutil
+import hashlib
+import sqlite3
 import threading
+import multiprocessing
+import queue
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from collections import deque
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import re
+import fnmatch
+import itertools
+import textwrap
+import urllib.error
+import urllib.request
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 from tkinter.font import Font
@@ -54,8 +66,15 @@ except ImportError:
 
 try:
     import google.generativeai as genai
+    from google.ai import generativelanguage as glm
 except ImportError:
     genai = None
+    glm = None
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:
+    google_exceptions = None
 
 # ==================== SISTEMA DE NOTIFICAÇÕES TOAST ====================
 
@@ -295,62 +314,2156 @@ class ToastNotification:
                 # Reposiciona notificações restantes
                 self.reposition_notifications()
         
-        fade_out()
+        fade_out()
+    
+    def reposition_notifications(self):
+        """Reposiciona as notificações após remoção de uma"""
+        screen_width = self.parent.winfo_screenwidth()
+        
+        for i, notification in enumerate(self.notifications):
+            toast = notification['window']
+            y_offset = self.margin + (i * (self.toast_height + 10))
+            x = screen_width - self.toast_width - self.margin
+            
+            try:
+                toast.geometry(f"{self.toast_width}x{self.toast_height}+{x}+{y_offset}")
+            except:
+                pass  # Janela pode ter sido destruída
+    
+    def clear_all(self):
+        """Remove todas as notificações ativas"""
+        for notification in self.notifications[:]:  # Cópia da lista
+            try:
+                notification['window'].destroy()
+            except:
+                pass
+        self.notifications.clear()
+    
+    def show_success(self, message, duration=3000, action_text=None, action_callback=None):
+        """Atalho para notificação de sucesso"""
+        return self.show(message, 'success', duration, action_text, action_callback)
+    
+    def show_error(self, message, duration=5000, action_text=None, action_callback=None):
+        """Atalho para notificação de erro"""
+        return self.show(message, 'error', duration, action_text, action_callback)
+    
+    def show_warning(self, message, duration=4000, action_text=None, action_callback=None):
+        """Atalho para notificação de aviso"""
+        return self.show(message, 'warning', duration, action_text, action_callback)
+    
+    def show_info(self, message, duration=3000, action_text=None, action_callback=None):
+        """Atalho para notificação informativa"""
+        return self.show(message, 'info', duration, action_text, action_callback)
+    
+    def show_processing(self, message, duration=0, action_text=None, action_callback=None):
+        """Atalho para notificação de processamento (permanente por padrão)"""
+        return self.show(message, 'processing', duration, action_text, action_callback)
+
+# ==================== CONFIGURAÇÕES ====================
+
+# Mapeamento de meses
+MES_NOMES = {
+    1: "01_JANEIRO", 2: "02_FEVEREIRO", 3: "03_MARÇO", 4: "04_ABRIL",
+    5: "05_MAIO", 6: "06_JUNHO", 7: "07_JULHO", 8: "08_AGOSTO",
+    9: "09_SETEMBRO", 10: "10_OUTUBRO", 11: "11_NOVEMBRO", 12: "12_DEZEMBRO"
+}
+
+# Padrões de arquivos para processar
+FILE_PATTERNS = ["*.pdf", "*.ofx"]
+
+# Versão do prompt de análise (incremente ao alterar o prompt para invalidar o cache)
+PROMPT_VERSION = "4"
+
+# Texto extraído de cada arquivo (para o classificador local e a seleção de trechos)
+EXTRACTION_MAX_CHARS = 12000
+
+# Tamanho máximo do trecho enviado à IA por documento
+SNIPPET_MAX_CHARS = 900
+
+# Valores aceitos na análise
+BANCOS_VALIDOS = ("CAIXA", "BANCO_DO_BRASIL")
+TIPOS_CONTA_VALIDOS = ("corrente", "poupanca", "investimento")
+
+# Saída estruturada do Gemini: o modelo responde JSON já no formato esperado
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "banco": {"type": "string", "enum": list(BANCOS_VALIDOS)},
+        "mes": {"type": "integer"},
+        "ano": {"type": "integer"},
+        "tipo_conta": {"type": "string", "enum": list(TIPOS_CONTA_VALIDOS)},
+        "confianca": {"type": "number"},
+    },
+    "required": ["banco", "mes", "ano", "tipo_conta", "confianca"],
+}
+
+# Modelos Gemini aceitos, do preferido para o último recurso
+MODEL_CANDIDATES = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
+
+# Cascata de modelos: o rápido classifica, o avançado só revê os casos duvidosos
+ESCALATION_MODEL = "gemini-1.5-pro"
+
+# Modelos com limites gratuitos bem menores (req/min e req/dia): o seletor não os sorteia
+LOW_QUOTA_MODELS = {'gemini-1.5-pro'}
+
+ANALYSIS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": ANALYSIS_SCHEMA,
+    "temperature": 0,
+}
+
+# Modo lote: vários extratos por requisição, cada um identificado por um ID
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": dict(ANALYSIS_SCHEMA["properties"], id={"type": "string"}),
+        "required": ["id"] + ANALYSIS_SCHEMA["required"],
+    },
+}
+
+BATCH_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": BATCH_ANALYSIS_SCHEMA,
+    "temperature": 0,
+}
+
+# Orçamento de tokens de entrada por lote (estimado localmente: ~4 caracteres por token)
+BATCH_TOKEN_BUDGET = 8000
+
+# ==================== VARREDURA DE ARQUIVOS ====================
+
+class FileScanner:
+    """Varredura de diretórios em passagem única usando os.scandir"""
+    
+    def __init__(self, base_directory, patterns=None, batch_size=500, excluded_dirs=None, ignore_globs=None):
+        self.base_directory = base_directory
+        # Extensões em minúsculas a partir dos padrões ("*.pdf" -> ".pdf")
+        self.extensions = tuple(pattern[1:].lower() for pattern in (patterns or FILE_PATTERNS))
+        self.batch_size = batch_size
+        
+        # Pastas (como a de saída) que nunca devem ser percorridas
+        self.excluded_dirs = {self._normalize(path) for path in (excluded_dirs or [])}
+        # Padrões glob aplicados ao nome e ao caminho relativo de pastas e arquivos
+        self.ignore_globs = [pattern.strip().lower().replace('\\', '/')
+                             for pattern in (ignore_globs or []) if pattern.strip()]
+        
+        self._base_prefix = os.path.join(base_directory, '')
+        
+        self.files_found = []
+        self.file_stats = {}  # Caminho -> (tamanho, mtime_ns) obtidos durante a varredura
+        self.dirs_scanned = 0
+        self.dirs_pruned = 0
+        self._cancel_event = threading.Event()
+        
+    @staticmethod
+    def _normalize(path):
+        """Normaliza um caminho para comparação"""
+        return os.path.normcase(os.path.abspath(path))
+        
+    def _is_ignored(self, entry):
+        """Verifica se a entrada casa com algum padrão de exclusão"""
+        if not self.ignore_globs:
+            return False
+            
+        name = entry.name.lower()
+        rel_path = entry.path[len(self._base_prefix):].replace(os.sep, '/').lower()
+        return any(fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern)
+                   for pattern in self.ignore_globs)
+        
+    def cancel(self):
+        """Solicita o cancelamento da varredura em andamento"""
+        self._cancel_event.set()
+        
+    @property
+    def cancelled(self):
+        """Indica se a varredura foi cancelada"""
+        return self._cancel_event.is_set()
+        
+    def scan(self, on_batch=None):
+        """
+        Percorre a árvore de diretórios uma única vez
+        
+        Args:
+            on_batch: Função chamada com cada lote de caminhos encontrados
+            
+        Returns:
+            Lista ordenada com os caminhos completos dos arquivos
+        """
+        pending_dirs = [self.base_directory]
+        batch = []
+        
+        while pending_dirs and not self.cancelled:
+            current_dir = pending_dirs.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        if self.cancelled:
+                            break
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                # Poda a subárvore inteira antes de descer nela
+                                if self._normalize(entry.path) in self.excluded_dirs or self._is_ignored(entry):
+                                    self.dirs_pruned += 1
+                                else:
+                                    pending_dirs.append(entry.path)
+                            elif (entry.name.lower().endswith(self.extensions) and entry.is_file()
+                                  and not self._is_ignored(entry)):
+                                stat_result = entry.stat()
+                                self.file_stats[entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+                                self.files_found.append(entry.path)
+                                batch.append(entry.path)
+                        except OSError:
+                            continue  # Entrada inacessível, segue para a próxima
+                            
+                        if on_batch and len(batch) >= self.batch_size:
+                            on_batch(batch)
+                            batch = []
+            except OSError:
+                continue  # Sem permissão ou diretório removido durante a varredura
+                
+            self.dirs_scanned += 1
+            
+        if on_batch and batch:
+            on_batch(batch)
+            
+        self.files_found.sort()
+        return self.files_found
+
+# ==================== MANIFESTO DE ARQUIVOS ====================
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """Calcula o hash BLAKE2b do conteúdo do arquivo lendo em blocos"""
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+class FileManifest:
+    """Manifesto persistente com o estado de cada arquivo já processado"""
+    
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.entries = {}  # Caminho -> {size, mtime_ns, hash, outcome, updated_at}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+        
+    @staticmethod
+    def _normalize(file_path):
+        """Normaliza o caminho usado como chave do manifesto"""
+        return os.path.normcase(os.path.abspath(str(file_path)))
+        
+    def load(self):
+        """Carrega o manifesto do disco"""
+        try:
+            if os.path.exists(self.manifest_file):
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+        except Exception as e:
+            print(f"Aviso: Manifesto ignorado - {e}")
+            self.entries = {}
+            
+    def save(self):
+        """Grava o manifesto no disco de forma atômica"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'version': 1, 'files': dict(self.entries)}
+            self._dirty = False
+            
+        temp_file = self.manifest_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_file, self.manifest_file)
+        
+    def get(self, file_path):
+        """Retorna a entrada do manifesto para o arquivo (ou None)"""
+        return self.entries.get(self._normalize(file_path))
+        
+    def is_unchanged(self, file_path, size, mtime_ns):
+        """Verifica se tamanho e data de modificação batem com o manifesto"""
+        entry = self.get(file_path)
+        return entry is not None and entry.get('size') == size and entry.get('mtime_ns') == mtime_ns
+        
+    def record(self, file_path, outcome, content_hash=None, stat_info=None):
+        """
+        Registra o resultado do processamento de um arquivo
+        
+        Args:
+            file_path: Caminho do arquivo original
+            outcome: 'success', 'fallback' (organizado por palpite) ou 'error'
+            content_hash: Hash do conteúdo (calculado se não informado)
+            stat_info: Tupla (tamanho, mtime_ns) já conhecida
+        """
+        if stat_info is None:
+            stat_result = os.stat(file_path)
+            stat_info = (stat_result.st_size, stat_result.st_mtime_ns)
+        if content_hash is None:
+            content_hash = compute_file_hash(file_path)
+            
+        with self._lock:
+            self.entries[self._normalize(file_path)] = {
+                'size': stat_info[0],
+                'mtime_ns': stat_info[1],
+                'hash': content_hash,
+                'outcome': outcome,
+                'updated_at': datetime.now().isoformat(timespec='seconds')
+            }
+            self._dirty = True
+            
+    def count_changed(self, files, file_stats):
+        """Conta arquivos novos, alterados ou com erro sem ler o conteúdo"""
+        changed = 0
+        for file_path in files:
+            entry = self.get(file_path)
+            stat_info = file_stats.get(file_path)
+            if (entry is None or entry.get('outcome') != 'success' or stat_info is None
+                    or not self.is_unchanged(file_path, *stat_info)):
+                changed += 1
+        return changed
+        
+    def compute_delta(self, files, file_stats=None):
+        """
+        Seleciona apenas os arquivos novos, alterados, que falharam antes ou
+        que foram organizados por palpite (fallback)
+        
+        O hash do conteúdo só é recalculado quando tamanho ou data mudaram,
+        evitando reprocessar cópias apenas "tocadas".
+        """
+        file_stats = file_stats or {}
+        delta = []
+        
+        for file_path in files:
+            entry = self.get(file_path)
+            if entry is None or entry.get('outcome') != 'success':
+                delta.append(file_path)
+                continue
+                
+            try:
+                stat_info = file_stats.get(str(file_path))
+                if stat_info is None:
+                    stat_result = os.stat(file_path)
+                    stat_info = (stat_result.st_size, stat_result.st_mtime_ns)
+                    
+                if self.is_unchanged(file_path, *stat_info):
+                    continue
+                    
+                # Data/tamanho mudaram: confere o conteúdo antes de reprocessar
+                content_hash = compute_file_hash(file_path)
+                if content_hash == entry.get('hash'):
+                    self.record(file_path, 'success', content_hash, stat_info)
+                else:
+                    delta.append(file_path)
+            except OSError:
+                delta.append(file_path)
+                
+        return delta
+
+# ==================== DETECÇÃO DE DUPLICATAS ====================
+
+class DuplicateDetector:
+    """Agrupa arquivos idênticos (por tamanho e depois por hash BLAKE2)"""
+    
+    def __init__(self, files, file_stats=None):
+        self.files = [str(f) for f in files]
+        self.file_stats = file_stats or {}
+        self.hashes = {}           # Caminho -> hash (apenas arquivos com tamanho repetido)
+        self.representatives = {}  # Caminho da duplicata -> caminho do representante
+        self.results = {}          # Hash -> análise do representante
+        self.group_count = 0
+        self._lock = threading.Lock()
+        self._ready = {}           # Hash -> evento sinalizado quando o representante termina
+        
+    def build(self, should_continue=None):
+        """
+        Monta os grupos de duplicatas
+        
+        Args:
+            should_continue: Função opcional para interromper o cálculo dos hashes
+            
+        Returns:
+            Número de arquivos que reaproveitarão a análise de outro
+        """
+        # 1ª etapa: agrupa por tamanho (custo de um stat por arquivo)
+        by_size = {}
+        for file_path in self.files:
+            stat_info = self.file_stats.get(file_path)
+            try:
+                size = stat_info[0] if stat_info else os.path.getsize(file_path)
+            except OSError:
+                continue
+            by_size.setdefault(size, []).append(file_path)
+            
+        # 2ª etapa: hash apenas dos arquivos com tamanho repetido
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+                
+            by_hash = {}
+            for file_path in same_size:
+                if should_continue and not should_continue():
+                    return len(self.representatives)
+                try:
+                    content_hash = compute_file_hash(file_path)
+                except OSError:
+                    continue
+                self.hashes[file_path] = content_hash
+                by_hash.setdefault(content_hash, []).append(file_path)
+                
+            for content_hash, group in by_hash.items():
+                if len(group) > 1:
+                    self.group_count += 1
+                    self._ready[content_hash] = threading.Event()
+                    for duplicate in group[1:]:
+                        self.representatives[duplicate] = group[0]
+                        
+        return len(self.representatives)
+        
+    def hash_for(self, file_path):
+        """Retorna o hash já calculado para o arquivo (ou None)"""
+        return self.hashes.get(str(file_path))
+        
+    def representative_of(self, file_path):
+        """Retorna o arquivo cuja análise será reaproveitada (ou None)"""
+        return self.representatives.get(str(file_path))
+        
+    def lookup(self, file_path):
+        """Retorna a análise já obtida para o conteúdo do arquivo (ou None)"""
+        content_hash = self.hash_for(file_path)
+        if content_hash is None:
+            return None
+        with self._lock:
+            analysis = self.results.get(content_hash)
+        return dict(analysis) if analysis else None
+        
+    def wait_for(self, file_path, should_continue=None):
+        """
+        Aguarda o representante do grupo terminar e retorna sua análise
+        
+        Usado no processamento concorrente, quando a cópia pode começar
+        antes de o original ter sido analisado.
+        """
+        if self.representative_of(file_path) is None:
+            return None
+            
+        ready = self._ready.get(self.hash_for(file_path))
+        while ready is not None and not ready.wait(0.2):
+            if should_continue and not should_continue():
+                return None
+        return self.lookup(file_path)
+        
+    def remember(self, file_path, analysis):
+        """Guarda a análise do arquivo e libera as demais cópias do grupo"""
+        content_hash = self.hash_for(file_path)
+        if content_hash is None:
+            return
+            
+        with self._lock:
+            if analysis:
+                self.results.setdefault(content_hash, dict(analysis))
+            ready = self._ready.get(content_hash)
+            
+        # Sinaliza mesmo em caso de falha: a próxima cópia fará a própria análise
+        if ready is not None:
+            ready.set()
+
+# ==================== CLASSIFICADOR LOCAL ====================
+
+class LocalClassifier:
+    """Classificador determinístico de banco, período e tipo de conta por assinaturas"""
+    
+    # Assinaturas por banco: (regex compilada, peso da evidência)
+    BANK_SIGNATURES = {
+        'CAIXA': [
+            (re.compile(r'00\.?360\.?305/?0001-?04'), 0.9),                       # CNPJ
+            (re.compile(r'caixa\s+econ[ôo]mica\s+federal', re.I), 0.85),
+            (re.compile(r'<BANKID>\s*0*104\b', re.I), 0.9),                        # OFX
+            (re.compile(r'\b(?:banco|bco|c[óo]d(?:igo)?\.?)\s*[:\-]?\s*104\b', re.I), 0.5),
+            (re.compile(r'caixa\.gov\.br', re.I), 0.5),
+            (re.compile(r'\bcaixa\b', re.I), 0.2),
+        ],
+        'BANCO_DO_BRASIL': [
+            (re.compile(r'00\.?000\.?000/?0001-?91'), 0.9),                       # CNPJ
+            (re.compile(r'banco\s+do\s+brasil(?:\s+s\.?\s?a\.?)?', re.I), 0.85),
+            (re.compile(r'<BANKID>\s*0*1\b', re.I), 0.9),                          # OFX
+            (re.compile(r'\b(?:banco|bco|c[óo]d(?:igo)?\.?)\s*[:\-]?\s*001\b', re.I), 0.5),
+            (re.compile(r'bb\.com\.br', re.I), 0.5),
+            (re.compile(r'\bbb\b', re.I), 0.15),
+        ],
+    }
+    
+    # Assinaturas por tipo de conta
+    ACCOUNT_SIGNATURES = {
+        'poupanca': [
+            (re.compile(r'poupan[çc]a', re.I), 0.6),
+            (re.compile(r'<ACCTTYPE>\s*SAVINGS', re.I), 0.7),
+            # Conta Caixa com operação 013 (poupança): 1234.013.00012345-6
+            (re.compile(r'\b\d{4}[./\s]013[./\s]\d{8}-?\d\b'), 0.5),
+        ],
+        'investimento': [
+            (re.compile(r'\b(?:investimentos?|fundos?\s+de|aplica[çc](?:[ãa]o|[õo]es)|cdb|lci|lca|rdb|renda\s+fixa)\b', re.I), 0.5),
+            (re.compile(r'<INVSTMTRS>|<INVACCTFROM>', re.I), 0.7),
+        ],
+        'corrente': [
+            (re.compile(r'conta\s+corrente|\bc/c\b', re.I), 0.5),
+            (re.compile(r'<ACCTTYPE>\s*CHECKING', re.I), 0.7),
+            (re.compile(r'\b\d{4}[./\s]00[13][./\s]\d{8}-?\d\b'), 0.4),
+        ],
+    }
+    
+    # Indica que o texto é mesmo um extrato (agência/conta identificadas)
+    ACCOUNT_PATTERN = re.compile(r'ag[êe]ncia\s*[:\-]?\s*\d{3,5}(?:-?[\dxX])?.{0,40}?conta(?:\s+corrente|\s+poupan[çc]a)?\s*[:\-]?\s*[\d.\-]{4,}', re.I | re.S)
+    
+    MONTHS = {
+        'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
+        'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12
+    }
+    MONTH_NAME = r'(jan(?:eiro)?|fev(?:ereiro)?|mar(?:[çc]o)?|abr(?:il)?|mai(?:o)?|jun(?:ho)?|jul(?:ho)?|ago(?:sto)?|set(?:embro)?|out(?:ubro)?|nov(?:embro)?|dez(?:embro)?)'
+    
+    # Assinaturas de período, em ordem de confiabilidade
+    OFX_PERIOD = re.compile(r'<DTSTART>\s*(\d{4})(\d{2})\d{2}', re.I)
+    PERIOD_RANGE = re.compile(r'per[íi]odo\s*(?:de|:)?\s*:?\s*\d{2}/(\d{2})/(\d{4})\s*(?:a|at[ée]|-)\s*\d{2}/\d{2}/\d{4}', re.I)
+    PERIOD_MONTH = re.compile(r'(?:m[êe]s|refer[êe]ncia|compet[êe]ncia|per[íi]odo)\s*(?:de|:)?\s*:?\s*(\d{1,2})/(\d{4})', re.I)
+    PERIOD_NAME = re.compile(r'\b' + MONTH_NAME + r'\s*(?:/|de|-)?\s*(\d{4})\b', re.I)
+    DATE = re.compile(r'\b\d{2}/(\d{2})/(\d{4})\b')
+    # Mês/ano no nome do arquivo: 2024-03, 03_2024, 202403
+    FILE_PERIOD = re.compile(r'(?<!\d)(?:(\d{4})[-_. ]?(\d{2})|(\d{2})[-_. ](\d{4}))(?!\d)')
+    
+    # Linhas de cabeçalho (agência, conta, titular) que ajudam a IA mas não pesam na classificação
+    HEADER_HINT = re.compile(r'ag[êe]ncia|\bconta\b|titular|cliente|extrato|<ACCTID>', re.I)
+    
+    def classify(self, content, file_name=""):
+        """
+        Classifica o extrato a partir do texto extraído
+        
+        Returns:
+            Dicionário no formato da análise da IA com 'confianca' (0-1),
+            ou None se banco ou período não puderem ser identificados
+        """
+        if not content:
+            return None
+            
+        banco, bank_confidence = self._classify_bank(content)
+        mes, ano, period_confidence = self._detect_period(content, file_name)
+        if banco is None or mes is None:
+            return None
+            
+        tipo_conta, type_confidence = self._classify_account(content)
+        
+        # Agência/conta identificadas reforçam que o documento é um extrato
+        if self.ACCOUNT_PATTERN.search(content):
+            bank_confidence = min(1.0, bank_confidence + 0.05)
+            
+        confidence = bank_confidence * period_confidence * type_confidence
+        return {
+            'banco': banco,
+            'mes': mes,
+            'ano': ano,
+            'tipo_conta': tipo_conta,
+            'confianca': round(confidence, 2),
+            'fonte': 'local'
+        }
+        
+    def has_signal(self, content):
+        """Indica se o texto já identifica o banco e o período do cabeçalho (extração pode parar)"""
+        banco, bank_confidence = self._classify_bank(content)
+        if banco is None or bank_confidence < 0.5:
+            return False
+        return self._detect_period(content)[2] >= 0.95
+        
+    def salient_snippet(self, content, max_chars=SNIPPET_MAX_CHARS, max_transaction_lines=5):
+        """
+        Seleciona as linhas mais informativas do texto para o prompt da IA
+        
+        Pontua cada linha pelas mesmas assinaturas da classificação (banco,
+        CNPJ, período, agência/conta, tipo de conta) e monta um trecho
+        compacto, na ordem original, com no máximo `max_chars` caracteres.
+        Linhas de lançamento (só com data) entram em número limitado.
+        """
+        if not content:
+            return ""
+            
+        # Linhas muito longas (comum em PDFs) são quebradas para serem pontuadas por partes
+        lines, seen = [], set()
+        for raw_line in content.splitlines():
+            for line in textwrap.wrap(' '.join(raw_line.split()), 160):
+                if len(line) < 3 or line.lower() in seen:
+                    continue
+                seen.add(line.lower())
+                lines.append(line)
+                
+        scored = [(self._line_score(line), position, line) for position, line in enumerate(lines)]
+        ranked = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], item[1]))
+        
+        selected, used, transaction_lines = set(), 0, 0
+        for score, position, line in ranked:
+            if used + len(line) + 1 > max_chars:
+                continue
+            if score < 0.2:
+                if transaction_lines >= max_transaction_lines:
+                    continue
+                transaction_lines += 1
+            selected.add(position)
+            used += len(line) + 1
+            
+        # Sem nenhuma linha reconhecida: mantém o início do documento
+        if not selected:
+            return "\n".join(lines)[:max_chars]
+            
+        # Inclui as primeiras linhas, onde costuma estar o nome do banco em formatos desconhecidos
+        for position, line in enumerate(lines[:2]):
+            if position not in selected and used + len(line) + 1 <= max_chars:
+                selected.add(position)
+                used += len(line) + 1
+                
+        return "\n".join(lines[position] for position in sorted(selected))
+        
+    def _line_score(self, line):
+        """Pontua o quanto uma linha ajuda a identificar banco, período e tipo de conta"""
+        score = 0.0
+        for signatures in (self.BANK_SIGNATURES, self.ACCOUNT_SIGNATURES):
+            for patterns in signatures.values():
+                score += sum(weight for pattern, weight in patterns if pattern.search(line))
+                
+        if self.OFX_PERIOD.search(line) or self.PERIOD_RANGE.search(line) or self.PERIOD_MONTH.search(line):
+            score += 1.0
+        elif self.PERIOD_NAME.search(line):
+            score += 0.6
+            
+        if self.ACCOUNT_PATTERN.search(line):
+            score += 0.6
+        elif self.HEADER_HINT.search(line):
+            score += 0.3
+            
+        if self.DATE.search(line):
+            score += 0.1
+        return score
+        
+    @staticmethod
+    def _combine(weights):
+        """Combina evidências independentes (noisy-OR)"""
+        remaining = 1.0
+        for weight in weights:
+            remaining *= (1.0 - weight)
+        return 1.0 - remaining
+        
+    def _score(self, signatures, content):
+        """Pontua cada classe pelas assinaturas encontradas no texto"""
+        return {label: self._combine([weight for pattern, weight in patterns if pattern.search(content)])
+                for label, patterns in signatures.items()}
+        
+    def _classify_bank(self, content):
+        """Identifica o banco e a confiança (penalizada por evidências conflitantes)"""
+        scores = self._score(self.BANK_SIGNATURES, content)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        if best_score == 0:
+            return None, 0.0
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return best, max(0.0, best_score - runner_up)
+        
+    def _classify_account(self, content):
+        """Identifica o tipo de conta (corrente quando não há evidência)"""
+        scores = self._score(self.ACCOUNT_SIGNATURES, content)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        if best_score == 0:
+            return 'corrente', 0.85
+        runner_up = ranked[1][1]
+        return best, 0.9 + 0.1 * max(0.0, best_score - runner_up)
+        
+    def _detect_period(self, content, file_name=""):
+        """
+        Identifica mês e ano de referência do extrato
+        
+        Período explícito (OFX, "período"/"referência") é certo. Um mês por
+        extenso solto ("março de 2024") pode ser data de emissão ou de
+        impressão, então só ganha confiança alta quando as datas dos
+        lançamentos ou o nome do arquivo apontam o mesmo mês.
+        """
+        current_year = datetime.now().year
+        
+        def valid(mes, ano):
+            return 1 <= mes <= 12 and 2000 <= ano <= current_year + 1
+            
+        match = self.OFX_PERIOD.search(content)
+        if match:
+            ano, mes = int(match.group(1)), int(match.group(2))
+        else:
+            match = self.PERIOD_RANGE.search(content) or self.PERIOD_MONTH.search(content)
+            if match:
+                mes, ano = int(match.group(1)), int(match.group(2))
+        if match and valid(mes, ano):
+            return mes, ano, 1.0
+                
+        # Mês mais frequente entre as datas dos lançamentos
+        counts = {}
+        for mes_text, ano_text in self.DATE.findall(content):
+            mes, ano = int(mes_text), int(ano_text)
+            if valid(mes, ano):
+                counts[(ano, mes)] = counts.get((ano, mes), 0) + 1
+        dominant = max(counts, key=counts.get) if counts else None
+        
+        match = self.PERIOD_NAME.search(content)
+        if match:
+            mes, ano = self.MONTHS[match.group(1)[:3].lower()], int(match.group(2))
+            if valid(mes, ano):
+                corroborated = dominant == (ano, mes) or (ano, mes) in self._file_name_periods(file_name)
+                return mes, ano, 0.9 if corroborated else 0.7
+                
+        # Sem cabeçalho de período: usa o mês mais frequente entre as datas dos lançamentos
+        if dominant:
+            share = counts[dominant] / sum(counts.values())
+            return dominant[1], dominant[0], 0.6 + 0.3 * share
+            
+        return None, None, 0.0
+        
+    def _file_name_periods(self, file_name):
+        """Pares (ano, mês) citados no nome do arquivo"""
+        name = re.sub(r'[_\-.]+', ' ', os.path.splitext(os.path.basename(file_name or ""))[0])
+        periods = {(int(ano), self.MONTHS[mes[:3].lower()]) for mes, ano in self.PERIOD_NAME.findall(name)}
+        for ano, mes, mes_alt, ano_alt in self.FILE_PERIOD.findall(name):
+            periods.add((int(ano), int(mes)) if ano else (int(ano_alt), int(mes_alt)))
+        return periods
+
+# ==================== EXTRAÇÃO DE TEXTO ====================
+# Funções de módulo (serializáveis) para rodar no pool de processos de extração
+
+_extraction_classifier = None
+
+
+def extract_pdf_text(file_path, max_pages=3):
+    """
+    Extrai texto de arquivo PDF página a página
+    
+    Para assim que o orçamento de caracteres é atingido ou quando banco e
+    período já aparecem no texto; as páginas seguintes nem são
+    interpretadas (o PyPDF2 só lê o conteúdo das páginas acessadas).
+    
+    Returns:
+        Tupla (texto ou None, mensagem de erro ou None)
+    """
+    global _extraction_classifier
+    if _extraction_classifier is None:
+        _extraction_classifier = LocalClassifier()
+    try:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file, strict=False)
+            text = ""
+            for page in itertools.islice(pdf_reader.pages, max_pages):
+                text += (page.extract_text() or "") + "\n"
+                if len(text) >= EXTRACTION_MAX_CHARS or _extraction_classifier.has_signal(text):
+                    break
+            return text[:EXTRACTION_MAX_CHARS], None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_ofx_text(file_path):
+    """Lê o início de um arquivo OFX; retorna (texto ou None, erro ou None)"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            return file.read(EXTRACTION_MAX_CHARS), None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_file_text(file_path):
+    """Extrai o texto conforme a extensão; só o texto compacto volta ao processo principal"""
+    if str(file_path).lower().endswith('.ofx'):
+        return extract_ofx_text(file_path)
+    return extract_pdf_text(file_path)
+
+
+# ==================== CACHE DE CLASSIFICAÇÕES ====================
+
+class ClassificationCache:
+    """Cache persistente (SQLite) das análises da IA com descarte LRU"""
+    
+    def __init__(self, db_file, max_entries=50000):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON analyses (last_access)")
+        self._conn.commit()
+        
+    @staticmethod
+    def make_key(content_hash, model_name, prompt_version=PROMPT_VERSION):
+        """Monta a chave a partir do conteúdo, versão do prompt e modelo"""
+        return f"{content_hash}:{prompt_version}:{model_name}"
+        
+    def get(self, content_hash, model_name):
+        """Retorna a análise em cache (ou None) e atualiza o último acesso"""
+        cache_key = self.make_key(content_hash, model_name)
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM analyses WHERE cache_key = ?",
+                                     (cache_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE analyses SET last_access = ? WHERE cache_key = ?",
+                               (time.time(), cache_key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+        
+    def put(self, content_hash, model_name, result):
+        """Guarda uma análise e descarta as menos usadas se exceder o limite"""
+        cache_key = self.make_key(content_hash, model_name)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (cache_key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (cache_key, json.dumps(result, ensure_ascii=False), now, now))
+            
+            excess = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute("""
+                    DELETE FROM analyses WHERE cache_key IN (
+                        SELECT cache_key FROM analyses ORDER BY last_access ASC LIMIT ?
+                    )
+                """, (excess,))
+            self._conn.commit()
+            
+    def contains(self, content_hash, model_name):
+        """Indica se há análise em cache, sem contar acerto nem atualizar o acesso"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM analyses WHERE cache_key = ?",
+                                      (self.make_key(content_hash, model_name),)).fetchone() is not None
+            
+    def count(self):
+        """Número de análises armazenadas"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            
+    def clear(self):
+        """Remove todas as análises do cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+# ==================== LIMITE DE REQUISIÇÕES ====================
+
+def api_status_code(error):
+    """
+    Status HTTP de uma falha da API (ou None)
+    
+    Usa o tipo da exceção (PermissionDenied, NotFound, ResourceExhausted,
+    InvalidArgument... do google.api_core, HTTPError do urllib); para erros
+    guardados como texto, só vale o código no início da mensagem
+    ("429 Resource exhausted") - números no meio do texto não contam.
+    """
+    if google_exceptions is not None and isinstance(error, google_exceptions.GoogleAPICallError):
+        if error.code is not None:
+            return int(error.code)
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    match = re.match(r'\s*([1-5]\d{2})\b', str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_rate_limit_error(error):
+    """Verifica se o erro da API indica limite de requisições excedido"""
+    return api_status_code(error) == 429
+
+
+class TokenBucket:
+    """Balde de fichas: libera até `rate_per_minute` requisições por minuto"""
+    
+    def __init__(self, rate_per_minute, capacity=1):
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.rate = max(rate_per_minute, 0.01) / 60.0   # Fichas por segundo
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+        
+    def set_rate(self, rate_per_minute):
+        """Altera a taxa mantendo as fichas já acumuladas"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(rate_per_minute, 0.01) / 60.0
+            
+    def try_acquire(self):
+        """Consome uma ficha; retorna 0 se conseguiu ou os segundos até a próxima"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class SharedTokenStore:
+    """
+    Baldes de fichas compartilhados entre instâncias do app (SQLite)
+    
+    Cada chave API tem uma linha com as fichas e o instante da última
+    recarga. A transação BEGIN IMMEDIATE trava o arquivo durante a
+    leitura e o desconto, então todos os processos locais retiram fichas
+    do mesmo balde em vez de cada um seguir o próprio ritmo.
+    """
+    
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(db_file, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key_id TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        
+    def try_acquire(self, key_id, rate_per_second, capacity=1):
+        """Consome uma ficha do balde compartilhado; retorna 0 ou os segundos até a próxima"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute("SELECT tokens, updated_at FROM buckets WHERE key_id = ?",
+                                         (key_id,)).fetchone()
+                tokens = float(capacity) if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate_per_second)
+                wait_time = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait_time = (1 - tokens) / rate_per_second
+                self._conn.execute("INSERT OR REPLACE INTO buckets (key_id, tokens, updated_at) VALUES (?, ?, ?)",
+                                   (key_id, tokens, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait_time
+
+
+class SharedTokenBucket(TokenBucket):
+    """Balde de uma chave guardado no SharedTokenStore (usa o local se o arquivo falhar)"""
+    
+    def __init__(self, store, key_id, rate_per_minute, capacity=1):
+        super().__init__(rate_per_minute, capacity)
+        self.store = store
+        self.key_id = key_id
+        
+    def try_acquire(self):
+        try:
+            return self.store.try_acquire(self.key_id, self.rate, self.capacity)
+        except sqlite3.Error as e:
+            print(f"Aviso: Balde compartilhado indisponível, usando o local - {e}")
+            return super().try_acquire()
+
+
+class AdaptivePacer:
+    """
+    Ritmo adaptativo AIMD de uma chave
+    
+    Acelera de forma aditiva enquanto as chamadas dão certo e reduz pela
+    metade ao receber erro de limite (429), sempre entre o piso e o teto.
+    """
+    
+    def __init__(self, min_rate, max_rate, increase=0.5, decrease=0.5):
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.increase = increase   # req/min somadas a cada sucesso
+        self.decrease = decrease   # Fator aplicado em erro de limite
+        self.rate = max(self.min_rate, self.max_rate / 2)
+        
+    def set_bounds(self, min_rate, max_rate):
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+        return self.rate
+        
+    def on_rate_limit(self):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        return self.rate
+
+
+def is_auth_error(error):
+    """Verifica se o erro indica chave inválida ou sem permissão"""
+    status = api_status_code(error)
+    # A API responde 400 (API_KEY_INVALID) para chaves malformadas
+    return status in (401, 403) or (status == 400 and 'api key not valid' in str(error).lower())
+
+
+def is_daily_quota_error(error):
+    """Verifica se o 429 cita uma métrica de cota diária (não o limite por minuto)"""
+    message = str(error).lower()
+    return api_status_code(error) == 429 and ('perday' in message or 'per day' in message or 'per_day' in message)
+
+
+def is_invalid_argument_error(error):
+    """Verifica se a API recusou o pedido como inválido (status 400)"""
+    return api_status_code(error) == 400
+
+
+def is_blocked_response_error(error):
+    """Verifica se a resposta foi bloqueada (segurança) ou veio sem conteúdo utilizável"""
+    if type(error).__name__ in ('BlockedPromptException', 'StopCandidateException'):
+        return True
+    # response.text levanta ValueError citando o finish_reason quando não há partes na resposta
+    return isinstance(error, ValueError) and 'finish_reason' in str(error)
+
+
+def classify_api_error(error):
+    """
+    Classifica a falha de uma chamada à IA
+    
+    Returns:
+        'rate_limit' (limite por minuto), 'quota' (cota diária esgotada),
+        'permanent' (chave inválida, bloqueio de segurança, pedido inválido),
+        'parse' (resposta ilegível) ou 'transient' (rede, timeout, erro 5xx)
+    """
+    if isinstance(error, json.JSONDecodeError):
+        return 'parse'
+    # "You exceeded your current quota" também aparece nos 429 por minuto;
+    # só a métrica diária (ex.: GenerateRequestsPerDay...) indica cota esgotada
+    if is_daily_quota_error(error):
+        return 'quota'
+    if is_rate_limit_error(error):
+        return 'rate_limit'
+    if (is_auth_error(error) or is_blocked_response_error(error)
+            or is_invalid_argument_error(error) or is_model_not_found_error(error)):
+        return 'permanent'
+    return 'transient'
+
+
+def retry_after_seconds(error):
+    """Extrai o tempo de espera sugerido pela API na mensagem de erro (ou None)"""
+    match = (re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(error))
+             or re.search(r'retry (?:after|in) (\d+(?:\.\d+)?)\s*s', str(error), re.I))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(failures, base=1.0, cap=30.0):
+    """Espera exponencial com jitter completo: aleatória entre 0 e base * 2^falhas (limitada)"""
+    return random.uniform(0, min(cap, base * 2 ** failures))
+
+
+class KeyHealth:
+    """Saúde de uma chave API: sucesso, latência média e pausa (cooldown)"""
+    
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.last_error = None
+        self.cooldown_until = 0.0
+        self.trips = 0  # Quantas vezes o disjuntor abriu seguidamente
+        
+    def success_rate(self):
+        # Suavizada para chaves ainda sem histórico
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+        
+    def score(self):
+        """Maior é melhor: taxa de sucesso penalizada pela latência média"""
+        latency = self.latency_ewma if self.latency_ewma is not None else 2.0
+        return self.success_rate() / (1 + latency / 10)
+
+
+class KeyHealthPool:
+    """
+    Acompanha a saúde de cada chave e indica as melhores disponíveis
+    
+    Chaves em pausa (limite excedido, chave inválida ou falhas seguidas,
+    que abrem o disjuntor) ficam fora da seleção até o cooldown terminar.
+    """
+    
+    FAILURES_TO_OPEN = 3
+    RATE_LIMIT_COOLDOWN = 20
+    QUOTA_COOLDOWN = 3600
+    AUTH_COOLDOWN = 3600
+    BASE_COOLDOWN = 30
+    MAX_COOLDOWN = 600
+    
+    def __init__(self, key_count, alpha=0.3):
+        self.keys = [KeyHealth() for _ in range(key_count)]
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        
+    def add_key(self):
+        """Acrescenta uma chave durante a execução; retorna o índice dela"""
+        with self._lock:
+            self.keys.append(KeyHealth())
+            return len(self.keys) - 1
+        
+    def record_success(self, key_index, latency):
+        with self._lock:
+            health = self.keys[key_index]
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.trips = 0
+            health.cooldown_until = 0.0
+            if health.latency_ewma is None:
+                health.latency_ewma = latency
+            else:
+                health.latency_ewma = self.alpha * latency + (1 - self.alpha) * health.latency_ewma
+                
+    def record_failure(self, key_index, error_class, cooldown=None):
+        """
+        Registra a falha e aplica a pausa correspondente
+        
+        Returns:
+            Segundos de pausa aplicados à chave (0 se continua disponível)
+        """
+        with self._lock:
+            health = self.keys[key_index]
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.last_error = error_class
+            
+            if cooldown is None:
+                if error_class == 'rate_limit':
+                    cooldown = self.RATE_LIMIT_COOLDOWN
+                elif error_class == 'quota':
+                    cooldown = self.QUOTA_COOLDOWN
+                elif error_class == 'auth':
+                    cooldown = self.AUTH_COOLDOWN
+                elif health.consecutive_failures >= self.FAILURES_TO_OPEN:
+                    # Disjuntor aberto: pausas crescentes enquanto a chave continuar falhando
+                    cooldown = min(self.BASE_COOLDOWN * 2 ** health.trips, self.MAX_COOLDOWN)
+                    health.trips += 1
+                else:
+                    cooldown = 0
+                    
+            if cooldown:
+                health.cooldown_until = max(health.cooldown_until, time.monotonic() + cooldown)
+            return cooldown
+            
+    def ranked(self, candidates):
+        """Chaves disponíveis entre os candidatos, da mais saudável para a menos"""
+        now = time.monotonic()
+        with self._lock:
+            available = [i for i in candidates if self.keys[i].cooldown_until <= now]
+            return sorted(available, key=lambda i: -self.keys[i].score())
+            
+    def seconds_until_available(self, candidates):
+        """Tempo até a primeira chave dos candidatos sair da pausa"""
+        now = time.monotonic()
+        with self._lock:
+            return max(0.0, min((self.keys[i].cooldown_until for i in candidates), default=0.0) - now)
+            
+    def summary(self, key_index):
+        """Resumo legível da saúde da chave"""
+        with self._lock:
+            health = self.keys[key_index]
+            total = health.successes + health.failures
+            text = f"{health.successes}/{total} sucesso(s)"
+            if health.latency_ewma is not None:
+                text += f", latência média {health.latency_ewma:.1f}s"
+            if health.last_error:
+                text += f", último erro: {health.last_error}"
+            remaining = health.cooldown_until - time.monotonic()
+            if remaining > 0:
+                text += f", em pausa por {remaining:.0f}s"
+            return text
+
+
+class KeyRateLimiter:
+    """Um balde de fichas por chave API, com ritmo adaptativo por chave"""
+    
+    def __init__(self, key_count, min_rate, max_rate, health=None, available=None, bucket_factory=None):
+        self.pacers = [AdaptivePacer(min_rate, max_rate) for _ in range(key_count)]
+        # bucket_factory(índice, ritmo) permite baldes compartilhados entre processos
+        self.buckets = [bucket_factory(i, pacer.rate) if bucket_factory else TokenBucket(pacer.rate)
+                        for i, pacer in enumerate(self.pacers)]
+        self.health = health
+        self.available = available  # Função índice -> bool (ex.: cota diária restante)
+        self.bucket_factory = bucket_factory
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._next = 0
+        self._lock = threading.Lock()
+        
+    def add_key(self):
+        """
+        Acrescenta uma chave durante a execução; retorna o índice dela
+        
+        Com acompanhamento de saúde, a chave deve ser incluída no pool de
+        saúde antes, para que o índice já exista quando for escolhida.
+        """
+        with self._lock:
+            pacer = AdaptivePacer(self.min_rate, self.max_rate)
+            key_index = len(self.pacers)
+            self.pacers.append(pacer)
+            self.buckets.append(self.bucket_factory(key_index, pacer.rate) if self.bucket_factory
+                                else TokenBucket(pacer.rate))
+            return key_index
+        
+    def set_bounds(self, min_rate, max_rate):
+        """Altera piso e teto (em req/min por chave) durante a execução"""
+        with self._lock:
+            self.min_rate, self.max_rate = min_rate, max_rate
+            for pacer, bucket in zip(self.pacers, self.buckets):
+                pacer.set_bounds(min_rate, max_rate)
+                bucket.set_rate(pacer.rate)
+                
+    def record_success(self, key_index):
+        with self._lock:
+            self.buckets[key_index].set_rate(self.pacers[key_index].on_success())
+            
+    def record_rate_limit(self, key_index):
+        """Reduz o ritmo da chave após erro de limite; retorna o novo ritmo"""
+        with self._lock:
+            rate = self.pacers[key_index].on_rate_limit()
+            self.buckets[key_index].set_rate(rate)
+            return rate
+            
+    def effective_rate(self):
+        """Soma dos ritmos atuais das chaves disponíveis (req/min)"""
+        return sum(pacer.rate for i, pacer in enumerate(self.pacers) if not self.available or self.available(i))
+        
+
+    def acquire(self, exclude=(), should_continue=None):
+        """
+        Aguarda uma ficha na chave mais saudável disponível
+        
+        Sem acompanhamento de saúde, faz rodízio entre as chaves. Chaves em
+        `exclude` só são usadas se nenhuma outra estiver fora de pausa.
+        Retorna o índice da chave ou None se cancelado / sem chaves disponíveis.
+        """
+        while True:
+            if should_continue and not should_continue():
+                return None
+                
+            # Chaves com a cota diária esgotada ficam de fora até o próximo dia
+            all_keys = [i for i in range(len(self.buckets)) if not self.available or self.available(i)]
+            if not all_keys:
+                return None
+            preferred = [i for i in all_keys if i not in exclude] or all_keys
+            
+            with self._lock:
+                start = self._next
+                self._next = (self._next + 1) % len(self.buckets)
+            rotation = sorted(all_keys, key=lambda i: (i - start) % len(self.buckets))
+            
+            if self.health:
+                ordered = self.health.ranked([i for i in rotation if i in preferred]) or self.health.ranked(rotation)
+                if not ordered:
+                    # Todas em pausa: aguarda a primeira voltar (a pausa sempre termina)
+                    time.sleep(min(self.health.seconds_until_available(all_keys), 0.25))
+                    continue
+            else:
+                ordered = [i for i in rotation if i in preferred]
+                
+            shortest_wait = None
+            for key_index in ordered:
+                wait_time = self.buckets[key_index].try_acquire()
+                if wait_time == 0:
+                    return key_index
+                shortest_wait = wait_time if shortest_wait is None else min(shortest_wait, wait_time)
+                
+            # Dorme em fatias curtas para responder rápido ao cancelamento
+            time.sleep(min(shortest_wait, 0.25))
+            
+    def try_acquire(self, exclude=()):
+        """Obtém uma ficha sem esperar, fora das chaves em `exclude` (ou None)"""
+        candidates = [i for i in range(len(self.buckets))
+                      if i not in exclude and (not self.available or self.available(i))]
+        ordered = self.health.ranked(candidates) if self.health else candidates
+        for key_index in ordered:
+            if self.buckets[key_index].try_acquire() == 0:
+                return key_index
+        return None
+
+
+# ==================== PRAZOS E CANCELAMENTO ====================
+
+class RequestCancelled(Exception):
+    """Requisição abandonada porque o processamento foi interrompido"""
+
+
+class LatencyTracker:
+    """
+    Guarda as latências recentes das chamadas à IA
+    
+    O percentil 95 define quando uma requisição é considerada lenta e
+    merece uma cópia (hedge) em outra chave.
+    """
+    
+    def __init__(self, window=50, default=10.0, minimum=2.0):
+        self.samples = deque(maxlen=window)
+        self.default = default
+        self.minimum = minimum
+        self._lock = threading.Lock()
+        
+    def record(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+            
+    def p95(self):
+        """Percentil 95 das latências recentes (padrão enquanto houver poucas amostras)"""
+        with self._lock:
+            if len(self.samples) < 5:
+                return self.default
+            ordered = sorted(self.samples)
+        return max(self.minimum, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+
+
+# ==================== POOL DE CHAVES GEMINI ====================
+
+class GeminiKeyPool:
+    """
+    Mantém um cliente Gemini independente por chave API
+    
+    Evita o genai.configure global: cada chave tem seu próprio cliente,
+    criado uma única vez e reaproveitado, permitindo chamadas simultâneas
+    com chaves diferentes.
+    """
+    
+    def __init__(self):
+        self._clients = {}   # Chave -> GenerativeServiceClient
+        self._models = {}    # (chave, modelo) -> GenerativeModel
+        self._lock = threading.Lock()
+        
+    def client_for(self, api_key):
+        """Retorna (criando se necessário) o cliente da chave"""
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+                self._clients[api_key] = client
+            return client
+            
+    def model_for(self, api_key, model_name):
+        """Retorna o modelo ligado ao cliente da chave"""
+        client = self.client_for(api_key)
+        with self._lock:
+            model = self._models.get((api_key, model_name))
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                # O modelo usa o cliente padrão (global) quando _client está vazio
+                model._client = client
+                self._models[(api_key, model_name)] = model
+            return model
+            
+    def generate(self, api_key, model_name, prompt, **kwargs):
+        """Envia o prompt usando exclusivamente a chave indicada"""
+        return self.model_for(api_key, model_name).generate_content(prompt, **kwargs)
+        
+    def discard(self, api_key):
+        """Descarta o cliente e os modelos de uma chave removida ou inválida"""
+        with self._lock:
+            self._clients.pop(api_key, None)
+            for cache_key in [k for k in self._models if k[0] == api_key]:
+                del self._models[cache_key]
+
+
+# ==================== MODELOS RESOLVIDOS POR CHAVE ====================
+
+def is_structured_output_error(error):
+    """Verifica se o modelo rejeitou a configuração de saída estruturada (JSON/schema)"""
+    message = str(error).lower()
+    return api_status_code(error) == 400 and ('response_mime_type' in message or 'response_schema' in message
+                                              or 'json mode' in message)
+
+
+def is_model_not_found_error(error):
+    """Verifica se o erro da API indica modelo inexistente ou sem suporte (404)"""
+    return api_status_code(error) == 404
+
+
+class ModelResolver:
+    """
+    Cache persistente do modelo que funciona em cada chave API
+    
+    Não faz requisições de teste: a própria análise confirma o modelo.
+    Só avança para o próximo candidato quando a API responde que o modelo
+    não existe; entradas expiram após `ttl_seconds`.
+    """
+    
+    def __init__(self, cache_file, candidates, ttl_seconds=7 * 24 * 3600):
+        self.cache_file = cache_file
+        self.candidates = list(candidates)
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}  # Impressão digital da chave -> {model, resolved_at}
+        self._lock = threading.Lock()
+        self.load()
+        
+    @staticmethod
+    def fingerprint(api_key):
+        """Identifica a chave sem gravá-la em texto puro"""
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        
+    def load(self):
+        """Carrega os modelos resolvidos do disco"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('keys', {})
+        except Exception as e:
+            print(f"Aviso: Cache de modelos ignorado - {e}")
+            self.entries = {}
+            
+    def save(self):
+        """Grava os modelos resolvidos no disco de forma atômica"""
+        with self._lock:
+            data = {'version': 1, 'keys': dict(self.entries)}
+            
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, self.cache_file)
+        
+    def _entry(self, api_key):
+        entry = self.entries.get(self.fingerprint(api_key))
+        if entry and time.time() - entry.get('resolved_at', 0) < self.ttl_seconds:
+            return entry
+        return None
+        
+    def model_for(self, api_key):
+        """Modelo a usar com a chave (o primeiro candidato se ainda não resolvido)"""
+        with self._lock:
+            entry = self._entry(api_key)
+        return entry['model'] if entry else self.candidates[0]
+        
+    def mark_working(self, api_key, model_name):
+        """Registra que o modelo respondeu com a chave (grava só se algo mudou)"""
+        with self._lock:
+            entry = self._entry(api_key)
+            if entry and entry['model'] == model_name and entry.get('verified'):
+                return
+            self.entries[self.fingerprint(api_key)] = {
+                'model': model_name, 'verified': True, 'resolved_at': time.time()
+            }
+        self.save()
+        
+    def mark_not_found(self, api_key, model_name):
+        """
+        Avança para o próximo candidato após erro de modelo inexistente
+        
+        Returns:
+            Próximo modelo a tentar ou None se todos os candidatos falharam
+        """
+        position = self.candidates.index(model_name) if model_name in self.candidates else -1
+        next_model = self.candidates[position + 1] if position + 1 < len(self.candidates) else None
+        
+        with self._lock:
+            if next_model:
+                self.entries[self.fingerprint(api_key)] = {
+                    'model': next_model, 'verified': False, 'resolved_at': time.time()
+                }
+            else:
+                self.entries.pop(self.fingerprint(api_key), None)
+        self.save()
+        return next_model
+        
+    def forget(self, api_key):
+        """Remove o modelo resolvido de uma chave"""
+        with self._lock:
+            removed = self.entries.pop(self.fingerprint(api_key), None)
+        if removed:
+            self.save()
+
+
+class ModelSelector:
+    """
+    Escolhe o modelo de cada chamada por vazão e taxa de respostas válidas
+    
+    Bandido epsilon-guloso: na maior parte das vezes usa o modelo mais rápido
+    (segundos por mil tokens) entre os que mantêm a taxa de respostas válidas
+    acima do mínimo; numa fração das chamadas experimenta outro modelo. As
+    médias são móveis, então a escolha acompanha mudanças de latência do
+    provedor. Modelos inexistentes para uma chave ficam fora para ela e os
+    de cota baixa (`no_explore`) só são usados quando já são os preferidos.
+    """
+    
+    MIN_SAMPLES = 3
+    
+    def __init__(self, candidates, epsilon=0.1, min_pass_rate=0.85, alpha=0.2, no_explore=()):
+        self.candidates = list(candidates)
+        self.no_explore = set(no_explore)
+        self.epsilon = epsilon
+        self.min_pass_rate = min_pass_rate
+        self.alpha = alpha
+        self.models = {}        # Modelo -> {calls, seconds_per_ktoken, validations, pass_rate}
+        self.unavailable = {}   # Chave -> modelos que a API disse não existir
+        self._lock = threading.Lock()
+        
+    def _stats(self, model_name):
+        return self.models.setdefault(model_name, {'calls': 0, 'seconds_per_ktoken': None,
+                                                   'validations': 0, 'pass_rate': None})
+        
+    def _ewma(self, current, value):
+        return value if current is None else (1 - self.alpha) * current + self.alpha * value
+        
+    def record_latency(self, model_name, latency, tokens):
+        """Registra a duração de uma chamada, normalizada pelo tamanho do prompt"""
+        with self._lock:
+            stats = self._stats(model_name)
+            stats['calls'] += 1
+            stats['seconds_per_ktoken'] = self._ewma(stats['seconds_per_ktoken'], latency / max(tokens / 1000, 0.1))
+            
+    def record_validation(self, model_name, passed):
+        """Registra se a resposta do modelo passou na validação"""
+        with self._lock:
+            stats = self._stats(model_name)
+            stats['validations'] += 1
+            stats['pass_rate'] = self._ewma(stats['pass_rate'], 1.0 if passed else 0.0)
+            
+    def mark_unavailable(self, api_key, model_name):
+        with self._lock:
+            self.unavailable.setdefault(api_key, set()).add(model_name)
+            
+    def is_unavailable(self, api_key, model_name):
+        with self._lock:
+            return model_name in self.unavailable.get(api_key, ())
+            
+    def choose(self, api_key, preferred=None):
+        """
+        Modelo para a próxima chamada com a chave
+        
+        Returns:
+            Nome do modelo ou None se nenhum candidato existe para a chave
+        """
+        with self._lock:
+            missing = self.unavailable.get(api_key, set())
+            available = [model for model in self.candidates if model not in missing]
+            if not available:
+                return None
+            if preferred not in available:
+                preferred = available[0]
+                
+            explorable = [model for model in available if model not in self.no_explore or model == preferred]
+            if len(explorable) > 1 and random.random() < self.epsilon:
+                return random.choice(explorable)
+                
+            measured = [model for model in available
+                        if self.models.get(model, {}).get('validations', 0) >= self.MIN_SAMPLES
+                        and self.models[model]['seconds_per_ktoken'] is not None]
+            accurate = [model for model in measured if self.models[model]['pass_rate'] >= self.min_pass_rate]
+            if accurate:
+                return min(accurate, key=lambda model: self.models[model]['seconds_per_ktoken'])
+            if measured and preferred in measured:
+                # Nenhum atinge o mínimo: fica com o mais preciso
+                return max(measured, key=lambda model: self.models[model]['pass_rate'])
+            return preferred
+            
+    def summary(self):
+        """Linhas de resumo por modelo para o relatório final"""
+        with self._lock:
+            lines = []
+            for model, stats in self.models.items():
+                if not stats['calls']:
+                    continue
+                pass_rate = f"{stats['pass_rate']:.0%}" if stats['pass_rate'] is not None else "-"
+                lines.append(f"{model}: {stats['calls']} chamada(s), {stats['seconds_per_ktoken']:.2f}s/mil tokens, "
+                             f"respostas válidas {pass_rate}")
+            return lines
+
+
+# ==================== COTA DIÁRIA POR CHAVE ====================
+
+# As cotas diárias do Gemini reiniciam à meia-noite do horário do Pacífico
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+
+def quota_day():
+    """Dia corrente da cota (AAAA-MM-DD no horário do Pacífico)"""
+    return datetime.now(QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+
+class QuotaLedger:
+    """
+    Registro persistente do uso diário de cada chave API
     
-    def reposition_notifications(self):
-        """Reposiciona as notificações após remoção de uma"""
-        screen_width = self.parent.winfo_screenwidth()
+    Conta requisições e tokens por chave no dia da cota e lembra quais
+    chaves a API declarou esgotadas, para que execuções retomadas não
+    insistam nelas. Os contadores zeram quando o dia da cota muda.
+    """
+    
+    SAVE_EVERY = 10  # Requisições entre gravações em disco
+    
+    def __init__(self, ledger_file, daily_limit=1500):
+        self.ledger_file = ledger_file
+        self.daily_limit = daily_limit
+        self.entries = {}  # Impressão digital da chave -> {day, requests, tokens, exhausted}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.load()
+        
+    def load(self):
+        """Carrega o registro de uso do disco"""
+        try:
+            if os.path.exists(self.ledger_file):
+                with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('keys', {})
+        except Exception as e:
+            print(f"Aviso: Registro de uso das chaves ignorado - {e}")
+            self.entries = {}
+            
+    def save(self):
+        """Grava o registro de uso de forma atômica"""
+        with self._lock:
+            data = {'version': 1, 'keys': dict(self.entries)}
+            self._unsaved = 0
+            
+        temp_file = self.ledger_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, self.ledger_file)
+        
+    def _today(self, api_key):
+        """Entrada do dia atual da chave (recriada quando o dia da cota muda)"""
+        fingerprint = ModelResolver.fingerprint(api_key)
+        entry = self.entries.get(fingerprint)
+        day = quota_day()
+        if not entry or entry.get('day') != day:
+            entry = {'day': day, 'requests': 0, 'tokens': 0, 'exhausted': False}
+            self.entries[fingerprint] = entry
+        return entry
+        
+    def record(self, api_key, tokens=0):
+        """Contabiliza uma requisição atendida e seus tokens"""
+        with self._lock:
+            entry = self._today(api_key)
+            entry['requests'] += 1
+            entry['tokens'] += int(tokens or 0)
+            self._unsaved += 1
+            should_save = self._unsaved >= self.SAVE_EVERY
+        if should_save:
+            self.save()
+            
+    def mark_exhausted(self, api_key, error):
+        """
+        Registra que a API recusou a chave por cota diária esgotada
         
-        for i, notification in enumerate(self.notifications):
-            toast = notification['window']
-            y_offset = self.margin + (i * (self.toast_height + 10))
-            x = screen_width - self.toast_width - self.margin
+        Só marca com o erro citando a métrica diária: um 429 por minuto não
+        pode tirar a chave do resto do dia (a marca é persistida). Sem essa
+        confirmação, a chave só sai quando a contagem atinge o limite diário.
+        
+        Returns:
+            True se a chave foi marcada como esgotada
+        """
+        if not is_daily_quota_error(error):
+            return False
+        with self._lock:
+            self._today(api_key)['exhausted'] = True
+        self.save()
+        return True
+        
+    def remaining(self, api_key):
+        """Requisições ainda disponíveis hoje para a chave"""
+        with self._lock:
+            entry = self._today(api_key)
+            if entry['exhausted']:
+                return 0
+            return max(0, self.daily_limit - entry['requests'])
             
-            try:
-                toast.geometry(f"{self.toast_width}x{self.toast_height}+{x}+{y_offset}")
-            except:
-                pass  # Janela pode ter sido destruída
+    def is_exhausted(self, api_key):
+        return self.remaining(api_key) == 0
+        
+    def usage(self, api_key):
+        """Resumo do uso de hoje (requisições, tokens)"""
+        with self._lock:
+            entry = self._today(api_key)
+            return entry['requests'], entry['tokens']
+
+
+# ==================== TESTE DAS CHAVES ====================
+
+KEY_CHECK_TIMEOUT = 15  # Segundos por chamada de teste
+
+
+def probe_api_key(key_pool, api_key, models, timeout=KEY_CHECK_TIMEOUT):
+    """
+    Testa uma chave com uma requisição mínima
     
-    def clear_all(self):
-        """Remove todas as notificações ativas"""
-        for notification in self.notifications[:]:  # Cópia da lista
-            try:
-                notification['window'].destroy()
-            except:
-                pass
-        self.notifications.clear()
+    Só passa para o próximo modelo quando a API responde que o modelo não
+    existe; outros erros (chave inválida, cota, rede) encerram o teste.
     
-    def show_success(self, message, duration=3000, action_text=None, action_callback=None):
-        """Atalho para notificação de sucesso"""
-        return self.show(message, 'success', duration, action_text, action_callback)
+    Returns:
+        Dicionário com ok, model, latency, error, error_class e checked_at
+    """
+    result = {'ok': False, 'model': None, 'latency': None, 'error': None,
+              'error_class': None, 'checked_at': time.time()}
+    for model_name in models:
+        started = time.monotonic()
+        try:
+            response = key_pool.generate(api_key, model_name, "Responda apenas: OK",
+                                         request_options={'timeout': timeout})
+            if response and response.text and "OK" in response.text:
+                result.update(ok=True, model=model_name, latency=round(time.monotonic() - started, 2),
+                              error=None, error_class=None)
+                return result
+            result['error'] = f"Resposta inesperada de {model_name}"
+        except Exception as e:
+            result['error'] = str(e)
+            result['error_class'] = 'auth' if is_auth_error(e) else classify_api_error(e)
+            if not is_model_not_found_error(e):
+                return result
+    return result
+
+
+class KeyCheckCache:
+    """Resultados persistentes dos testes de chave, válidos por `ttl_seconds`"""
     
-    def show_error(self, message, duration=5000, action_text=None, action_callback=None):
-        """Atalho para notificação de erro"""
-        return self.show(message, 'error', duration, action_text, action_callback)
+    def __init__(self, cache_file, ttl_seconds=6 * 3600):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}  # Impressão digital da chave -> resultado do probe_api_key
+        self._lock = threading.Lock()
+        self.load()
+        
+    def load(self):
+        """Carrega os resultados do disco"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('keys', {})
+        except Exception as e:
+            print(f"Aviso: Resultados de teste das chaves ignorados - {e}")
+            self.entries = {}
+            
+    def save(self):
+        """Grava os resultados de forma atômica"""
+        with self._lock:
+            data = {'version': 1, 'keys': dict(self.entries)}
+            
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, self.cache_file)
+        
+    def get(self, api_key):
+        """Último resultado da chave, se ainda válido"""
+        with self._lock:
+            entry = self.entries.get(ModelResolver.fingerprint(api_key))
+        if entry and time.time() - entry.get('checked_at', 0) < self.ttl_seconds:
+            return entry
+        return None
+        
+    def put(self, api_key, result):
+        with self._lock:
+            self.entries[ModelResolver.fingerprint(api_key)] = result
+            
+    def forget(self, api_key):
+        with self._lock:
+            removed = self.entries.pop(ModelResolver.fingerprint(api_key), None)
+        if removed:
+            self.save()
+
+
+# ==================== JOBS EM LOTE (ASSÍNCRONOS) ====================
+
+# Endereço da API de jobs; pode apontar para um servidor local de testes
+BATCH_JOB_ENDPOINT = os.environ.get('ORGANIZADOR_BATCH_ENDPOINT',
+                                    'https://generativelanguage.googleapis.com/v1beta')
+BATCH_JOB_POLL_SECONDS = 30
+
+
+def rest_schema(schema):
+    """Converte o schema do SDK para o formato REST (tipos em maiúsculas)"""
+    if isinstance(schema, dict):
+        return {key: value.upper() if key == 'type' else rest_schema(value) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [rest_schema(item) for item in schema]
+    return schema
+
+
+class GeminiBatchJobClient:
+    """
+    Cliente mínimo (urllib) da interface assíncrona de jobs em lote do Gemini
     
-    def show_warning(self, message, duration=4000, action_text=None, action_callback=None):
-        """Atalho para notificação de aviso"""
-        return self.show(message, 'warning', duration, action_text, action_callback)
+    O arquivo JSONL de requisições é enviado pela API de arquivos e o job o
+    referencia pelo nome (requisições embutidas no corpo têm limite de
+    tamanho baixo demais para acervos grandes). O job é processado no
+    servidor sem pressa e consultado periodicamente até terminar; as
+    respostas voltam num arquivo JSONL, casadas com o arquivo de origem pela
+    chave de cada requisição.
+    """
     
-    def show_info(self, message, duration=3000, action_text=None, action_callback=None):
-        """Atalho para notificação informativa"""
-        return self.show(message, 'info', duration, action_text, action_callback)
+    FINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED', 'EXPIRED')
     
-    def show_processing(self, message, duration=0, action_text=None, action_callback=None):
-        """Atalho para notificação de processamento (permanente por padrão)"""
-        return self.show(message, 'processing', duration, action_text, action_callback)
+    def __init__(self, api_key, endpoint=None, timeout=60):
+        self.api_key = api_key
+        self.endpoint = (endpoint or BATCH_JOB_ENDPOINT).rstrip('/')
+        # Upload e download usam o mesmo servidor com prefixo próprio: /upload/v1beta, /download/v1beta
+        self.root, self.version = self.endpoint.rsplit('/', 1)
+        self.timeout = timeout
+        
+    def _open(self, url, method, data=None, headers=None):
+        """Executa a requisição; retorna (corpo em bytes, cabeçalhos da resposta)"""
+        request = urllib.request.Request(url, data=data, method=method,
+                                         headers={'x-goog-api-key': self.api_key, **(headers or {})})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{e.code} {e.reason}: {e.read().decode('utf-8', 'ignore')[:300]}")
+            
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        content, _ = self._open(f"{self.endpoint}/{path.lstrip('/')}", method, data,
+                                {'Content-Type': 'application/json'})
+        return json.loads(content.decode('utf-8') or '{}')
+            
+    @staticmethod
+    def build_request(prompt, generation_config=None):
+        """Monta uma requisição generateContent no formato REST"""
+        request = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if generation_config:
+            config = {'temperature': generation_config.get('temperature', 0)}
+            if 'response_mime_type' in generation_config:
+                config['responseMimeType'] = generation_config['response_mime_type']
+            if 'response_schema' in generation_config:
+                config['responseSchema'] = rest_schema(generation_config['response_schema'])
+            request['generationConfig'] = config
+        return request
+        
+    def upload_jsonl(self, file_path, display_name):
+        """
+        Envia o arquivo JSONL de requisições (upload retomável em duas etapas)
+        
+        Returns:
+            Nome do arquivo no servidor (ex.: files/abc123)
+        """
+        size = os.path.getsize(file_path)
+        _, headers = self._open(f"{self.root}/upload/{self.version}/files", 'POST',
+                                json.dumps({'file': {'display_name': display_name}}).encode('utf-8'),
+                                {'Content-Type': 'application/json',
+                                 'X-Goog-Upload-Protocol': 'resumable',
+                                 'X-Goog-Upload-Command': 'start',
+                                 'X-Goog-Upload-Header-Content-Length': str(size),
+                                 'X-Goog-Upload-Header-Content-Type': 'application/jsonl'})
+        upload_url = headers.get('X-Goog-Upload-URL')
+        if not upload_url:
+            raise RuntimeError("Servidor não informou o endereço de upload do arquivo do job")
+            
+        with open(file_path, 'rb') as f:
+            content, _ = self._open(upload_url, 'POST', f,
+                                    {'Content-Length': str(size), 'X-Goog-Upload-Offset': '0',
+                                     'X-Goog-Upload-Command': 'upload, finalize'})
+        return json.loads(content.decode('utf-8'))['file']['name']
+        
+    def submit(self, model_name, input_file, display_name):
+        """
+        Cria o job a partir do arquivo JSONL já enviado
+        
+        Returns:
+            Nome do job no servidor (ex.: batches/123)
+        """
+        body = {'batch': {'display_name': display_name, 'input_config': {'file_name': input_file}}}
+        operation = self._request('POST', f"models/{model_name}:batchGenerateContent", body)
+        return operation['name']
+        
+    def get(self, job_name):
+        return self._request('GET', job_name)
+        
+    def download(self, file_name):
+        """Conteúdo (texto) de um arquivo gerado pelo servidor"""
+        content, _ = self._open(f"{self.root}/download/{self.version}/{file_name}:download?alt=media", 'GET')
+        return content.decode('utf-8')
+        
+    @classmethod
+    def state_of(cls, job):
+        """Estado do job e se ele já terminou"""
+        state = job.get('metadata', {}).get('state') or job.get('state') or 'PENDING'
+        return state, bool(job.get('done')) or state.endswith(cls.FINAL_STATES)
+        
+    @classmethod
+    def succeeded(cls, job):
+        """Indica se o job terminou com sucesso (só então as respostas valem)"""
+        state, done = cls.state_of(job)
+        return done and state.endswith('SUCCEEDED')
+        
+    @staticmethod
+    def error_of(job):
+        """Mensagem de erro de um job que falhou, expirou ou foi cancelado"""
+        error = job.get('error') or job.get('metadata', {}).get('error') or {}
+        return error.get('message') or GeminiBatchJobClient.state_of(job)[0]
+        
+    def results_of(self, job):
+        """Textos das respostas por chave (None para as requisições que falharam)"""
+        output = (job.get('response') or job.get('metadata', {}).get('output')
+                  or job.get('dest') or {})
+        if output.get('responsesFile'):
+            items = [json.loads(line) for line in self.download(output['responsesFile']).splitlines() if line.strip()]
+        else:
+            # Jobs pequenos podem voltar com as respostas embutidas
+            items = output.get('inlinedResponses', {})
+            if isinstance(items, dict):
+                items = items.get('inlinedResponses', [])
+                
+        results = {}
+        for item in items:
+            key = item.get('key') or item.get('metadata', {}).get('key')
+            try:
+                parts = item['response']['candidates'][0]['content']['parts']
+                results[key] = "".join(part.get('text', '') for part in parts)
+            except (KeyError, IndexError, TypeError):
+                results[key] = None
+        return results
 
-# ==================== CONFIGURAÇÕES ====================
 
-# Mapeamento de meses
-MES_NOMES = {
-    1: "01_JANEIRO", 2: "02_FEVEREIRO", 3: "03_MARÇO", 4: "04_ABRIL",
-    5: "05_MAIO", 6: "06_JUNHO", 7: "07_JULHO", 8: "08_AGOSTO",
-    9: "09_SETEMBRO", 10: "10_OUTUBRO", 11: "11_NOVEMBRO", 12: "12_DEZEMBRO"
+# ==================== VALIDAÇÃO DAS RESPOSTAS DA IA ====================
+
+BANCO_ALIASES = {
+    "CAIXA": "CAIXA", "CEF": "CAIXA", "CAIXA_ECONOMICA": "CAIXA",
+    "CAIXA_ECONOMICA_FEDERAL": "CAIXA",
+    "BANCO_DO_BRASIL": "BANCO_DO_BRASIL", "BB": "BANCO_DO_BRASIL",
+    "BRASIL": "BANCO_DO_BRASIL", "BANCO_BRASIL": "BANCO_DO_BRASIL",
 }
 
-# Padrões de arquivos para processar
-FILE_PATTERNS = ["*.pdf", "*.ofx"]
+TIPO_CONTA_ALIASES = {
+    "corrente": "corrente", "conta_corrente": "corrente", "cc": "corrente",
+    "poupanca": "poupanca", "conta_poupanca": "poupanca",
+    "investimento": "investimento", "investimentos": "investimento",
+    "aplicacao": "investimento", "aplicacoes": "investimento", "fundo": "investimento",
+    "fundos": "investimento",
+}
+
+MES_ALIASES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+
+def _normalize_token(value):
+    """Minúsculas, sem acentos, com espaços/hífens trocados por sublinhado"""
+    text = str(value).strip().lower()
+    for accented, plain in (("á", "a"), ("à", "a"), ("â", "a"), ("ã", "a"), ("é", "e"),
+                            ("ê", "e"), ("í", "i"), ("ó", "o"), ("ô", "o"), ("õ", "o"),
+                            ("ú", "u"), ("ç", "c"), (".", "")):
+        text = text.replace(accented, plain)
+    return re.sub(r'[\s\-/]+', '_', text)
+
+
+def _iter_balanced(text, open_char, close_char):
+    """Percorre os trechos com delimitadores balanceados (ignorando os de dentro de strings)"""
+    start = text.find(open_char)
+    while start != -1:
+        depth, in_string, escaped = 0, False, False
+        for position in range(start, len(text)):
+            char = text[position]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == open_char:
+                depth += 1
+            elif char == close_char:
+                depth -= 1
+                if depth == 0:
+                    yield text[start:position + 1]
+                    break
+        start = text.find(open_char, start + 1)
+
+
+def _extract_json(text, expected_type, open_char, close_char):
+    if not text:
+        return None
+        
+    text = text.replace('```json', '').replace('```', '').strip()
+    candidates = [text]
+    candidates.extend(_iter_balanced(text, open_char, close_char))
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, expected_type):
+            return data
+    return None
+
+
+def extract_json_object(text):
+    """
+    Extrai o primeiro objeto JSON de um texto
+    
+    Tolera marcadores de código e texto antes/depois do objeto.
+    Retorna o dicionário ou None se não houver JSON válido.
+    """
+    return _extract_json(text, dict, '{', '}')
+
+
+def extract_json_array(text):
+    """Extrai a primeira lista JSON de um texto (mesma tolerância de extract_json_object)"""
+    data = _extract_json(text, list, '[', ']')
+    if data is None:
+        # Alguns modelos embrulham a lista num objeto ({"resultados": [...]})
+        wrapper = extract_json_object(text)
+        if wrapper:
+            data = next((value for value in wrapper.values() if isinstance(value, list)), None)
+    return data
+
+
+def estimate_tokens(text):
+    """Estimativa local de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+def _integral(value, label):
+    """
+    Converte mês/ano para inteiro
+    
+    Aceita int, float sem parte fracionária (2024.0) e texto numérico ("03",
+    "2024.0"); rejeita bool (True não é mês 1) e frações com ValueError.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"{label} inválido: {value}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{label} inválido: {value}")
+        return int(value)
+    match = re.fullmatch(r'(\d+)(?:\.0*)?', str(value).strip())
+    if match is None:
+        raise ValueError(f"{label} inválido: {value}")
+    return int(match.group(1))
+
+
+def validate_analysis(data):
+    """
+    Valida e normaliza uma análise (banco, mês, ano e tipo de conta)
+    
+    Corrige variações comuns ("Banco do Brasil", "03", "Março", "poupança", ano
+    com 2 dígitos) e rejeita valores fora do domínio com ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Resposta não é um objeto JSON")
+        
+    missing = [key for key in ('banco', 'mes', 'ano', 'tipo_conta') if data.get(key) in (None, '')]
+    if missing:
+        raise ValueError(f"JSON incompleto: faltam {', '.join(missing)}")
+        
+    banco = BANCO_ALIASES.get(_normalize_token(data['banco']).upper())
+    if banco is None:
+        raise ValueError(f"Banco desconhecido: {data['banco']}")
+        
+    mes = data['mes']
+    if isinstance(mes, str):
+        mes = MES_ALIASES.get(_normalize_token(mes), mes)
+    mes = _integral(mes, "Mês")
+    if not 1 <= mes <= 12:
+        raise ValueError(f"Mês fora do intervalo 1-12: {mes}")
+        
+    ano = _integral(data['ano'], "Ano")
+    if ano < 100:
+        ano += 2000
+    if not 1990 <= ano <= datetime.now().year + 1:
+        raise ValueError(f"Ano implausível: {ano}")
+        
+    tipo_conta = TIPO_CONTA_ALIASES.get(_normalize_token(data['tipo_conta']))
+    if tipo_conta is None:
+        raise ValueError(f"Tipo de conta desconhecido: {data['tipo_conta']}")
+        
+    result = dict(data)
+    result.update(banco=banco, mes=mes, ano=ano, tipo_conta=tipo_conta)
+    
+    # Confiança declarada pelo modelo (0-1; aceita também porcentagem); inválida é descartada
+    if 'confianca' in result:
+        try:
+            confianca = float(str(result['confianca']).strip().rstrip('%').replace(',', '.'))
+            if confianca > 1:
+                confianca /= 100
+            result['confianca'] = round(min(max(confianca, 0.0), 1.0), 2)
+        except ValueError:
+            result.pop('confianca')
+    return result
+
+
+# ==================== AGRUPAMENTO EM LOTES ====================
+
+class BatchCollector:
+    """
+    Agrupa pedidos de várias threads numa única chamada
+    
+    Cada thread envia seu item e aguarda; o lote é enviado quando atinge
+    `max_items`, quando o próximo item estouraria `token_budget` ou quando
+    o item mais antigo espera mais que `max_wait` segundos.
+    `process_batch` recebe a lista de itens e retorna uma lista alinhada
+    de resultados (None para os que falharam).
+    """
+    
+    def __init__(self, process_batch, max_items=10, token_budget=BATCH_TOKEN_BUDGET, max_wait=2.0):
+        self.process_batch = process_batch
+        self.max_items = max(1, max_items)
+        self.token_budget = token_budget
+        self.max_wait = max_wait
+        self._pending = []
+        self._pending_tokens = 0
+        self._lock = threading.Lock()
+        
+    def _take(self):
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        return batch
+        
+    def _run(self, batch):
+        try:
+            results = self.process_batch([entry['item'] for entry in batch])
+        except Exception:
+            results = None
+        results = results or []
+        for position, entry in enumerate(batch):
+            entry['result'] = results[position] if position < len(results) else None
+            entry['done'].set()
+            
+    def submit(self, item, tokens, should_continue=None):
+        """Adiciona o item ao lote atual e aguarda seu resultado (None se falhar)"""
+        entry = {'item': item, 'tokens': tokens, 'result': None,
+                 'done': threading.Event(), 'deadline': time.monotonic() + self.max_wait}
+        ready = []
+        with self._lock:
+            # Fecha o lote atual se este item estouraria o orçamento de tokens
+            if self._pending and self._pending_tokens + tokens > self.token_budget:
+                ready.append(self._take())
+            self._pending.append(entry)
+            self._pending_tokens += tokens
+            if len(self._pending) >= self.max_items:
+                ready.append(self._take())
+                
+        for batch in ready:
+            self._run(batch)
+            
+        while not entry['done'].wait(0.2):
+            if should_continue and not should_continue():
+                return None
+            # Lote incompleto há tempo demais: quem esperou envia o que houver
+            if time.monotonic() >= entry['deadline']:
+                with self._lock:
+                    batch = self._take() if entry in self._pending else None
+                if batch:
+                    self._run(batch)
+        return entry['result']
+
 
 # ==================== CLASSE PRINCIPAL GUI ====================
 
@@ -370,6 +2483,9 @@ class OrganizadorExtratosGUI:
         self.load_api_keys()
         self.check_for_checkpoint()
         
+        # Atualizações de interface vindas das threads de processamento
+        self.root.after(50, self._poll_ui_queue)
+        
     def setup_window(self):
         """Configura a janela principal"""
         self.root.title("🏦 Organizador de Extratos Bancários - Gemini AI")
@@ -716,14 +2832,117 @@ class OrganizadorExtratosGUI:
         self.processing = False
         self.processing_log = []
         
-        # Configuração de intervalo entre arquivos (em segundos)
+        # Estado da varredura em segundo plano
+        self.scanning = False
+        self.scanner = None
+        self.scanned_files = []
+        self.scanned_stats = {}
+        
+        # Padrões de pastas/arquivos ignorados na varredura (além da pasta de saída)
+        self.ignore_globs = []
+        self.ignore_globs_var = None  # Será inicializado na interface
+        
+        # Modo incremental: processa apenas arquivos novos ou alterados
+        self.new_files_only = False
+        self.new_files_only_var = None  # Será inicializado na interface
+        
+        # Cascata de modelos: escala para o modelo avançado abaixo desta confiança
+        self.cascade_enabled = True
+        self.escalation_threshold = 0.7
+        self.cascade_var = None               # Será inicializado na interface
+        self.escalation_threshold_var = None  # Será inicializado na interface
+        self.escalation_unavailable = False
+        self.escalation_paused_until = 0.0  # Pausa própria do modelo avançado (limite dele, não da chave)
+        
+        # Prazo por requisição e cópia (hedge) das requisições lentas em outra chave
+        self.request_timeout = 60
+        self.hedging_enabled = True
+        self.request_timeout_var = None  # Será inicializado na interface
+        self.hedging_var = None  # Será inicializado na interface
+        self.latency_tracker = LatencyTracker()
+        self.cancel_event = threading.Event()  # Sinaliza às requisições em andamento que devem parar
+        
+        # Modo lote: vários extratos por requisição ao Gemini
+        self.batch_mode_enabled = False
+        self.batch_size = 10
+        self.batch_mode_var = None  # Será inicializado na interface
+        self.batch_size_var = None  # Será inicializado na interface
+        self.batcher = None
+        
+        # Classificação local antes da IA (apenas casos de baixa confiança vão ao Gemini)
+        self.local_classifier = LocalClassifier()
+        self.local_classifier_enabled = True
+        self.local_confidence_threshold = 0.8
+        self.local_classifier_var = None  # Será inicializado na interface
+        self.local_threshold_var = None   # Será inicializado na interface
+        
+        # Ritmo adaptativo por chave: intervalo mínimo (piso) e máximo (teto) em segundos
         self.processing_interval = 10  # Padrão: 10 segundos (balanceado)
         self.interval_var = None  # Será inicializado na interface
+        self.max_interval = 60
+        self.max_interval_var = None  # Será inicializado na interface
+        
+        # Processamento concorrente: análises simultâneas limitadas por chave
+        self.max_workers = 4
+        self.max_workers_var = None  # Será inicializado na interface
+        
+        # Extração de texto em processos separados (o PyPDF2 prende o GIL)
+        self.extraction_workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.extraction_workers_var = None  # Será inicializado na interface
+        self.extraction_pool = None
+        self.extraction_futures = {}  # Caminho -> extração em andamento no pool
+        self.rate_limiter = None
+        self.key_health = None
+        self.run_keys = []          # Chaves da execução atual (só cresce; o índice identifica a chave)
+        self.retired_keys = set()   # Chaves removidas durante a execução
+        self.stats_lock = threading.RLock()
+        self.key_pool = GeminiKeyPool()
+        self.structured_output_unsupported = set()  # Modelos sem suporte a response_schema
+        self._copy_lock = threading.Lock()
+        self._log_lock = threading.RLock()
+        self.ui_queue = queue.Queue()  # O Tk não é thread-safe: as threads enfileiram, a interface aplica
         
         # Arquivos de configuração no diretório de dados do app
         self.checkpoint_file = os.path.join(self.app_data_dir, "processing_checkpoint.json")
         self.api_keys_file = os.path.join(self.app_data_dir, "api_keys.json")
         self.preferences_file = os.path.join(self.app_data_dir, "preferences.json")
+        self.manifest_file = os.path.join(self.app_data_dir, "file_manifest.json")
+        self.cache_file = os.path.join(self.app_data_dir, "classification_cache.sqlite3")
+        self.model_cache_file = os.path.join(self.app_data_dir, "resolved_models.json")
+        self.usage_file = os.path.join(self.app_data_dir, "api_usage.json")
+        self.rate_store_file = os.path.join(self.app_data_dir, "rate_limits.sqlite3")
+        self.key_check_file = os.path.join(self.app_data_dir, "key_checks.json")
+        self.batch_job_dir = os.path.join(self.app_data_dir, "batch_jobs")
+        self.batch_job_file = os.path.join(self.app_data_dir, "batch_job.json")
+        
+        # Manifesto persistente dos arquivos já processados
+        self.manifest = FileManifest(self.manifest_file)
+        
+        # Cache persistente das análises da IA (chave: conteúdo + prompt + modelo)
+        self.classification_cache = ClassificationCache(self.cache_file)
+        self.run_hashes = {}  # Hashes calculados durante a execução atual
+        
+        # Modelo que funciona em cada chave (evita requisições de teste)
+        self.model_resolver = ModelResolver(self.model_cache_file, MODEL_CANDIDATES)
+        
+        # Escolha do modelo pela vazão medida, desde que a taxa de respostas válidas seja aceitável
+        self.model_selector = ModelSelector(MODEL_CANDIDATES, no_explore=LOW_QUOTA_MODELS)
+        
+        # Uso diário de cada chave, para pular as que já esgotaram a cota
+        self.daily_request_limit = 1500
+        self.daily_limit_var = None  # Será inicializado na interface
+        self.quota_ledger = QuotaLedger(self.usage_file, self.daily_request_limit)
+        
+        # Últimos testes das chaves (exibidos na lista e usados para iniciar a saúde das chaves)
+        self.key_checks = KeyCheckCache(self.key_check_file)
+        self.key_checks_pending = set()  # Chaves com teste em andamento
+        
+        # Fichas das chaves compartilhadas com outras instâncias abertas no computador
+        try:
+            self.token_store = SharedTokenStore(self.rate_store_file)
+        except sqlite3.Error as e:
+            print(f"Aviso: Limite compartilhado entre instâncias desativado - {e}")
+            self.token_store = None
         
         # Sistema de temas
         self.current_theme = "light"  # light ou dark
@@ -772,6 +2991,10 @@ class OrganizadorExtratosGUI:
             'total_files': 0,
             'success': 0,
             'errors': 0,
+            'duplicates': 0,
+            'local_classified': 0,
+            'cache_hits': 0,
+            'api_calls_saved': 0,
             'by_bank': {},
             'by_month': {}
         }
@@ -1110,6 +3333,17 @@ class OrganizadorExtratosGUI:
         Entry(dir_section, textvariable=self.output_directory, 
               font=("Arial", 10)).pack(fill=X, padx=10, pady=(5, 10))
         
+        # Padrões ignorados na varredura
+        Label(dir_section, text="Ignorar pastas/arquivos (padrões separados por vírgula, ex: temp, backup*, *.bak):", 
+              bg=self.colors['background']).pack(anchor=W, padx=10, pady=(5, 5))
+        
+        self.ignore_globs_var = StringVar(value=", ".join(self.ignore_globs))
+        Entry(dir_section, textvariable=self.ignore_globs_var, 
+              font=("Arial", 10)).pack(fill=X, padx=10, pady=(5, 5))
+        
+        Label(dir_section, text="📌 A pasta organizada é sempre ignorada para não reprocessar as cópias", 
+              bg=self.colors['background'], font=("Arial", 9), fg='#666666').pack(anchor=W, padx=10, pady=(0, 10))
+        
         # Seção Configurações de Processamento
         processing_section = LabelFrame(config_frame, text="⚙️ Configurações de Processamento", 
                                        font=("Arial", 12, "bold"), bg='#f8f9fa', fg='#000000')
@@ -1123,6 +3357,10 @@ class OrganizadorExtratosGUI:
               bg='#fff3cd', fg='#856404', font=("Arial", 10, "bold")).pack(pady=2)
         Label(rate_limit_frame, text="• Configure o intervalo entre requests para evitar bloqueios da API", 
               bg='#fff3cd', fg='#856404', font=("Arial", 9)).pack(anchor=W, padx=5)
+        Label(rate_limit_frame, text="• O limite vale por chave: mais chaves = mais arquivos por minuto", 
+              bg='#fff3cd', fg='#856404', font=("Arial", 9)).pack(anchor=W, padx=5)
+        Label(rate_limit_frame, text="• O ritmo se ajusta sozinho entre o piso e o teto: acelera com sucessos, freia em erros 429", 
+              bg='#fff3cd', fg='#856404', font=("Arial", 9)).pack(anchor=W, padx=5)
         Label(rate_limit_frame, text="• Intervalos menores = processamento mais rápido, mas risco de rate limit", 
               bg='#fff3cd', fg='#856404', font=("Arial", 9)).pack(anchor=W, padx=5, pady=(0, 2))
         
@@ -1130,7 +3368,7 @@ class OrganizadorExtratosGUI:
         interval_frame = Frame(processing_section, bg='#f8f9fa')
         interval_frame.pack(fill=X, padx=10, pady=10)
         
-        Label(interval_frame, text="⏱️ Intervalo entre requests da API (segundos):", 
+        Label(interval_frame, text="⏱️ Intervalo mínimo por chave - piso (segundos):", 
               bg='#f8f9fa', font=("Arial", 11, "bold"), fg='#000000').pack(side=LEFT)
         
         # Spinbox para selecionar intervalo
@@ -1151,6 +3389,27 @@ class OrganizadorExtratosGUI:
                                    bg='#28a745', fg='white', font=("Arial", 9))
         apply_interval_btn.pack(side=LEFT, padx=(10, 0))
         
+        # Intervalo máximo (teto do ritmo adaptativo)
+        max_interval_frame = Frame(processing_section, bg='#f8f9fa')
+        max_interval_frame.pack(fill=X, padx=10, pady=(0, 10))
+        
+        Label(max_interval_frame, text="🐢 Intervalo máximo por chave - teto (segundos):", 
+              bg='#f8f9fa', font=("Arial", 11, "bold"), fg='#000000').pack(side=LEFT)
+        
+        self.max_interval_var = IntVar(value=self.max_interval)
+        Spinbox(max_interval_frame, from_=1, to=300, width=8, 
+                textvariable=self.max_interval_var, font=("Arial", 12, "bold"),
+                command=self.update_max_interval, bg='white', fg='#000000',
+                relief='solid', bd=2).pack(side=LEFT, padx=(10, 5))
+        
+        Label(max_interval_frame, text="(usado após erros de limite)", 
+              bg='#f8f9fa', font=("Arial", 10), 
+              fg='#666666').pack(side=LEFT)
+        
+        Button(max_interval_frame, text="✅ Aplicar", 
+               command=self.update_max_interval,
+               bg='#28a745', fg='white', font=("Arial", 9)).pack(side=LEFT, padx=(10, 0))
+        
         # Descrições dos intervalos
         descriptions_frame = Frame(processing_section, bg='#f8f9fa')
         descriptions_frame.pack(fill=X, padx=10, pady=(0, 10))
@@ -1215,6 +3474,124 @@ class OrganizadorExtratosGUI:
                                         bg='#f8f9fa', font=("Arial", 9), fg='#666666')
         self.time_estimate_label.pack(anchor=W, pady=(5, 0))
         
+        # Análises simultâneas
+        workers_frame = Frame(processing_section, bg='#f8f9fa')
+        workers_frame.pack(fill=X, padx=10, pady=(5, 10))
+        
+        Label(workers_frame, text="🧵 Análises simultâneas:", 
+              bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(side=LEFT)
+        
+        self.max_workers_var = IntVar(value=self.max_workers)
+        Spinbox(workers_frame, from_=1, to=16, width=6,
+                textvariable=self.max_workers_var, command=self.update_max_workers,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 5))
+        
+        Label(workers_frame, text="(1-16, respeitando o limite de cada chave)", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#666666').pack(side=LEFT)
+        
+        # Processos de extração
+        extraction_frame = Frame(processing_section, bg='#f8f9fa')
+        extraction_frame.pack(fill=X, padx=10, pady=(0, 10))
+        
+        Label(extraction_frame, text="🧩 Processos de extração de texto:", 
+              bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(side=LEFT)
+        
+        self.extraction_workers_var = IntVar(value=self.extraction_workers)
+        Spinbox(extraction_frame, from_=1, to=os.cpu_count() or 1, width=6,
+                textvariable=self.extraction_workers_var, command=self.update_extraction_workers,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 5))
+        
+        Label(extraction_frame, text=f"(1 = nas threads de análise; {os.cpu_count() or 1} núcleo(s) disponível(is))", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#666666').pack(side=LEFT)
+        
+        # Modo lote
+        batch_frame = Frame(processing_section, bg='#f8f9fa')
+        batch_frame.pack(fill=X, padx=10, pady=(0, 10))
+        
+        self.batch_mode_var = BooleanVar(value=self.batch_mode_enabled)
+        Checkbutton(batch_frame, text="📦 Modo lote: vários extratos por requisição",
+                    variable=self.batch_mode_var, command=self.update_batch_settings,
+                    bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(side=LEFT)
+        
+        Label(batch_frame, text="Documentos por lote:", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#000000').pack(side=LEFT, padx=(15, 0))
+        
+        self.batch_size_var = IntVar(value=self.batch_size)
+        Spinbox(batch_frame, from_=2, to=30, width=6,
+                textvariable=self.batch_size_var, command=self.update_batch_settings,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 0))
+        
+        # Classificação local antes da IA
+        local_frame = Frame(processing_section, bg='#f8f9fa')
+        local_frame.pack(fill=X, padx=10, pady=(5, 10))
+        
+        self.local_classifier_var = BooleanVar(value=self.local_classifier_enabled)
+        Checkbutton(local_frame, text="🧭 Classificar localmente antes da IA (CNPJ, código do banco, cabeçalhos)",
+                    variable=self.local_classifier_var, command=self.update_local_classifier_settings,
+                    bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(anchor=W)
+        
+        threshold_frame = Frame(local_frame, bg='#f8f9fa')
+        threshold_frame.pack(fill=X, pady=(5, 0))
+        
+        Label(threshold_frame, text="Confiança mínima para dispensar a IA (%):", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#000000').pack(side=LEFT)
+        
+        self.local_threshold_var = IntVar(value=int(round(self.local_confidence_threshold * 100)))
+        Spinbox(threshold_frame, from_=50, to=100, increment=5, width=6,
+                textvariable=self.local_threshold_var, command=self.update_local_classifier_settings,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 0))
+        
+        # Cascata de modelos
+        cascade_frame = Frame(processing_section, bg='#f8f9fa')
+        cascade_frame.pack(fill=X, padx=10, pady=(5, 10))
+        
+        self.cascade_var = BooleanVar(value=self.cascade_enabled)
+        Checkbutton(cascade_frame, text=f"🪜 Rever casos duvidosos com {ESCALATION_MODEL}",
+                    variable=self.cascade_var, command=self.update_cascade_settings,
+                    bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(anchor=W)
+        
+        escalation_frame = Frame(cascade_frame, bg='#f8f9fa')
+        escalation_frame.pack(fill=X, pady=(5, 0))
+        
+        Label(escalation_frame, text="Escalar abaixo desta confiança do modelo rápido (%):", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#000000').pack(side=LEFT)
+        
+        self.escalation_threshold_var = IntVar(value=int(round(self.escalation_threshold * 100)))
+        Spinbox(escalation_frame, from_=10, to=100, increment=5, width=6,
+                textvariable=self.escalation_threshold_var, command=self.update_cascade_settings,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 0))
+        
+        # Prazo e hedge das requisições
+        request_frame = Frame(processing_section, bg='#f8f9fa')
+        request_frame.pack(fill=X, padx=10, pady=(5, 10))
+        
+        self.hedging_var = BooleanVar(value=self.hedging_enabled)
+        Checkbutton(request_frame, text="⚡ Repetir requisições lentas em outra chave (vence a primeira resposta)",
+                    variable=self.hedging_var, command=self.update_request_settings,
+                    bg='#f8f9fa', font=("Arial", 10, "bold"), fg='#000000').pack(anchor=W)
+        
+        timeout_frame = Frame(request_frame, bg='#f8f9fa')
+        timeout_frame.pack(fill=X, pady=(5, 0))
+        
+        Label(timeout_frame, text="Tempo limite por requisição (segundos):", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#000000').pack(side=LEFT)
+        
+        self.request_timeout_var = IntVar(value=self.request_timeout)
+        Spinbox(timeout_frame, from_=10, to=300, increment=10, width=6,
+                textvariable=self.request_timeout_var, command=self.update_request_settings,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 0))
+        
+        quota_frame = Frame(request_frame, bg='#f8f9fa')
+        quota_frame.pack(fill=X, pady=(5, 0))
+        
+        Label(quota_frame, text="Limite diário de requisições por chave:", 
+              bg='#f8f9fa', font=("Arial", 9), fg='#000000').pack(side=LEFT)
+        
+        self.daily_limit_var = IntVar(value=self.daily_request_limit)
+        Spinbox(quota_frame, from_=50, to=10000, increment=50, width=6,
+                textvariable=self.daily_limit_var, command=self.update_request_settings,
+                bg='white', fg='#000000', relief='solid', bd=1).pack(side=LEFT, padx=(10, 0))
+        
         # Seção Arquivos Encontrados
         files_section = LabelFrame(config_frame, text="📄 Arquivos Encontrados", 
                                   font=("Arial", 12, "bold"), bg=self.colors['background'])
@@ -1223,8 +3600,14 @@ class OrganizadorExtratosGUI:
         scan_frame = Frame(files_section, bg=self.colors['background'])
         scan_frame.pack(fill=X, padx=10, pady=10)
         
-        Button(scan_frame, text="🔍 Escanear Arquivos", command=self.scan_files,
-               bg=self.colors['primary'], fg='white', font=("Arial", 11, "bold")).pack(side=LEFT)
+        self.scan_button = Button(scan_frame, text="🔍 Escanear Arquivos", command=self.scan_files,
+                                  bg=self.colors['primary'], fg='white', font=("Arial", 11, "bold"))
+        self.scan_button.pack(side=LEFT)
+        
+        self.cancel_scan_button = Button(scan_frame, text="⏹️ Cancelar", command=self.cancel_scan,
+                                         bg=self.colors['secondary'], fg='white', font=("Arial", 10),
+                                         state=DISABLED)
+        self.cancel_scan_button.pack(side=LEFT, padx=(5, 0))
         
         self.files_count_label = Label(scan_frame, text="Nenhum arquivo escaneado ainda", 
                                       bg=self.colors['background'], font=("Arial", 10))
@@ -1334,6 +3717,89 @@ class OrganizadorExtratosGUI:
                                        fg='#666666')
         self.toast_status_label.pack(pady=(10, 0))
         
+    def update_local_classifier_settings(self):
+        """Atualiza as configurações do classificador local e salva nas preferências"""
+        try:
+            self.local_classifier_enabled = self.local_classifier_var.get()
+            threshold = self.local_threshold_var.get()
+            if 50 <= threshold <= 100:
+                self.local_confidence_threshold = threshold / 100
+            else:
+                self.local_threshold_var.set(int(round(self.local_confidence_threshold * 100)))
+            self.save_preferences()
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar classificador local - {e}")
+        
+    def update_max_workers(self):
+        """Atualiza o número de análises simultâneas e salva nas preferências"""
+        try:
+            workers = self.max_workers_var.get()
+            if 1 <= workers <= 16:
+                self.max_workers = workers
+                self.save_preferences()
+            else:
+                self.max_workers_var.set(self.max_workers)
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar análises simultâneas - {e}")
+            
+    def update_extraction_workers(self):
+        """Atualiza o número de processos de extração e salva nas preferências"""
+        try:
+            workers = self.extraction_workers_var.get()
+            if 1 <= workers <= (os.cpu_count() or 1):
+                self.extraction_workers = workers
+                self.save_preferences()
+            else:
+                self.extraction_workers_var.set(self.extraction_workers)
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar processos de extração - {e}")
+            
+    def update_cascade_settings(self):
+        """Atualiza as configurações da cascata de modelos e salva nas preferências"""
+        try:
+            self.cascade_enabled = self.cascade_var.get()
+            threshold = self.escalation_threshold_var.get()
+            if 10 <= threshold <= 100:
+                self.escalation_threshold = threshold / 100
+            else:
+                self.escalation_threshold_var.set(int(round(self.escalation_threshold * 100)))
+            self.save_preferences()
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar cascata de modelos - {e}")
+            
+    def update_request_settings(self):
+        """Atualiza o prazo por requisição e o hedge e salva nas preferências"""
+        try:
+            self.hedging_enabled = self.hedging_var.get()
+            timeout = self.request_timeout_var.get()
+            if 10 <= timeout <= 300:
+                self.request_timeout = timeout
+            else:
+                self.request_timeout_var.set(self.request_timeout)
+            daily_limit = self.daily_limit_var.get()
+            if 50 <= daily_limit <= 10000:
+                self.daily_request_limit = daily_limit
+                self.quota_ledger.daily_limit = daily_limit
+            else:
+                self.daily_limit_var.set(self.daily_request_limit)
+            self.save_preferences()
+            self.update_time_estimate()
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar prazo das requisições - {e}")
+            
+    def update_batch_settings(self):
+        """Atualiza as configurações do modo lote e salva nas preferências"""
+        try:
+            self.batch_mode_enabled = self.batch_mode_var.get()
+            size = self.batch_size_var.get()
+            if 2 <= size <= 30:
+                self.batch_size = size
+            else:
+                self.batch_size_var.set(self.batch_size)
+            self.save_preferences()
+        except Exception as e:
+            print(f"Aviso: Erro ao atualizar modo lote - {e}")
+            
     def toggle_toast_from_ui(self):
         """Toggle das notificações toast via interface"""
         self.toast_enabled = self.toast_enabled_var.get()
@@ -1402,6 +3868,20 @@ class OrganizadorExtratosGUI:
                                  font=("Arial", 14, "bold"), height=2, state=DISABLED)
         self.stop_button.pack(side=LEFT)
         
+        self.batch_job_button = Button(control_frame, text="🗂️ Job em Lote", 
+                                       command=self.start_batch_job,
+                                       bg=self.colors['primary'], fg='white', 
+                                       font=("Arial", 11, "bold"), height=2)
+        self.batch_job_button.pack(side=LEFT, padx=(10, 0))
+        
+        # Modo incremental baseado no manifesto
+        self.new_files_only_var = BooleanVar(value=self.new_files_only)
+        Checkbutton(control_frame, text="🆕 Apenas arquivos novos ou alterados",
+                    variable=self.new_files_only_var,
+                    command=self.toggle_new_files_only,
+                    bg=self.colors['background'],
+                    font=("Arial", 10, "bold")).pack(side=LEFT, padx=(20, 0))
+        
         # Barra de progresso
         progress_frame = LabelFrame(process_frame, text="📊 Progresso", 
                                    font=("Arial", 12, "bold"), bg=self.colors['background'])
@@ -1426,6 +3906,11 @@ class OrganizadorExtratosGUI:
                                                  bg='#1e1e1e', fg='#ffffff')
         self.log_text.pack(fill=BOTH, expand=True, padx=10, pady=10)
         
+    def toggle_new_files_only(self):
+        """Alterna o modo de processamento apenas de arquivos novos"""
+        self.new_files_only = self.new_files_only_var.get()
+        self.save_preferences()
+        
     def setup_results_tab(self):
         """Configura a aba de resultados"""
         results_frame = Frame(self.notebook, bg=self.colors['background'])
@@ -1466,7 +3951,11 @@ class OrganizadorExtratosGUI:
         
         Button(actions_buttons, text="👁️ Ver Checkpoint",
                command=self.view_checkpoint,
-               bg=self.colors['primary'], fg='white', font=("Arial", 10)).pack(side=LEFT)
+               bg=self.colors['primary'], fg='white', font=("Arial", 10)).pack(side=LEFT, padx=(0, 10))
+        
+        Button(actions_buttons, text="🧹 Limpar Cache IA",
+               command=self.clear_classification_cache,
+               bg=self.colors['secondary'], fg='white', font=("Arial", 10)).pack(side=LEFT)
         
     def setup_modern_status_frame(self, parent):
         """Configura a barra de status moderna"""
@@ -1514,6 +4003,13 @@ class OrganizadorExtratosGUI:
                                font=Font(family="Segoe UI", size=9))
         self.time_label.pack(side=RIGHT)
         
+        # Indicador do ritmo efetivo (visível durante o processamento)
+        self.rate_label = Label(indicators_frame, text="",
+                               bg='#f8f9fa' if self.current_theme == 'light' else '#2d2d30',
+                               fg='#6c757d' if self.current_theme == 'light' else '#9cdcfe',
+                               font=Font(family="Segoe UI", size=9))
+        self.rate_label.pack(side=RIGHT, padx=(0, 15))
+        
         # Atualiza o relógio a cada minuto
         self.update_clock()
         
@@ -1563,41 +4059,65 @@ class OrganizadorExtratosGUI:
         if new_key in self.api_keys:
             messagebox.showwarning("Aviso", "Esta chave já foi adicionada!")
             return
+        if new_key in self.key_checks_pending:
+            self.show_toast_notification("⏳ Esta chave ainda está sendo testada", "INFO")
+            return
             
-        # Testa a chave antes de adicionar
+        # Testa a chave em segundo plano antes de adicionar (até um prazo por modelo)
+        self.key_checks_pending.add(new_key)
+        self.api_status_label.config(text="⏳ Testando a nova chave...")
+        check_queue = queue.Queue()
+        
+        def run_probe():
+            try:
+                check_queue.put(probe_api_key(self.key_pool, new_key, MODEL_CANDIDATES))
+            except Exception as e:
+                check_queue.put(e)
+                
+        threading.Thread(target=run_probe, daemon=True).start()
+        self.root.after(100, lambda: self._poll_new_key_check(check_queue, new_key))
+        
+    def _poll_new_key_check(self, check_queue, new_key):
+        """Aguarda o teste da nova chave sem travar a interface"""
         try:
-            genai.configure(api_key=new_key)
-            
-            # Tenta diferentes modelos disponíveis
-            models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-            model_worked = False
-            
-            for model_name in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    response = model.generate_content("Responda apenas: OK")
-                    
-                    if response and response.text and "OK" in response.text:
-                        model_worked = True
-                        break
-                except Exception as model_error:
-                    continue  # Tenta próximo modelo
+            check = check_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(100, lambda: self._poll_new_key_check(check_queue, new_key))
+            return
+        self.key_checks_pending.discard(new_key)
+        self.api_status_label.config(text=f"{len(self.api_keys)} chave(s) configurada(s)")
+        self._finish_add_api_key(new_key, check)
+        
+    def _finish_add_api_key(self, new_key, check):
+        """Adiciona a chave testada ou informa o motivo da recusa"""
+        try:
+            if isinstance(check, Exception):
+                raise check
+            model_name = check['model']
             
-            if model_worked:
+            if check['ok']:
+                self.model_resolver.mark_working(new_key, model_name)
+                self.key_checks.put(new_key, check)
+                self.key_checks.save()
                 self.api_keys.append(new_key)
                 self.save_api_keys()
                 self.update_keys_display()
+                self.attach_key_to_run(new_key)
                 self.new_api_key.set("")
                 messagebox.showinfo("Sucesso", f"✅ Chave adicionada e testada com sucesso!\nModelo usado: {model_name}")
                 self.status_label.config(text=f"{len(self.api_keys)} chave(s) configurada(s)")
+            elif check['error'] and not is_model_not_found_error(check['error']):
+                raise RuntimeError(check['error'])
             else:
+                self.key_pool.discard(new_key)
                 messagebox.showerror("Erro", "Chave inválida ou modelos indisponíveis.\nVerifique se a chave está correta e se o Gemini está disponível na sua região.")
                 
         except Exception as e:
+            self.key_pool.discard(new_key)
             error_msg = str(e)
-            if "404" in error_msg:
+            if is_model_not_found_error(e):
                 messagebox.showerror("Erro de API", "Modelo não encontrado.\nO Gemini pode não estar disponível na sua região.\nTente usar VPN ou aguarde disponibilidade.")
-            elif "403" in error_msg:
+            elif is_auth_error(e):
                 messagebox.showerror("Erro de API", "Chave API inválida ou sem permissões.\nVerifique se a chave está correta.")
             else:
                 messagebox.showerror("Erro de API", f"Erro ao testar chave:\n{error_msg}")
@@ -1612,6 +4132,10 @@ class OrganizadorExtratosGUI:
         index = selection[0]
         if messagebox.askyesno("Confirmar", "Deseja remover a chave selecionada?"):
             removed_key = self.api_keys.pop(index)
+            self.detach_key_from_run(removed_key)
+            self.key_pool.discard(removed_key)
+            self.model_resolver.forget(removed_key)
+            self.key_checks.forget(removed_key)
             self.save_api_keys()
             self.update_keys_display()
             
@@ -1623,99 +4147,126 @@ class OrganizadorExtratosGUI:
             self.status_label.config(text=f"{len(self.api_keys)} chave(s) configurada(s)")
             
     def test_selected_api(self):
-        """Testa a chave API selecionada"""
+        """Testa a chave API selecionada em segundo plano"""
         selection = self.keys_listbox.curselection()
         if not selection:
             messagebox.showwarning("Aviso", "Selecione uma chave para testar!")
             return
             
-        index = selection[0]
-        api_key = self.api_keys[index]
+        self.start_key_checks([self.api_keys[selection[0]]])
+        
+    def test_all_apis(self):
+        """Testa todas as chaves API em paralelo, sem travar a janela"""
+        if not self.api_keys:
+            messagebox.showwarning("Aviso", "Nenhuma chave configurada!")
+            return
+            
+        self.start_key_checks(list(self.api_keys))
         
-        try:
-            genai.configure(api_key=api_key)
+    def start_key_checks(self, keys):
+        """
+        Dispara os testes das chaves num pool em segundo plano
+        
+        Cada chave tem prazo próprio; a lista é atualizada à medida que os
+        resultados chegam e eles ficam guardados para o próximo processamento.
+        """
+        keys = [key for key in keys if key not in self.key_checks_pending]
+        if not keys:
+            self.show_toast_notification("⏳ Os testes dessas chaves ainda estão em andamento", "INFO")
+            return
             
-            # Tenta diferentes modelos disponíveis
-            models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-            model_worked = False
+        self.key_checks_pending.update(keys)
+        self.update_keys_display()
+        self.api_status_label.config(text=f"⏳ Testando {len(keys)} chave(s)...")
+        check_queue = queue.Queue()
+        
+        def run_checks():
+            with ThreadPoolExecutor(max_workers=min(8, len(keys)), thread_name_prefix="teste-chave") as executor:
+                futures = {executor.submit(probe_api_key, self.key_pool, key,
+                                           self.model_candidates_for(key)): key for key in keys}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        check_queue.put((key, future.result()))
+                    except Exception as e:
+                        check_queue.put((key, {'ok': False, 'error': str(e), 'error_class': classify_api_error(e),
+                                               'model': None, 'latency': None, 'checked_at': time.time()}))
+            check_queue.put(None)
             
-            for model_name in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    response = model.generate_content("Responda apenas: OK")
+        threading.Thread(target=run_checks, daemon=True).start()
+        self.root.after(100, lambda: self._poll_key_checks(check_queue, keys, []))
+        
+    def model_candidates_for(self, api_key):
+        """Modelos a testar: o já resolvido para a chave primeiro"""
+        resolved = self.model_resolver.model_for(api_key)
+        return [resolved] + [model for model in MODEL_CANDIDATES if model != resolved]
+        
+    def _poll_key_checks(self, check_queue, keys, results):
+        """Aplica na interface os resultados dos testes que já chegaram"""
+        try:
+            while True:
+                item = check_queue.get_nowait()
+                if item is None:
+                    self._finish_key_checks(keys, results)
+                    return
                     
-                    if response and response.text and "OK" in response.text:
-                        model_worked = True
-                        break
-                except Exception:
-                    continue
+                key, check = item
+                self.key_checks_pending.discard(key)
+                self.key_checks.put(key, check)
+                if check['ok']:
+                    self.model_resolver.mark_working(key, check['model'])
+                    self.quota_ledger.record(key)
+                elif check.get('error_class') == 'quota':
+                    self.quota_ledger.mark_exhausted(key, check.get('error'))
+                results.append(check)
+                self.update_keys_display()
+                self.api_status_label.config(text=f"⏳ Testando chaves... {len(results)}/{len(keys)}")
+        except queue.Empty:
+            pass
             
-            if model_worked:
-                messagebox.showinfo("Sucesso", f"✅ Chave {index + 1} funcionando!\nModelo: {model_name}")
-                self.api_status_label.config(text=f"Chave {index + 1}: ✅ OK")
-                # Toast de sucesso no teste
-                self.show_toast_notification(f"✅ Chave API {index + 1} testada com sucesso! Modelo: {model_name}", "SUCCESS")
-            else:
-                messagebox.showerror("Erro", f"Chave {index + 1}: Modelos indisponíveis")
-                self.api_status_label.config(text=f"Chave {index + 1}: ❌ Erro")
-                # Toast de erro no teste
-                self.show_toast_notification(f"❌ Chave API {index + 1}: Modelos indisponíveis", "ERROR")
+        self.root.after(100, lambda: self._poll_key_checks(check_queue, keys, results))
+        
+    def _finish_key_checks(self, keys, results):
+        """Resume os testes concluídos"""
+        try:
+            self.key_checks.save()
         except Exception as e:
-            messagebox.showerror("Erro de API", f"Chave {index + 1} falhou:\n{str(e)}")
-            self.api_status_label.config(text=f"Chave {index + 1}: ❌ Falhou")
-            # Toast de falha no teste
-            self.show_toast_notification(f"❌ Chave API {index + 1} falhou no teste", "ERROR")
+            print(f"Aviso: Erro ao salvar resultados dos testes - {e}")
             
-    def test_all_apis(self):
-        """Testa todas as chaves API"""
-        if not self.api_keys:
-            messagebox.showwarning("Aviso", "Nenhuma chave configurada!")
+        working_keys = sum(1 for check in results if check['ok'])
+        failed_keys = len(results) - working_keys
+        
+        if len(keys) == 1:
+            check = results[0] if results else {'ok': False, 'error': 'sem resposta'}
+            label = f"Chave {self.api_keys.index(keys[0]) + 1}" if keys[0] in self.api_keys else "Chave"
+            if check['ok']:
+                self.api_status_label.config(text=f"{label}: ✅ OK ({check['latency']:.1f}s)")
+                self.show_toast_notification(f"✅ {label} testada com sucesso! Modelo: {check['model']}", "SUCCESS")
+            else:
+                self.api_status_label.config(text=f"{label}: ❌ Falhou")
+                self.show_toast_notification(f"❌ {label} falhou no teste: {check['error'][:80]}", "ERROR", duration=6000)
             return
             
-        working_keys = 0
-        failed_keys = 0
-        
-        for i, api_key in enumerate(self.api_keys):
-            try:
-                genai.configure(api_key=api_key)
-                
-                # Tenta diferentes modelos disponíveis
-                models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-                model_worked = False
-                
-                for model_name in models_to_try:
-                    try:
-                        model = genai.GenerativeModel(model_name)
-                        response = model.generate_content("Responda apenas: OK")
-                        
-                        if response and response.text and "OK" in response.text:
-                            model_worked = True
-                            break
-                    except Exception:
-                        continue
-                
-                if model_worked:
-                    working_keys += 1
-                else:
-                    failed_keys += 1
-            except Exception:
-                failed_keys += 1
-                
-        result_msg = f"Resultado dos testes:\n\n"
-        result_msg += f"✅ Chaves funcionando: {working_keys}\n"
-        result_msg += f"❌ Chaves com problema: {failed_keys}\n"
-        result_msg += f"📊 Total: {len(self.api_keys)} chaves"
-        
         if working_keys > 0:
-            messagebox.showinfo("Resultado dos Testes", result_msg)
-            # Toast de sucesso no teste de todas as chaves
-            self.show_toast_notification(f"✅ Teste concluído: {working_keys} chaves funcionando de {len(self.api_keys)}", "SUCCESS")
+            self.show_toast_notification(f"✅ Teste concluído: {working_keys} chaves funcionando de {len(keys)}", "SUCCESS")
         else:
-            messagebox.showerror("Erro", result_msg + "\n\n⚠️ Nenhuma chave está funcionando!")
-            # Toast de erro no teste de todas as chaves
             self.show_toast_notification(f"❌ Nenhuma chave API está funcionando! Verifique suas configurações.", "ERROR", duration=8000)
             
-        self.api_status_label.config(text=f"{working_keys}/{len(self.api_keys)} chaves funcionando")
+        self.api_status_label.config(text=f"{working_keys}/{len(keys)} chaves funcionando"
+                                          + (f" - {failed_keys} com problema" if failed_keys else ""))
+        
+    def key_status_text(self, api_key):
+        """Situação da chave exibida na lista (teste em andamento ou último resultado)"""
+        if api_key in self.key_checks_pending:
+            return " - ⏳ testando..."
+        check = self.key_checks.get(api_key)
+        if not check:
+            return ""
+        if check['ok']:
+            return f" - ✅ {check['latency']:.1f}s ({check['model']})"
+        labels = {'auth': "chave inválida", 'quota': "cota esgotada", 'rate_limit': "limite atingido",
+                  'transient': "sem resposta"}
+        return f" - ❌ {labels.get(check.get('error_class'), 'erro')}"
             
     def select_input_directory(self):
         """Seleciona o diretório de entrada"""
@@ -1724,43 +4275,178 @@ class OrganizadorExtratosGUI:
             self.base_directory.set(directory)
             self.status_label.config(text=f"Diretório selecionado: {os.path.basename(directory)}")
             
-    def scan_files(self):
-        """Escaneia arquivos no diretório selecionado"""
+    def scan_files(self, on_complete=None):
+        """
+        Escaneia arquivos no diretório selecionado em segundo plano
+        
+        Args:
+            on_complete: Função chamada com a lista de arquivos ao final da varredura
+        """
+        if self.scanning:
+            return
+            
         if not os.path.exists(self.base_directory.get()):
             messagebox.showerror("Erro", "Diretório não existe!")
             return
             
         self.files_listbox.delete(0, END)
-        files_found = []
-        
-        for pattern in FILE_PATTERNS:
-            extension = pattern[1:]  # Remove '*'
-            for root, dirs, files in os.walk(self.base_directory.get()):
-                for file in files:
-                    if file.lower().endswith(extension):
-                        full_path = os.path.join(root, file)
-                        files_found.append(full_path)
-                        
-        files_found.sort()
+        self.scanned_files = []
+        self.scanned_stats = {}
+        self.scanning = True
+        self.scan_button.config(state=DISABLED)
+        self.cancel_scan_button.config(state=NORMAL)
+        self.files_count_label.config(text="Escaneando... 0 arquivos")
+        self.status_label.config(text="🔍 Escaneando arquivos...")
+        
+        self.update_ignore_globs()
+        output_path = os.path.join(self.base_directory.get(), self.output_directory.get())
+        self.scanner = FileScanner(self.base_directory.get(),
+                                   excluded_dirs=[output_path],
+                                   ignore_globs=self.ignore_globs)
+        scan_queue = queue.Queue()
+        
+        def run_scan(scanner):
+            try:
+                files = scanner.scan(on_batch=lambda batch: scan_queue.put(('batch', batch)))
+                scan_queue.put(('done', files))
+            except Exception as e:
+                scan_queue.put(('error', e))
+                
+        scan_thread = threading.Thread(target=run_scan, args=(self.scanner,))
+        scan_thread.daemon = True
+        scan_thread.start()
+        
+        self.root.after(100, lambda: self._poll_scan_queue(scan_queue, on_complete))
         
-        for file_path in files_found:
-            rel_path = os.path.relpath(file_path, self.base_directory.get())
-            self.files_listbox.insert(END, rel_path)
+    def update_ignore_globs(self):
+        """Lê os padrões ignorados da interface e salva nas preferências"""
+        if self.ignore_globs_var is None:
+            return
+            
+        patterns = [pattern.strip() for pattern in self.ignore_globs_var.get().split(',') if pattern.strip()]
+        if patterns != self.ignore_globs:
+            self.ignore_globs = patterns
+            self.save_preferences()
+            
+    def cancel_scan(self):
+        """Cancela a varredura em andamento"""
+        if self.scanning and self.scanner:
+            self.scanner.cancel()
+            self.cancel_scan_button.config(state=DISABLED)
+            self.status_label.config(text="⏹️ Cancelando escaneamento...")
+            
+    def _poll_scan_queue(self, scan_queue, on_complete):
+        """Transfere os resultados parciais da varredura para a interface"""
+        base_prefix = os.path.join(self.base_directory.get(), '')
+        
+        try:
+            while True:
+                kind, payload = scan_queue.get_nowait()
+                
+                if kind == 'batch':
+                    self.scanned_files.extend(payload)
+                    self.files_listbox.insert(END, *[path[len(base_prefix):] if path.startswith(base_prefix)
+                                                     else path for path in payload])
+                    self.files_count_label.config(
+                        text=f"Escaneando... {len(self.scanned_files)} arquivos "
+                             f"({self.scanner.dirs_scanned} pastas)")
+                elif kind == 'done':
+                    self._finish_scan(payload, on_complete)
+                    return
+                else:
+                    self._finish_scan(None, None, error=payload)
+                    return
+        except queue.Empty:
+            pass
+            
+        self.root.after(100, lambda: self._poll_scan_queue(scan_queue, on_complete))
+        
+    def _finish_scan(self, files_found, on_complete, error=None):
+        """Finaliza a varredura e atualiza a interface com a lista ordenada"""
+        self.scanning = False
+        self.scan_button.config(state=NORMAL)
+        self.cancel_scan_button.config(state=DISABLED)
+        
+        if error is not None:
+            self.files_count_label.config(text="Erro no escaneamento")
+            self.status_label.config(text="❌ Erro no escaneamento")
+            messagebox.showerror("Erro", f"Erro ao escanear arquivos:\n{error}")
+            return
             
         count = len(files_found)
-        self.files_count_label.config(text=f"{count} arquivos encontrados")
-        self.status_label.config(text=f"Escaneamento concluído: {count} arquivos")
+        self.scanned_files = files_found
+        self.scanned_stats = self.scanner.file_stats
+        
+        if self.scanner.cancelled:
+            self.files_count_label.config(text=f"Escaneamento cancelado: {count} arquivos")
+            self.status_label.config(text=f"⏹️ Escaneamento cancelado ({count} arquivos)")
+            self.show_toast_notification(f"⏹️ Escaneamento cancelado com {count} arquivos encontrados",
+                                         "WARNING", duration=4000)
+            return
+            
+        # Reexibe a lista em ordem alfabética
+        base_prefix = os.path.join(self.base_directory.get(), '')
+        self.files_listbox.delete(0, END)
+        self.files_listbox.insert(END, *[path[len(base_prefix):] if path.startswith(base_prefix)
+                                         else path for path in files_found])
+            
+        changed = self.manifest.count_changed(files_found, self.scanned_stats)
+        self.files_count_label.config(text=f"{count} arquivos encontrados ({changed} novos ou alterados)")
+        status_text = f"Escaneamento concluído: {count} arquivos"
+        if self.scanner.dirs_pruned:
+            status_text += f" ({self.scanner.dirs_pruned} pastas ignoradas)"
+        self.status_label.config(text=status_text)
+        self.update_time_estimate()
         
         # Toast informativo sobre arquivos encontrados
         if count > 0:
             self.show_toast_notification(f"🔍 Encontrados {count} arquivos para processar", "INFO", duration=4000)
         else:
             self.show_toast_notification("⚠️ Nenhum arquivo encontrado na pasta selecionada", "WARNING", duration=5000)
+            
+        if on_complete:
+            on_complete(files_found)
+        
+    def on_ui_thread(self):
+        """Indica se o código está na thread da interface (a única que pode usar o Tk)"""
+        return threading.current_thread() is threading.main_thread()
         
-        return files_found
+    def run_on_ui(self, callback, *args, **kwargs):
+        """Executa na thread da interface; chamado de outra thread, enfileira para o poller"""
+        if self.on_ui_thread():
+            return callback(*args, **kwargs)
+        self.ui_queue.put((callback, args, kwargs))
+        
+    def _poll_ui_queue(self):
+        """Aplica na interface as atualizações enviadas pelas threads (log, toasts, progresso)"""
+        try:
+            while True:
+                callback, args, kwargs = self.ui_queue.get_nowait()
+                try:
+                    callback(*args, **kwargs)
+                except Exception as e:
+                    print(f"Aviso: Erro ao atualizar a interface - {e}")
+        except queue.Empty:
+            pass
+            
+        self.root.after(50, self._poll_ui_queue)
         
+    def set_progress(self, percent=None, text=None):
+        """Atualiza a barra e/ou o texto de progresso (de qualquer thread)"""
+        if not self.on_ui_thread():
+            self.run_on_ui(self.set_progress, percent, text)
+            return
+        if percent is not None:
+            self.progress_var.set(percent)
+        if text is not None:
+            self.progress_label.config(text=text)
+            
     def log_message(self, message, level="INFO", show_toast=None):
         """Adiciona mensagem ao log com notificações toast opcionais"""
+        if not self.on_ui_thread():
+            self.run_on_ui(self.log_message, message, level, show_toast)
+            return
+            
         timestamp = datetime.now().strftime("%H:%M:%S")
         
         # Usa cores do tema atual
@@ -1782,19 +4468,21 @@ class OrganizadorExtratosGUI:
                 "ERROR": "#c62828"
             }
         
-        self.log_text.config(state=NORMAL)
-        self.log_text.insert(END, f"[{timestamp}] {message}\n")
-        
-        # Aplica cor à última linha
-        line_start = self.log_text.index("end-2c linestart")
-        line_end = self.log_text.index("end-2c lineend")
-        
-        tag_name = f"level_{level}_{timestamp}"
-        self.log_text.tag_add(tag_name, line_start, line_end)
-        self.log_text.tag_config(tag_name, foreground=colors.get(level, theme['text_fg']))
-        
-        self.log_text.config(state=DISABLED)
-        self.log_text.see(END)
+        # Várias análises simultâneas escrevem no log: insere cada linha de forma atômica
+        with self._log_lock:
+            self.log_text.config(state=NORMAL)
+            self.log_text.insert(END, f"[{timestamp}] {message}\n")
+            
+            # Aplica cor à última linha
+            line_start = self.log_text.index("end-2c linestart")
+            line_end = self.log_text.index("end-2c lineend")
+            
+            tag_name = f"level_{level}_{timestamp}"
+            self.log_text.tag_add(tag_name, line_start, line_end)
+            self.log_text.tag_config(tag_name, foreground=colors.get(level, theme['text_fg']))
+            
+            self.log_text.config(state=DISABLED)
+            self.log_text.see(END)
         
         # Determina se deve mostrar toast
         if show_toast is None:
@@ -1833,6 +4521,9 @@ class OrganizadorExtratosGUI:
         
     def show_toast_notification(self, message, level="INFO", duration=4000):
         """Mostra uma notificação toast moderna"""
+        if not self.on_ui_thread():
+            self.run_on_ui(self.show_toast_notification, message, level, duration)
+            return
         if not self.toast_enabled:
             return
             
@@ -2181,8 +4872,8 @@ class OrganizadorExtratosGUI:
             self._reposition_toasts()
     
     def start_processing(self):
-        """Inicia o processamento em thread separada"""
-        if self.processing:
+        """Escaneia os arquivos e inicia o processamento ao final da varredura"""
+        if self.processing or self.scanning:
             return
             
         # Validações
@@ -2191,7 +4882,24 @@ class OrganizadorExtratosGUI:
             self.notebook.select(0)  # Vai para aba de configuração
             return
             
-        files = self.scan_files()
+        self.start_button.config(state=DISABLED)
+        self.scan_files(on_complete=self._begin_processing)
+        
+        # Reabilita o botão se a varredura não chegou a iniciar ou foi cancelada
+        self._restore_start_button_after_scan()
+        
+    def _restore_start_button_after_scan(self):
+        """Reabilita o botão de início quando a varredura termina sem processamento"""
+        if self.scanning:
+            self.root.after(200, self._restore_start_button_after_scan)
+        elif not self.processing:
+            self.start_button.config(state=NORMAL)
+        
+    def _begin_processing(self, files):
+        """Inicia o processamento em thread separada"""
+        if self.processing:
+            return
+            
         if not files:
             messagebox.showerror("Erro", "Nenhum arquivo encontrado para processar!")
             return
@@ -2200,6 +4908,7 @@ class OrganizadorExtratosGUI:
         self.clear_checkpoint()
             
         # Configura interface para processamento
+        self.cancel_event.clear()
         self.processing = True
         self.start_button.config(state=DISABLED)
         self.resume_button.config(state=DISABLED)
@@ -2219,9 +4928,50 @@ class OrganizadorExtratosGUI:
         # Notificação toast de início
         self.show_toast_notification(f"🚀 Iniciando processamento de {len(files)} arquivos", "INFO")
         
+    def start_batch_job(self):
+        """Escaneia os arquivos e os organiza por um job assíncrono em lote (sem pressa, maior vazão por cota)"""
+        if self.processing or self.scanning:
+            return
+            
+        if not self.api_keys:
+            messagebox.showerror("Erro", "Configure pelo menos uma chave da API primeiro!")
+            self.notebook.select(0)
+            return
+            
+        self.start_button.config(state=DISABLED)
+        self.scan_files(on_complete=self._begin_batch_job)
+        self._restore_start_button_after_scan()
+        
+    def _begin_batch_job(self, files):
+        """Inicia o job em lote em thread separada"""
+        if self.processing:
+            return
+            
+        if not files:
+            messagebox.showerror("Erro", "Nenhum arquivo encontrado para processar!")
+            return
+            
+        self.cancel_event.clear()
+        self.processing = True
+        self.start_button.config(state=DISABLED)
+        self.resume_button.config(state=DISABLED)
+        self.stop_button.config(state=NORMAL)
+        self.notebook.select(1)
+        
+        self.log_text.config(state=NORMAL)
+        self.log_text.delete(1.0, END)
+        self.log_text.config(state=DISABLED)
+        
+        self.processing_thread = threading.Thread(target=self.process_files_batch_job, args=(files,))
+        self.processing_thread.daemon = True
+        self.processing_thread.start()
+        
+        self.show_toast_notification(f"🗂️ Preparando job em lote para {len(files)} arquivos", "INFO")
+        
     def stop_processing(self):
         """Para o processamento"""
         self.processing = False
+        self.cancel_event.set()  # Abandona as requisições em andamento
         self.start_button.config(state=NORMAL)
         self.resume_button.config(state=NORMAL if self.has_checkpoint() else DISABLED)
         self.stop_button.config(state=DISABLED)
@@ -2231,10 +4981,15 @@ class OrganizadorExtratosGUI:
         self.show_toast_notification("⏹️ Processamento interrompido! Checkpoint salvo para retomar depois.", "WARNING", duration=6000)
         self.status_label.config(text="Processamento interrompido - checkpoint salvo")
         
-    def process_files(self, files, start_index=0):
-        """Processa os arquivos (executado em thread separada)"""
+    def process_files(self, files, start_index=0, resume=False):
+        """
+        Processa os arquivos (executado em thread separada)
+        
+        Com `resume`, reaproveita as estatísticas do checkpoint e pula os
+        índices concluídos nele, mesmo quando o primeiro arquivo não terminou.
+        """
         try:
-            if start_index == 0:
+            if not resume:
                 self.log_message("🚀 Iniciando organização dos extratos bancários...", "INFO")
             else:
                 self.log_message(f"▶️ Retomando processamento do arquivo {start_index + 1}...", "INFO")
@@ -2248,36 +5003,35 @@ class OrganizadorExtratosGUI:
             self.log_message("📋 OPERAÇÃO: Apenas cópias serão organizadas na nova estrutura", "INFO")
             self.log_message("", "INFO")
             
-            # Configura Gemini com a primeira chave disponível
+            # Modo incremental: envia apenas o delta do manifesto
+            # (na retomada a lista vem do checkpoint: os índices concluídos se referem a ela)
+            if not resume and self.new_files_only:
+                delta = self.manifest.compute_delta(files, self.scanned_stats)
+                skipped = len(files) - len(delta)
+                self.log_message(f"🆕 Modo incremental: {len(delta)} novos/alterados, {skipped} já organizados", "INFO")
+                files = delta
+                
+                if not files:
+                    self.manifest.save()
+                    self.log_message("✅ Nenhum arquivo novo ou alterado para processar", "SUCCESS")
+                    self.set_progress(100, "Nada a processar")
+                    return
+            
             if not self.api_keys:
                 raise Exception("Nenhuma chave API configurada")
             
             self.current_api_index = 0
-            genai.configure(api_key=self.api_keys[self.current_api_index])
-            
-            # Tenta diferentes modelos disponíveis
-            models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-            model = None
-            
-            for model_name in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    # Testa o modelo com uma requisição simples
-                    test_response = model.generate_content("OK")
-                    if test_response:
-                        self.log_message(f"🤖 Modelo ativo: {model_name}", "INFO")
-                        break
-                except Exception:
-                    continue
             
-            if not model:
-                raise Exception("Nenhum modelo Gemini disponível")
+            # Modelo resolvido em execuções anteriores (sem requisição de teste);
+            # cada chave usa o seu e só troca se a API informar que não existe
+            model = self.model_resolver.model_for(self.api_keys[self.current_api_index])
+            self.log_message(f"🤖 Modelo ativo: {model}", "INFO")
             
             self.log_message(f"🔑 Usando rotação de {len(self.api_keys)} chave(s) API", "INFO")
             
             # Carrega estatísticas do checkpoint se existir
-            checkpoint_data = self.load_checkpoint()
-            if checkpoint_data and start_index > 0:
+            checkpoint_data = self.load_checkpoint() if resume else None
+            if checkpoint_data:
                 self.stats = checkpoint_data.get('stats', {
                     'total_files': len(files),
                     'success': 0,
@@ -2293,117 +5047,640 @@ class OrganizadorExtratosGUI:
                     'by_bank': {},
                     'by_month': {}
                 }
+            self.stats.setdefault('duplicates', 0)
+            self.stats.setdefault('local_classified', 0)
+            self.stats.setdefault('cache_hits', 0)
+            self.stats.setdefault('api_calls_saved', 0)
+            self.stats.setdefault('batched', 0)
+            self.stats.setdefault('batch_requests', 0)
+            self.stats.setdefault('escalations', 0)
+            self.stats.setdefault('fast_tier_accepted', 0)
+            self.stats.setdefault('model_tiers', {})
+            self.stats.setdefault('retries_by_class', {})
+            self.stats.setdefault('hedged_requests', 0)
+            self.stats.setdefault('hedge_wins', 0)
+            self.stats.setdefault('backoff_by_class', {})
+            self.reset_run_state()
+            
+            # Índices já concluídos fora de ordem numa execução anterior (processamento concorrente)
+            completed = set(checkpoint_data.get('completed', [])) if checkpoint_data else set()
+            pending = [i for i in range(start_index, len(files)) if i not in completed]
+            
+            # Etapa de deduplicação: agrupa cópias idênticas antes de qualquer análise
+            duplicates = DuplicateDetector([files[i] for i in pending], self.scanned_stats)
+            duplicate_count = duplicates.build(should_continue=lambda: self.processing)
+            self.run_hashes = duplicates.hashes
+            if duplicate_count:
+                self.log_message(f"♻️ {duplicate_count} cópia(s) idêntica(s) em {duplicates.group_count} grupo(s) "
+                                 f"reaproveitarão a análise do original", "INFO")
+            
+            # Um balde de fichas por chave com ritmo adaptativo entre o piso e o teto;
+            # a saúde de cada chave decide qual usar e quais ficam em pausa
+            self.key_health = KeyHealthPool(len(self.run_keys))
+            self.rate_limiter = KeyRateLimiter(len(self.run_keys), 60 / self.max_interval, 60 / self.processing_interval,
+                                               health=self.key_health, available=self.key_is_usable,
+                                               bucket_factory=self.make_key_bucket)
+            if self.token_store:
+                self.log_message("🔗 Ritmo das chaves compartilhado com outras instâncias abertas", "INFO")
+            self.seed_key_health()
+            
+            # Cota diária: chaves esgotadas hoje ficam de fora desta execução
+            self.quota_ledger.daily_limit = self.daily_request_limit
+            exhausted = [i + 1 for i, key in enumerate(self.api_keys) if self.quota_ledger.is_exhausted(key)]
+            capacity = sum(self.quota_ledger.remaining(key) for key in self.api_keys)
+            if exhausted:
+                self.log_message(f"📉 Chave(s) {', '.join(map(str, exhausted))} sem cota hoje - serão puladas até a "
+                                 f"meia-noite do Pacífico", "WARNING")
+            self.log_message(f"📊 Cota diária restante: {capacity} requisição(ões) em {len(self.api_keys)} chave(s)", "INFO")
+            workers = max(1, min(self.max_workers, len(pending)))
+            
+            # Modo lote: as threads aguardam o lote encher, então precisa haver ao menos uma por documento
+            if self.batch_mode_enabled:
+                self.batcher = BatchCollector(self.analyze_batch_with_gemini, max_items=self.batch_size)
+                workers = max(workers, min(self.batch_size, len(pending)))
+                self.log_message(f"📦 Modo lote: até {self.batch_size} extratos por requisição "
+                                 f"(orçamento de ~{BATCH_TOKEN_BUDGET} tokens)", "INFO")
+            self.log_message(f"🧵 {workers} análise(s) simultânea(s) - ritmo inicial de "
+                             f"{self.rate_limiter.effective_rate():.1f} req/min, ajustado automaticamente "
+                             f"({60 / self.max_interval:.1f} a {60 / self.processing_interval:.1f} req/min por chave)", "INFO")
+            
+            # Etapa de extração: processos separados leem os arquivos à frente das análises
+            self.start_extraction_pool(len(pending))
+            extraction_window = max(self.extraction_workers * 4, workers * 2 + self.extraction_workers * 2)
+            next_extraction = iter(pending)
+            model_name = getattr(model, 'model_name', str(model))
+            
+            done = set(completed)
+            in_flight = {}
+            next_pending = iter(pending)
+            last_checkpoint = 0
+            
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analise") as executor:
+                while True:
+                    self.prefetch_extractions(files, next_extraction, model_name, duplicates,
+                                              extraction_window)
+                    
+                    # Mantém uma janela limitada de tarefas na fila do pool
+                    while self.processing and len(in_flight) < workers * 2:
+                        index = next(next_pending, None)
+                        if index is None:
+                            break
+                        future = executor.submit(self._process_file_task, files, index, model, duplicates)
+                        in_flight[future] = index
+                        
+                    if not in_flight:
+                        break
+                        
+                    finished, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        index = in_flight.pop(future)
+                        if future.result():
+                            done.add(index)
+                            
+                    # Atualiza progresso e ritmo efetivo
+                    self.set_progress((len(done) / len(files)) * 100, f"Processados {len(done)}/{len(files)} arquivos")
+                    self.run_on_ui(self.update_rate_indicator)
+                    
+                    # Checkpoint periódico (a cada 2 segundos no máximo)
+                    if finished and time.monotonic() - last_checkpoint >= 2:
+                        self.save_progress_checkpoint(files, done, start_index)
+                        last_checkpoint = time.monotonic()
+                        
+            if not self.processing:
+                # Salva checkpoint antes de parar
+                self.save_progress_checkpoint(files, done, start_index)
+                
+            # Finaliza processamento
+            if self.processing:
+                self.set_progress(100, "Processamento concluído!")
+                self.log_message("", "INFO")
+                self.log_message("🎉 Organização concluída com sucesso!", "SUCCESS")
+                # Toast de conclusão com estatísticas
+                self.show_toast_notification(
+                    f"🎉 Processamento concluído! {self.stats['success']} sucessos, {self.stats['errors']} erros, "
+                    f"{self.stats['api_calls_saved']} chamadas de API economizadas", 
+                    "SUCCESS", duration=8000)
+                self.log_message("", "INFO")
+                self.log_message("🛡️ CONFIRMAÇÃO DE SEGURANÇA:", "SUCCESS")
+                self.log_message("   ✅ Todos os arquivos originais estão INTACTOS", "SUCCESS")
+                self.log_message("   ✅ Apenas cópias foram organizadas", "SUCCESS")
+                self.log_message("   ✅ Nenhum documento original foi alterado", "SUCCESS")
+                self.run_on_ui(self.show_final_stats)
+                self.clear_checkpoint()  # Remove checkpoint após conclusão
+                self.run_on_ui(self.notebook.select, 2)  # Vai para aba de resultados
+                
+        except Exception as e:
+            self.log_message(f"❌ Erro crítico: {str(e)}", "ERROR")
+            # Toast de erro crítico
+            self.show_toast_notification(f"❌ Erro crítico no processamento! Checkpoint salvo.", "ERROR", duration=10000)
+            # Salva checkpoint em caso de erro crítico
+            try:
+                self.save_progress_checkpoint(files, locals().get('done', set()), start_index)
+                self.log_message("💾 Checkpoint salvo devido ao erro", "INFO")
+            except:
+                pass
+            self.run_on_ui(messagebox.showerror, "Erro Crítico",
+                           f"Erro durante processamento:\n{str(e)}\n\nCheckpoint salvo - use 'Retomar' para continuar")
+            
+        finally:
+            # Persiste o manifesto com os resultados desta execução
+            try:
+                self.manifest.save()
+            except Exception as e:
+                self.log_message(f"⚠️ Erro ao salvar manifesto: {e}", "WARNING")
+            try:
+                self.quota_ledger.save()
+            except Exception as e:
+                self.log_message(f"⚠️ Erro ao salvar uso das chaves: {e}", "WARNING")
+                
+            self.stop_extraction_pool()
+                
+            # Restaura interface
+            self.processing = False
+            self.batcher = None
+            self.run_on_ui(self.restore_controls)
+            
+    def process_files_batch_job(self, files):
+        """
+        Organiza os arquivos por um job assíncrono em lote (executado em thread separada)
+        
+        Arquivos resolvidos pelo cache ou pelo classificador local são organizados
+        na hora; os demais viram um arquivo JSONL de requisições, enviado como um
+        único job. Ao terminar, as respostas são aplicadas de uma vez. Se o
+        processamento for parado, o job segue no servidor e é retomado na
+        próxima vez que o modo for usado.
+        """
+        try:
+            self.log_message("🗂️ Iniciando organização por job em lote...", "INFO")
+            self.log_message(f"📁 Diretório de saída: {self.output_directory.get()}", "INFO")
+            self.log_message("🛡️ SEGURANÇA: Todos os arquivos originais serão preservados", "SUCCESS")
+            self.log_message("", "INFO")
+            
+            self.stats = {'total_files': len(files), 'success': 0, 'errors': 0, 'by_bank': {}, 'by_month': {},
+                          'local_classified': 0, 'cache_hits': 0, 'api_calls_saved': 0, 'duplicates': 0,
+                          'batch_jobs': 0, 'batch_job_requests': 0}
+            self.reset_run_state()
+            
+            job = self.load_batch_job()
+            if job:
+                self.log_message(f"▶️ Retomando o job {job['name']} enviado em {job['submitted_at']}", "INFO")
+                # Os resultados vão para o destino escolhido no envio
+                if job.get('output_directory') and job['output_directory'] != self.output_directory.get():
+                    self.run_on_ui(self.output_directory.set, job['output_directory'])
+                    self.log_message(f"📁 Diretório de saída do envio restaurado: {job['output_directory']}", "INFO")
+            else:
+                if self.new_files_only:
+                    delta = self.manifest.compute_delta(files, self.scanned_stats)
+                    self.log_message(f"🆕 Modo incremental: {len(delta)} novos/alterados, "
+                                     f"{len(files) - len(delta)} já organizados", "INFO")
+                    files = delta
+                    self.stats['total_files'] = len(files)
+                job = self.submit_batch_job(files)
+                
+            job_failed = False
+            if job and self.processing:
+                finished = self.wait_for_batch_job(job)
+                if finished is not None:
+                    job_failed = not self.apply_batch_job_results(job, finished)
+                    
+            if job_failed:
+                self.set_progress(text="Job em lote não concluído")
+                self.show_toast_notification("❌ Job em lote não concluído - arquivos continuam pendentes",
+                                             "ERROR", duration=10000)
+            elif self.processing:
+                self.set_progress(100, "Processamento concluído!")
+                self.log_message("🎉 Organização por job em lote concluída!", "SUCCESS")
+                self.show_toast_notification(
+                    f"🎉 Job em lote concluído! {self.stats['success']} sucessos, {self.stats['errors']} erros",
+                    "SUCCESS", duration=8000)
+                self.run_on_ui(self.show_final_stats)
+                self.run_on_ui(self.notebook.select, 2)
+                
+        except Exception as e:
+            self.log_message(f"❌ Erro crítico no job em lote: {str(e)}", "ERROR")
+            self.show_toast_notification("❌ Erro crítico no job em lote!", "ERROR", duration=10000)
+            self.run_on_ui(messagebox.showerror, "Erro Crítico", f"Erro durante o job em lote:\n{str(e)}")
+            
+        finally:
+            try:
+                self.manifest.save()
+            except Exception as e:
+                self.log_message(f"⚠️ Erro ao salvar manifesto: {e}", "WARNING")
+            self.stop_extraction_pool()
+            self.processing = False
+            self.run_on_ui(self.restore_controls)
+            
+    def reset_run_state(self):
+        """
+        Zera o estado de uma execução antes de processar (os dois modos)
+        
+        Sem isso, um job em lote reaproveitaria hashes de uma execução anterior
+        (arquivos editados desde então teriam acertos de cache e hashes de
+        manifesto errados) e o resumo mostraria a saúde das chaves antiga.
+        """
+        self.run_hashes = {}
+        self.run_keys = list(self.api_keys)
+        self.retired_keys = set()
+        self.key_health = None
+        self.rate_limiter = None
+        self.batcher = None
+        self.escalation_unavailable = False
+        self.escalation_paused_until = 0.0
+        
+    def restore_controls(self):
+        """Restaura os botões e o indicador de ritmo ao fim do processamento"""
+        self.update_rate_indicator()
+        self.start_button.config(state=NORMAL)
+        self.resume_button.config(state=NORMAL if self.has_checkpoint() else DISABLED)
+        self.stop_button.config(state=DISABLED)
+        
+    def submit_batch_job(self, files):
+        """
+        Resolve localmente o que for possível e envia o restante como job
+        
+        Returns:
+            Registro do job enviado ou None se nada precisou da IA
+        """
+        api_key = next((key for key in self.api_keys if not self.quota_ledger.is_exhausted(key)), None)
+        if api_key is None:
+            raise Exception("Todas as chaves API atingiram a cota diária")
+        model_name = self.model_resolver.model_for(api_key)
+        
+        entries = {}
+        job_lines = []
+        self.start_extraction_pool(len(files))
+        next_extraction = iter(range(len(files)))
+        for position, file_path in enumerate(files):
+            if not self.processing:
+                return None
+            self.prefetch_extractions(files, next_extraction, model_name, None, self.extraction_workers * 4)
+            file_path = str(file_path)
+            self.log_message(f"[{position + 1}/{len(files)}] 🔍 Preparando: {os.path.basename(file_path)}", "INFO")
+            try:
+                analysis, context = self.prepare_analysis(file_path, model_name)
+            except Exception as e:
+                self.log_message(f"❌ Erro ao preparar {os.path.basename(file_path)}: {e}", "ERROR")
+                analysis, context = None, None
+            finally:
+                # Acertos de cache não consomem a extração adiantada; libera a vaga na janela
+                self.extraction_futures.pop(file_path, None)
+                
+            if context is None:
+                # Resolvido sem IA (cache ou classificador local) ou ilegível
+                self.apply_job_outcome(file_path, analysis)
+            else:
+                key = str(len(job_lines) + 1)
+                prompt = self.build_analysis_prompt(context['snippet'], context['file_name'])
+                job_lines.append({'key': key, 'request': GeminiBatchJobClient.build_request(prompt, ANALYSIS_GENERATION_CONFIG)})
+                entries[key] = {'file': file_path, 'content_hash': context['content_hash'],
+                                'local_result': context['local_result']}
+            self.set_progress(((position + 1) / len(files)) * 50)
+            
+        if not job_lines:
+            self.log_message("✅ Nenhum arquivo precisou da IA", "SUCCESS")
+            return None
+            
+        # Arquivo do job: uma requisição por linha; é ele que vai ao servidor (e fica para auditoria)
+        os.makedirs(self.batch_job_dir, exist_ok=True)
+        job_path = os.path.join(self.batch_job_dir, f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        with open(job_path, 'w', encoding='utf-8') as f:
+            for line in job_lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+                
+        self.log_message(f"📤 Enviando job com {len(job_lines)} requisição(ões) ({model_name})...", "INFO")
+        client = GeminiBatchJobClient(api_key)
+        input_file = client.upload_jsonl(job_path, os.path.basename(job_path))
+        name = client.submit(model_name, input_file, os.path.basename(job_path))
+        self.quota_ledger.record(api_key)
+        
+        job = {'name': name, 'api_key_fingerprint': ModelResolver.fingerprint(api_key), 'model': model_name,
+               'job_file': job_path, 'input_file': input_file, 'entries': entries, 'output_directory': self.output_directory.get(),
+               'submitted_at': datetime.now().strftime('%d/%m/%Y %H:%M')}
+        self.save_batch_job(job)
+        with self.stats_lock:
+            self.stats['batch_jobs'] = self.stats.get('batch_jobs', 0) + 1
+            self.stats['batch_job_requests'] = self.stats.get('batch_job_requests', 0) + len(job_lines)
+        self.log_message(f"✅ Job {name} enviado - aguardando o processamento no servidor", "SUCCESS")
+        return job
+        
+    def batch_job_key(self, job):
+        """Chave usada no envio do job (as chaves podem ter sido reordenadas desde então)"""
+        api_key = next((key for key in self.api_keys
+                        if ModelResolver.fingerprint(key) == job.get('api_key_fingerprint')), None)
+        if api_key is None:
+            raise Exception("A chave API usada no envio do job não está mais cadastrada - "
+                            "adicione-a novamente para consultar o job")
+        return api_key
+        
+    def wait_for_batch_job(self, job):
+        """Consulta o job até terminar; retorna o job final ou None se interrompido"""
+        client = GeminiBatchJobClient(self.batch_job_key(job))
+        while self.processing:
+            current = client.get(job['name'])
+            state, done = GeminiBatchJobClient.state_of(current)
+            self.set_progress(text=f"Job em lote: {state}")
+            if done:
+                self.log_message(f"📥 Job {job['name']} terminou ({state})", "SUCCESS" if 'SUCCEEDED' in state else "WARNING")
+                return current
+            self.log_message(f"   ⏳ Job {job['name']}: {state} - nova consulta em {BATCH_JOB_POLL_SECONDS}s", "INFO")
+            self.wait_while_processing(BATCH_JOB_POLL_SECONDS)
+            
+        self.log_message("💾 Job continua no servidor - use 'Job em Lote' novamente para aplicar os resultados", "INFO")
+        return None
+        
+    def apply_batch_job_results(self, job, finished):
+        """
+        Valida as respostas do job e organiza todos os arquivos de uma vez
+        
+        Returns:
+            True se o job terminou com sucesso; um job que falhou, expirou ou
+            foi cancelado não organiza nada e os arquivos seguem pendentes
+        """
+        if not GeminiBatchJobClient.succeeded(finished):
+            self.log_message(f"❌ Job {job['name']} não concluído: {GeminiBatchJobClient.error_of(finished)}", "ERROR")
+            self.log_message(f"   📋 {len(job['entries'])} arquivo(s) continuam pendentes e serão reenviados "
+                             f"no próximo job", "WARNING")
+            self.clear_batch_job()
+            return False
+            
+        results = GeminiBatchJobClient(self.batch_job_key(job)).results_of(finished)
+        entries = job['entries']
+        
+        for position, (key, entry) in enumerate(entries.items(), 1):
+            file_path = entry['file']
+            file_name = os.path.basename(file_path)
+            context = {'file_name': file_name, 'content_hash': entry['content_hash'],
+                       'local_result': entry['local_result'],
+                       'file_type': 'OFX' if file_path.lower().endswith('.ofx') else 'PDF'}
+            try:
+                analysis = validate_analysis(extract_json_object(results.get(key) or ''))
+                analysis['fonte'] = 'gemini'
+                analysis['modelo'] = job['model']
+                analysis['job'] = True
+            except ValueError as e:
+                self.log_message(f"   ⚠️ {file_name}: resposta do job inválida ({e}) - usando fallback", "WARNING")
+                analysis = self.fallback_analysis(file_name)
+                
+            self.apply_job_outcome(file_path, self.finish_analysis(analysis, context, job['model']))
+            self.set_progress(50 + (position / len(entries)) * 50)
+            
+        self.clear_batch_job()
+        return True
+        
+    def apply_job_outcome(self, file_path, analysis):
+        """Organiza um arquivo do job e registra o resultado"""
+        try:
+            success = analysis is not None and self.organize_file(file_path, analysis)
+        except Exception as e:
+            self.log_message(f"❌ Erro ao organizar {os.path.basename(file_path)}: {str(e)}", "ERROR")
+            success = False
+        with self.stats_lock:
+            self.stats['success' if success else 'errors'] += 1
+        self.record_manifest_outcome(file_path, success, analysis)
+        
+    def load_batch_job(self):
+        """Job enviado e ainda não aplicado (ou None)"""
+        try:
+            if os.path.exists(self.batch_job_file):
+                with open(self.batch_job_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.log_message(f"⚠️ Registro do job em lote ignorado: {e}", "WARNING")
+        return None
+        
+    def save_batch_job(self, job):
+        with open(self.batch_job_file, 'w', encoding='utf-8') as f:
+            json.dump(job, f, indent=2, ensure_ascii=False)
+            
+    def clear_batch_job(self):
+        try:
+            if os.path.exists(self.batch_job_file):
+                os.remove(self.batch_job_file)
+        except Exception as e:
+            self.log_message(f"⚠️ Erro ao remover registro do job: {e}", "WARNING")
+            
+    def _process_file_task(self, files, index, model, duplicates):
+        """
+        Processa um arquivo no pool de análises
+        
+        Returns:
+            True se o arquivo foi concluído (com sucesso ou erro), False se interrompido
+        """
+        if not self.processing:
+            return False
             
-            # Processa cada arquivo a partir do índice especificado
-            for i in range(start_index, len(files)):
+        file_path = files[index]
+        file_name = os.path.basename(file_path)
+        self.log_message(f"[{index+1}/{len(files)}] 🔍 Processando: {file_name}", "INFO")
+        
+        analysis = None
+        try:
+            # Reaproveita a análise se o arquivo for cópia de um já analisado
+            analysis = duplicates.wait_for(file_path, should_continue=lambda: self.processing)
+            if analysis:
+                original = os.path.basename(duplicates.representative_of(file_path) or file_name)
+                self.log_message(f"   ♻️ Conteúdo idêntico a {original} - análise reaproveitada", "INFO")
+                with self.stats_lock:
+                    self.stats['duplicates'] += 1
+                    self.stats['api_calls_saved'] += 1
+            else:
                 if not self.processing:
-                    # Salva checkpoint antes de parar
-                    self.save_checkpoint(files, i, self.stats)
-                    break
-                    
-                # Atualiza progresso
-                progress = (i / len(files)) * 100
-                self.progress_var.set(progress)
-                self.progress_label.config(text=f"Processando arquivo {i+1}/{len(files)}")
-                
-                file_path = files[i]
-                file_name = os.path.basename(file_path)
-                self.log_message(f"[{i+1}/{len(files)}] 🔍 Processando: {file_name}", "INFO")
-                
+                    return False
                 try:
-                    # Salva checkpoint antes de processar cada arquivo
-                    self.save_checkpoint(files, i, self.stats)
-                    
-                    # Processa arquivo individual
-                    success = self.process_single_file(file_path, model)
-                    
-                    if success:
-                        self.stats['success'] += 1
-                    else:
-                        self.stats['errors'] += 1
-                        
-                except Exception as e:
-                    self.log_message(f"❌ Erro ao processar {file_name}: {str(e)}", "ERROR")
-                    self.stats['errors'] += 1
-                    # Salva checkpoint mesmo com erro
-                    self.save_checkpoint(files, i + 1, self.stats)
-                
-                # Pausa configurável entre arquivos
-                if i < len(files) - 1 and self.processing:
-                    self.log_message(f"⏱️ Aguardando {self.processing_interval} segundos antes do próximo arquivo...", "INFO")
-                    for second in range(self.processing_interval):
-                        if not self.processing:
-                            break
-                        time.sleep(1)
-                        
-            # Finaliza processamento
-            if self.processing:
-                self.progress_var.set(100)
-                self.progress_label.config(text="Processamento concluído!")
-                self.log_message("", "INFO")
-                self.log_message("🎉 Organização concluída com sucesso!", "SUCCESS")
-                # Toast de conclusão com estatísticas
-                self.show_toast_notification(
-                    f"🎉 Processamento concluído! {self.stats['success']} sucessos, {self.stats['errors']} erros", 
-                    "SUCCESS", duration=8000)
-                self.log_message("", "INFO")
-                self.log_message("🛡️ CONFIRMAÇÃO DE SEGURANÇA:", "SUCCESS")
-                self.log_message("   ✅ Todos os arquivos originais estão INTACTOS", "SUCCESS")
-                self.log_message("   ✅ Apenas cópias foram organizadas", "SUCCESS")
-                self.log_message("   ✅ Nenhum documento original foi alterado", "SUCCESS")
-                self.show_final_stats()
-                self.clear_checkpoint()  # Remove checkpoint após conclusão
-                self.notebook.select(2)  # Vai para aba de resultados
+                    analysis = self.analyze_single_file(file_path, model)
+                finally:
+                    # Libera as cópias mesmo se a análise levantar exceção: sem análise, cada uma faz a sua
+                    duplicates.remember(file_path, analysis)
                 
+                # Interrompido durante a análise: fica para a retomada
+                if analysis is None and not self.processing:
+                    return False
+                    
+            # Organiza o arquivo com a análise obtida
+            success = analysis is not None and self.organize_file(file_path, analysis)
+            
         except Exception as e:
-            self.log_message(f"❌ Erro crítico: {str(e)}", "ERROR")
-            # Toast de erro crítico
-            self.show_toast_notification(f"❌ Erro crítico no processamento! Checkpoint salvo.", "ERROR", duration=10000)
-            # Salva checkpoint em caso de erro crítico
-            try:
-                current_index = locals().get('i', start_index)
-                self.save_checkpoint(files, current_index, self.stats)
-                self.log_message("💾 Checkpoint salvo devido ao erro", "INFO")
-            except:
-                pass
-            messagebox.showerror("Erro Crítico", f"Erro durante processamento:\n{str(e)}\n\nCheckpoint salvo - use 'Retomar' para continuar")
+            self.log_message(f"❌ Erro ao processar {file_name}: {str(e)}", "ERROR")
+            success = False
             
         finally:
-            # Restaura interface
-            self.processing = False
-            self.start_button.config(state=NORMAL)
-            self.resume_button.config(state=NORMAL if self.has_checkpoint() else DISABLED)
-            self.stop_button.config(state=DISABLED)
+            # Cópias e acertos de cache não consomem a extração adiantada
+            self.extraction_futures.pop(str(file_path), None)
+            
+        with self.stats_lock:
+            if success:
+                self.stats['success'] += 1
+            else:
+                self.stats['errors'] += 1
+        self.record_manifest_outcome(file_path, success, analysis)
+        return True
+        
+    def get_content_hash(self, file_path):
+        """Retorna o hash do conteúdo, reaproveitando o já calculado nesta execução"""
+        file_path = str(file_path)
+        content_hash = self.run_hashes.get(file_path)
+        if content_hash is None:
+            content_hash = compute_file_hash(file_path)
+            self.run_hashes[file_path] = content_hash
+        return content_hash
+        
+    def record_manifest_outcome(self, file_path, success, analysis=None):
+        """
+        Registra no manifesto o resultado do processamento do arquivo
+        
+        Arquivos organizados por palpite após falha da IA ficam como 'fallback'
+        e, como os erros, voltam no modo "apenas novos/alterados".
+        """
+        if not success:
+            outcome = 'error'
+        elif analysis and analysis.get('fonte') in ('fallback', 'fallback_local'):
+            outcome = 'fallback'
+        else:
+            outcome = 'success'
+        try:
+            self.manifest.record(str(file_path), outcome, self.get_content_hash(file_path))
+            
+            # Grava periodicamente para não perder o progresso em execuções longas
+            with self.stats_lock:
+                processed = self.stats['success'] + self.stats['errors']
+            if processed % 25 == 0:
+                self.manifest.save()
+        except Exception as e:
+            self.log_message(f"⚠️ Erro ao atualizar manifesto: {e}", "WARNING")
             
     def process_single_file(self, file_path, model):
         """Processa um único arquivo"""
+        analysis = self.analyze_single_file(file_path, model)
+        if analysis is None:
+            return False
+        return self.organize_file(file_path, analysis)
+        
+    def prepare_analysis(self, file_path, model_name):
+        """
+        Etapas locais da análise: cache, extração e classificação local
+        
+        Returns:
+            Tupla (análise, contexto). A análise vem preenchida quando a IA é
+            dispensada; senão o contexto traz o trecho a enviar à IA.
+            (None, None) se o arquivo não puder ser lido.
+        """
         file_name = os.path.basename(file_path)
         file_ext = os.path.splitext(file_name)[1].lower()
         
-        # Extrai conteúdo
-        if file_ext == '.pdf':
-            content = self.extract_text_from_pdf(file_path)
-            file_type = 'PDF'
-        elif file_ext == '.ofx':
-            content = self.extract_text_from_ofx(file_path)
-            file_type = 'OFX'
-        else:
+        if file_ext not in ('.pdf', '.ofx'):
             self.log_message(f"⚠️ Tipo de arquivo não suportado: {file_ext}", "WARNING")
-            return False
+            return None, None
+        file_type = 'OFX' if file_ext == '.ofx' else 'PDF'
+        
+        # Cache persistente: mesmo conteúdo, prompt e modelo já analisados antes
+        try:
+            content_hash = self.get_content_hash(file_path)
+            cached = self.classification_cache.get(content_hash, model_name)
+        except Exception as e:
+            self.log_message(f"⚠️ Cache indisponível: {e}", "WARNING")
+            content_hash, cached = None, None
+            
+        if cached:
+            self.log_message(f"   💾 Análise encontrada no cache - IA dispensada", "INFO")
+            with self.stats_lock:
+                self.stats['cache_hits'] = self.stats.get('cache_hits', 0) + 1
+                self.stats['api_calls_saved'] = self.stats.get('api_calls_saved', 0) + 1
+            cached['fonte'] = 'cache'
+            cached['file_type'] = file_type
+            return cached, None
+            
+        # Extrai conteúdo (já adiantado pelo pool de processos, se ativo)
+        content = self.take_prefetched_text(file_path)
+        if content is None:
+            if file_ext == '.pdf':
+                content = self.extract_text_from_pdf(file_path)
+            else:
+                content = self.extract_text_from_ofx(file_path)
             
         if not content:
-            self.log_message(f"❌ Não foi possível extrair conteúdo", "ERROR")
-            return False
+            if self.processing and not self.cancel_event.is_set():
+                self.log_message(f"❌ Não foi possível extrair conteúdo", "ERROR")
+            return None, None
+            
+        # Classificação local por assinaturas (CNPJ, código do banco, cabeçalhos)
+        local_result = self.local_classifier.classify(content, file_name) if self.local_classifier_enabled else None
+        if local_result and local_result['confianca'] >= self.local_confidence_threshold:
+            self.log_message(f"   🧭 Classificação local (confiança {local_result['confianca']:.0%}) - IA dispensada", "INFO")
+            with self.stats_lock:
+                self.stats['local_classified'] = self.stats.get('local_classified', 0) + 1
+                self.stats['api_calls_saved'] = self.stats.get('api_calls_saved', 0) + 1
+            local_result['file_type'] = file_type
+            return local_result, None
+            
+        # Envia à IA apenas as linhas mais informativas (banco, CNPJ, período, agência/conta)
+        return None, {
+            'file_name': file_name,
+            'file_type': file_type,
+            'content_hash': content_hash,
+            'local_result': local_result,
+            'snippet': self.local_classifier.salient_snippet(content),
+        }
+        
+    def finish_analysis(self, analysis, context, model_name):
+        """Guarda no cache a resposta da IA e completa a análise (fallback local e formato)"""
+        # Guarda no cache apenas respostas reais da IA, sob o modelo consultado na busca
+        # (respostas revistas pelo modelo avançado também são reaproveitadas)
+        if analysis.get('fonte') == 'gemini' and context['content_hash']:
+            try:
+                self.classification_cache.put(context['content_hash'], model_name, analysis)
+            except Exception as e:
+                self.log_message(f"⚠️ Erro ao gravar no cache: {e}", "WARNING")
+                
+        # Se a IA falhou, o conteúdo classificado localmente é melhor que o nome do arquivo
+        local_result = context['local_result']
+        if analysis.get('fonte') == 'fallback' and local_result:
+            self.log_message(f"   🧭 Usando classificação local (confiança {local_result['confianca']:.0%}) no lugar do fallback", "INFO")
+            analysis = dict(local_result, fonte='fallback_local')
+            
+        analysis['file_type'] = context['file_type']
+        return analysis
+        
+    def analyze_single_file(self, file_path, model):
+        """Extrai o conteúdo e analisa um único arquivo (retorna None se falhar)"""
+        model_name = getattr(model, 'model_name', str(model))
+        analysis, context = self.prepare_analysis(file_path, model_name)
+        if analysis is not None or context is None:
+            return analysis
+            
+        file_name, snippet = context['file_name'], context['snippet']
+        
+        # Analisa com IA (em lote, se ativado; falhas no lote são refeitas individualmente)
+        batcher = self.batcher
+        if batcher:
+            analysis = batcher.submit((file_name, snippet), estimate_tokens(snippet),
+                                      should_continue=lambda: self.processing)
+            if analysis is None and self.processing:
+                self.log_message(f"   ↩️ Sem resposta válida no lote - analisando {file_name} individualmente", "WARNING")
+            elif analysis is not None:
+                analysis = self.review_low_confidence(analysis, snippet, file_name)
+        if analysis is None:
+            if not self.processing:
+                return None
+            analysis = self.analyze_file_with_gemini(snippet, file_name, model)
+        if analysis is None:
+            return None
             
-        # Analisa com IA
-        analysis = self.analyze_file_with_gemini(content, file_name, model)
-        analysis['file_type'] = file_type
+        return self.finish_analysis(analysis, context, model_name)
+        
+    def organize_file(self, file_path, analysis):
+        """Copia o arquivo para a estrutura organizada conforme a análise"""
+        file_name = os.path.basename(file_path)
+        
+        # O formato vem da extensão do próprio arquivo (cópias podem ter outro nome)
+        file_ext = os.path.splitext(file_name)[1].lower()
+        analysis = dict(analysis, file_type='OFX' if file_ext == '.ofx' else 'PDF')
         
         # Cria estrutura de pastas
         destination_folder = self.create_organized_structure(analysis)
         
-        # Copia arquivo
-        copied_path = self.copy_file_to_destination(file_path, destination_folder, file_name)
+        # Copia arquivo (serializado para que a numeração de nomes repetidos não colida)
+        with self._copy_lock:
+            copied_path = self.copy_file_to_destination(file_path, destination_folder, file_name)
         
         if copied_path:
             # Atualiza estatísticas
@@ -2412,67 +5689,125 @@ class OrganizadorExtratosGUI:
             tipo_conta = analysis['tipo_conta']
             formato = analysis['file_type']
             
-            self.stats['by_bank'][banco] = self.stats['by_bank'].get(banco, 0) + 1
-            self.stats['by_month'][mes_ano] = self.stats['by_month'].get(mes_ano, 0) + 1
-            
-            # Adiciona estatísticas por tipo de conta e formato
-            if 'by_account_type' not in self.stats:
-                self.stats['by_account_type'] = {}
-            if 'by_format' not in self.stats:
-                self.stats['by_format'] = {}
+            with self.stats_lock:
+                self.stats['by_bank'][banco] = self.stats['by_bank'].get(banco, 0) + 1
+                self.stats['by_month'][mes_ano] = self.stats['by_month'].get(mes_ano, 0) + 1
                 
-            self.stats['by_account_type'][tipo_conta] = self.stats['by_account_type'].get(tipo_conta, 0) + 1
-            self.stats['by_format'][formato] = self.stats['by_format'].get(formato, 0) + 1
+                # Adiciona estatísticas por tipo de conta e formato
+                if 'by_account_type' not in self.stats:
+                    self.stats['by_account_type'] = {}
+                if 'by_format' not in self.stats:
+                    self.stats['by_format'] = {}
+                    
+                self.stats['by_account_type'][tipo_conta] = self.stats['by_account_type'].get(tipo_conta, 0) + 1
+                self.stats['by_format'][formato] = self.stats['by_format'].get(formato, 0) + 1
             
             self.log_message(f"✅ Organizado: {banco} - {mes_ano} - {tipo_conta} - {formato}", "SUCCESS")
             return True
         else:
             return False
             
-    def extract_text_from_pdf(self, file_path):
-        """Extrai texto de arquivo PDF"""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                max_pages = min(3, len(pdf_reader.pages))
-                for page_num in range(max_pages):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-                return text[:2000]
-        except Exception as e:
-            self.log_message(f"⚠️ Erro ao ler PDF: {e}", "WARNING")
-            return None
+    def extract_text_from_pdf(self, file_path, max_pages=3):
+        """Extrai texto de arquivo PDF (para assim que banco e período aparecem)"""
+        text, error = extract_pdf_text(file_path, max_pages)
+        if error:
+            self.log_message(f"⚠️ Erro ao ler PDF: {error}", "WARNING")
+        return text
             
     def extract_text_from_ofx(self, file_path):
         """Extrai texto de arquivo OFX"""
+        text, error = extract_ofx_text(file_path)
+        if error:
+            self.log_message(f"⚠️ Erro ao ler OFX: {error}", "WARNING")
+        return text
+        
+    def take_prefetched_text(self, file_path):
+        """
+        Texto já extraído pelo pool de processos
+        
+        Returns:
+            Texto ("" se a extração falhou ou o processamento foi parado) ou
+            None se o arquivo não foi adiantado
+        """
+        future = self.extraction_futures.pop(str(file_path), None)
+        if future is None:
+            return None
+        # Espera em fatias curtas: um processo travado num PDF não pode segurar o "Parar"
+        while not wait([future], timeout=0.2).done:
+            if not self.processing or self.cancel_event.is_set():
+                future.cancel()
+                return ""
+        try:
+            text, error = future.result()
+        except Exception:
+            return None  # Pool encerrado ou processo perdido: extrai na própria thread
+        if error:
+            self.log_message(f"⚠️ Erro ao ler {'OFX' if str(file_path).lower().endswith('.ofx') else 'PDF'}: {error}", "WARNING")
+        return text or ""
+        
+    def start_extraction_pool(self, file_count):
+        """Cria o pool de processos de extração (com mais de um processo configurado)"""
+        self.extraction_futures = {}
+        workers = min(self.extraction_workers, file_count)
+        if workers <= 1:
+            self.extraction_pool = None
+            return
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                content = file.read(2000)
-                return content
+            # spawn: bifurcar um processo com Tk, canais gRPC e várias threads pode travar
+            self.extraction_pool = ProcessPoolExecutor(max_workers=workers,
+                                                       mp_context=multiprocessing.get_context('spawn'))
+            self.log_message(f"🧩 Extração de texto em {workers} processo(s), adiantada em relação à análise", "INFO")
         except Exception as e:
-            self.log_message(f"⚠️ Erro ao ler OFX: {e}", "WARNING")
-            return None
-            
-    def get_next_api_key(self):
-        """Obtém a próxima chave API na rotação"""
-        if not self.api_keys:
-            return None
+            self.extraction_pool = None
+            self.log_message(f"⚠️ Pool de extração indisponível, extraindo nas threads de análise: {e}", "WARNING")
             
-        # Rotaciona para a próxima chave
-        self.current_api_index = (self.current_api_index + 1) % len(self.api_keys)
-        return self.api_keys[self.current_api_index]
+    def prefetch_extractions(self, files, upcoming, model_name, duplicates, window):
+        """
+        Mantém até `window` extrações em andamento à frente das análises
         
-    def analyze_file_with_gemini(self, file_content, file_name, model):
-        """Analisa o conteúdo do arquivo usando Gemini AI com rotação de chaves"""
-        prompt = f"""
+        Args:
+            upcoming: Iterador de índices em `files` ainda não adiantados
+            duplicates: DuplicateDetector da execução (ou None)
+        """
+        if not self.extraction_pool:
+            return
+        while self.processing and len(self.extraction_futures) < window:
+            index = next(upcoming, None)
+            if index is None:
+                return
+            file_path = str(files[index])
+            
+            # Cópias reaproveitam a análise do original e o cache dispensa a extração
+            if (duplicates and duplicates.representative_of(file_path)) or not file_path.lower().endswith(('.pdf', '.ofx')):
+                continue
+            content_hash = self.run_hashes.get(file_path)
+            if content_hash and self.classification_cache.contains(content_hash, model_name):
+                continue
+            try:
+                self.extraction_futures[file_path] = self.extraction_pool.submit(extract_file_text, file_path)
+            except Exception as e:
+                self.log_message(f"⚠️ Pool de extração encerrado: {e}", "WARNING")
+                self.extraction_pool = None
+                return
+                
+    def stop_extraction_pool(self):
+        """Encerra o pool de extração descartando o que não foi usado"""
+        pool, self.extraction_pool = self.extraction_pool, None
+        self.extraction_futures = {}
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            
+    def build_analysis_prompt(self, file_content, file_name):
+        """Monta o prompt de análise de um único extrato"""
+        return f"""
         Analise este extrato bancário e retorne APENAS um JSON válido:
         
         {{
             "banco": "CAIXA" ou "BANCO_DO_BRASIL",
             "mes": número do mês (1-12),
             "ano": ano com 4 dígitos,
-            "tipo_conta": "corrente", "poupanca" ou "investimento"
+            "tipo_conta": "corrente", "poupanca" ou "investimento",
+            "confianca": sua confiança na resposta, de 0 a 1
         }}
         
         Regras:
@@ -2481,84 +5816,546 @@ class OrganizadorExtratosGUI:
         - Para investimentos, fundos, aplicações, use "investimento"
         - Para conta corrente, use "corrente"
         - Para poupança, use "poupanca"
+        - Use confiança baixa se o trecho não deixar claro o banco, o período ou o tipo de conta
         
         Nome do arquivo: {file_name}
-        Conteúdo: {file_content[:1500]}
+        Conteúdo (trechos mais relevantes):
+        {file_content[:SNIPPET_MAX_CHARS]}
         
         Retorne APENAS o JSON:
         """
         
+    def build_repair_prompt(self, file_content, file_name, previous_reply, error):
+        """Prompt de reparo: repete o pedido mostrando a resposta inválida anterior"""
+        return self.build_analysis_prompt(file_content, file_name) + f"""
+        ATENÇÃO: sua resposta anterior foi inválida ({error}):
+        {(previous_reply or '')[:300]}
+        
+        Corrija e retorne APENAS o JSON no formato pedido:
+        """
+        
+    def analyze_file_with_gemini(self, file_content, file_name, model):
+        """
+        Analisa o conteúdo do arquivo usando Gemini AI com rotação de chaves
+        
+        Cada classe de erro tem sua política: limite/cota pausam a chave e nunca
+        gastam tentativa (o limitador aguarda a pausa), erros temporários esperam
+        com backoff exponencial e jitter, erros permanentes vão direto ao fallback
+        e respostas ilegíveis são repetidas com um prompt de reparo. Se as
+        tentativas acabarem só por problemas das chaves, retorna None e o arquivo
+        fica pendente em vez de ser organizado pelo nome.
+        """
+        prompt = self.build_analysis_prompt(file_content, file_name)
+        
         max_retries = 3
+        attempt = 0
         keys_tried = set()
+        transient_failures = 0
+        file_failures = 0  # Falhas atribuíveis ao pedido/resposta, não às chaves
+        escalation_tried = False
         
-        for attempt in range(max_retries):
+        while attempt < max_retries:
             if not self.processing:
                 break
                 
+            # Aguarda uma ficha de chave ainda não tentada (ou de qualquer uma, se todas falharam)
+            exclude = keys_tried if len(keys_tried) < len(self.run_keys) else ()
+            key_index = self.rate_limiter.acquire(exclude, should_continue=lambda: self.processing)
+            if key_index is None:
+                # Nenhuma chave utilizável: o arquivo fica pendente em vez de ser
+                # organizado só pelo nome
+                self.halt_without_keys()
+                return None
+                
+            attempt += 1
             try:
-                current_key_index = self.current_api_index + 1
-                self.log_message(f"   🤖 Tentativa {attempt + 1}/{max_retries} (Chave {current_key_index}/{len(self.api_keys)})...", "INFO")
+                self.log_message(f"   🤖 Tentativa {attempt}/{max_retries} (Chave {key_index + 1}/{len(self.run_keys)})...", "INFO")
                 
-                response = model.generate_content(prompt)
-                result_text = response.text.strip()
+                response, model_name, key_index = self.generate_hedged(key_index, prompt, ANALYSIS_GENERATION_CONFIG)
+                result_text = response.text
                 
-                # Remove marcadores de código
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
+            except RequestCancelled:
+                break
+            except Exception as e:
+                error_class = classify_api_error(e)
+                self.log_message(f"   ⚠️ Tentativa {attempt} falhou (Chave {key_index + 1}, {error_class}): {e}", "WARNING")
+                keys_tried.add(key_index)
+                
+                # Limite excedido: reduz o ritmo desta chave pela metade
+                if error_class == 'rate_limit':
+                    new_rate = self.rate_limiter.record_rate_limit(key_index)
+                    self.log_message(f"   🐢 Ritmo da chave {key_index + 1} reduzido para {new_rate:.1f} req/min", "WARNING")
+                    
+                if error_class == 'permanent' and not is_auth_error(e):
+                    # Bloqueio de segurança ou pedido inválido: repetir não resolve
+                    self.record_retry(error_class)
+                    self.log_message(f"   ⛔ Erro permanente - usando análise de fallback sem novas tentativas", "WARNING")
+                    return self.fallback_analysis(file_name)
+                    
+                if error_class in ('rate_limit', 'quota'):
+                    # Limite da chave (já pausada): volta ao limitador, que aguarda a pausa, sem gastar tentativa
+                    attempt -= 1
+                    self.record_retry(error_class)
+                    self.log_message(f"   🔄 Aguardando outra chave ou o fim da pausa...", "INFO")
+                    continue
+                    
+                if error_class == 'permanent':
+                    # Chave inválida (já pausada): outra chave ainda não tentada não gasta tentativa
+                    if len(keys_tried) < len(self.run_keys):
+                        attempt -= 1
+                        self.log_message(f"   🔄 Alternando para outra chave...", "INFO")
+                    self.record_retry('auth')
+                    continue
+                    
+                # Erro temporário: espera exponencial com jitter antes de tentar de novo
+                file_failures += 1
+                if attempt < max_retries:
+                    delay = backoff_delay(transient_failures)
+                    transient_failures += 1
+                    self.record_retry(error_class, delay)
+                    self.log_message(f"   ⏱️ Erro temporário - nova tentativa em {delay:.1f}s", "INFO")
+                    self.wait_while_processing(delay)
+                continue
                 
-                # Parse JSON
-                result = json.loads(result_text)
+            # A chave respondeu: conta como sucesso para o ritmo, mesmo que a resposta precise de correção
+            self.rate_limiter.record_success(key_index)
+            
+            # Extrai e valida o JSON (corrige variações como "Março", "24" ou "poupança")
+            try:
+                result = validate_analysis(extract_json_object(result_text))
+            except ValueError as e:
+                file_failures += 1
+                self.model_selector.record_validation(model_name, False)
+                self.log_message(f"   ⚠️ Resposta inválida (Chave {key_index + 1}): {e}", "WARNING")
                 
-                # Validação
-                required_keys = ['banco', 'mes', 'ano', 'tipo_conta']
-                if all(key in result for key in required_keys):
-                    self.log_message(f"   ✅ Análise IA bem-sucedida (Chave {current_key_index})", "SUCCESS")
-                    return result
-                else:
-                    raise ValueError("JSON incompleto")
+                # Cascata: a primeira resposta inválida vai para o modelo avançado (uma vez por
+                # arquivo); as seguintes seguem só com o prompt de reparo
+                if not escalation_tried:
+                    escalation_tried = True
+                    escalated = self.escalate_analysis(file_content, file_name, model_name)
+                    if escalated:
+                        return escalated
                     
-            except Exception as e:
-                current_key_index = self.current_api_index + 1
-                self.log_message(f"   ⚠️ Tentativa {attempt + 1} falhou (Chave {current_key_index}): {e}", "WARNING")
-                
-                # Marca esta chave como tentada
-                keys_tried.add(self.current_api_index)
-                
-                if attempt < max_retries - 1:
-                    # Tenta próxima chave se disponível
-                    if len(keys_tried) < len(self.api_keys):
-                        next_key = self.get_next_api_key()
-                        if next_key:
-                            try:
-                                genai.configure(api_key=next_key)
-                                
-                                # Tenta diferentes modelos disponíveis
-                                models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-                                model = None
-                                
-                                for model_name in models_to_try:
-                                    try:
-                                        model = genai.GenerativeModel(model_name)
-                                        # Testa o modelo
-                                        test_response = model.generate_content("OK")
-                                        if test_response:
-                                            break
-                                    except Exception:
-                                        continue
-                                
-                                if model:
-                                    self.log_message(f"   🔄 Alternando para chave {self.current_api_index + 1} (modelo: {model_name})...", "INFO")
-                                else:
-                                    self.log_message(f"   ❌ Nenhum modelo disponível para chave {self.current_api_index + 1}", "ERROR")
-                                    
-                            except Exception as config_error:
-                                self.log_message(f"   ❌ Erro ao configurar nova chave: {config_error}", "ERROR")
+                # Resposta malformada não indica problema na chave: repete já, com prompt de reparo
+                if attempt < max_retries:
+                    self.record_retry('parse')
+                    prompt = self.build_repair_prompt(file_content, file_name, result_text, e)
+                continue
+                
+            self.model_selector.record_validation(model_name, True)
+            self.log_message(f"   ✅ Análise IA bem-sucedida (Chave {key_index + 1})", "SUCCESS")
+            result['fonte'] = 'gemini'
+            result['modelo'] = model_name
+            if escalation_tried:
+                return result  # O modelo avançado já foi consultado para este arquivo
+            return self.review_low_confidence(result, file_content, file_name)
+            
+        if self.processing and not file_failures:
+            # Só as chaves falharam: o arquivo não tem culpa e não deve ser organizado pelo nome
+            self.log_message(f"   🔌 Nenhuma chave respondeu - {file_name} fica pendente para a próxima execução", "WARNING")
+            return None
+        if self.processing:
+            self.log_message(f"   🔄 Tentativas esgotadas, usando análise de fallback...", "WARNING")
+            return self.fallback_analysis(file_name)
+        return None
+        
+    def halt_without_keys(self):
+        """Interrompe a execução quando nenhuma chave pode ser usada (sem cota hoje ou removidas)"""
+        if not self.processing:
+            return
+        self.processing = False
+        self.cancel_event.set()
+        self.log_message("📉 Nenhuma chave API disponível (cota diária esgotada ou chaves removidas) - "
+                         "processamento pausado", "WARNING")
+        self.log_message("💾 Arquivos restantes ficam no checkpoint - use 'Retomar' depois", "INFO")
+        self.show_toast_notification("📉 Sem chaves disponíveis! Checkpoint salvo para retomar depois.",
+                                     "WARNING", duration=8000)
+        
+    def record_retry(self, error_class, delay=0.0):
+        """Contabiliza repetições e tempo de espera por classe de erro"""
+        with self.stats_lock:
+            retries = self.stats.setdefault('retries_by_class', {})
+            retries[error_class] = retries.get(error_class, 0) + 1
+            if delay:
+                backoff = self.stats.setdefault('backoff_by_class', {})
+                backoff[error_class] = round(backoff.get(error_class, 0.0) + delay, 2)
+                
+    def wait_while_processing(self, seconds):
+        """Aguarda o tempo indicado, retornando na hora se o processamento for parado"""
+        if self.processing:
+            self.cancel_event.wait(seconds)
+            
+    def needs_escalation(self, result, model_name):
+        """Verifica se a análise do modelo rápido deve ser revista pelo modelo avançado"""
+        return (self.cascade_enabled and not self.escalation_unavailable
+                and time.monotonic() >= self.escalation_paused_until
+                and model_name != ESCALATION_MODEL
+                and result.get('confianca', 1.0) < self.escalation_threshold)
+                
+    def review_low_confidence(self, result, file_content, file_name):
+        """Aceita a análise do modelo rápido ou a substitui pela do avançado se a confiança for baixa"""
+        if self.needs_escalation(result, result.get('modelo')):
+            self.log_message(f"   🪜 Confiança {result.get('confianca', 0):.0%} abaixo de "
+                             f"{self.escalation_threshold:.0%} - revendo com {ESCALATION_MODEL}", "INFO")
+            escalated = self.escalate_analysis(file_content, file_name, result.get('modelo'))
+            if escalated:
+                return escalated
+        elif result.get('modelo') != ESCALATION_MODEL:
+            with self.stats_lock:
+                self.stats['fast_tier_accepted'] = self.stats.get('fast_tier_accepted', 0) + 1
+        return result
+        
+    def escalate_analysis(self, file_content, file_name, fast_model):
+        """
+        Reanalisa o extrato com o modelo avançado (uma tentativa)
+        
+        Returns:
+            Análise validada ou None se a cascata estiver desativada ou falhar
+        """
+        if not self.cascade_enabled or self.escalation_unavailable or fast_model == ESCALATION_MODEL:
+            return None
+        if time.monotonic() < self.escalation_paused_until:
+            return None
+            
+        key_index = self.rate_limiter.acquire(should_continue=lambda: self.processing)
+        if key_index is None:
+            return None
+            
+        with self.stats_lock:
+            self.stats['escalations'] = self.stats.get('escalations', 0) + 1
+            
+        try:
+            response, model_name, key_index = self.generate_hedged(key_index, self.build_analysis_prompt(file_content, file_name),
+                                                                   ANALYSIS_GENERATION_CONFIG, model_name=ESCALATION_MODEL)
+            self.rate_limiter.record_success(key_index)
+            result = validate_analysis(extract_json_object(response.text))
+        except RequestCancelled:
+            return None
+        except ValueError as e:
+            # Escaladas são, por construção, os casos difíceis: ficam fora das estatísticas do seletor
+            self.log_message(f"   ⚠️ {ESCALATION_MODEL} também respondeu de forma inválida: {e}", "WARNING")
+            return None
+        except Exception as e:
+            if is_model_not_found_error(e):
+                # Sem acesso ao modelo avançado: desativa a escalada nesta execução
+                self.escalation_unavailable = True
+                self.log_message(f"   ⚠️ {ESCALATION_MODEL} indisponível - cascata desativada nesta execução", "WARNING")
+            elif classify_api_error(e) in ('rate_limit', 'quota'):
+                # Limite do modelo avançado: pausa só a cascata, a chave segue no modelo rápido
+                pause = (KeyHealthPool.QUOTA_COOLDOWN if classify_api_error(e) == 'quota'
+                         else retry_after_seconds(e) or KeyHealthPool.BASE_COOLDOWN)
+                self.escalation_paused_until = time.monotonic() + pause
+                self.log_message(f"   ⏸️ {ESCALATION_MODEL} no limite - cascata em pausa por {pause:.0f}s", "WARNING")
+            else:
+                self.log_message(f"   ⚠️ Falha ao escalar para {ESCALATION_MODEL}: {e}", "WARNING")
+            return None
+            
+        self.log_message(f"   ✅ Análise revista por {ESCALATION_MODEL} (Chave {key_index + 1})", "SUCCESS")
+        result['fonte'] = 'gemini'
+        result['modelo'] = model_name
+        return result
                     
-                    self.log_message(f"   ⏱️ Aguardando 5 segundos...", "INFO")
-                    time.sleep(5)
+    def analyze_batch_with_gemini(self, items):
+        """
+        Analisa vários extratos numa única requisição
+        
+        Args:
+            items: Lista de tuplas (nome do arquivo, conteúdo)
+            
+        Returns:
+            Lista alinhada com os itens: análise validada ou None para os que falharam
+        """
+        documents = "\n".join(
+            f"--- DOCUMENTO {position} ---\nNome do arquivo: {file_name}\nConteúdo (trechos mais relevantes):\n{content[:SNIPPET_MAX_CHARS]}\n"
+            for position, (file_name, content) in enumerate(items, 1)
+        )
+        prompt = f"""
+        Analise cada extrato bancário abaixo e retorne APENAS uma lista JSON válida,
+        com um objeto por documento, na forma:
+        
+        [{{"id": "número do documento", "banco": "CAIXA" ou "BANCO_DO_BRASIL",
+          "mes": número do mês (1-12), "ano": ano com 4 dígitos,
+          "tipo_conta": "corrente", "poupanca" ou "investimento",
+          "confianca": sua confiança na resposta, de 0 a 1}}]
+        
+        Regras:
+        - Se for Caixa Econômica Federal, use "CAIXA"
+        - Se for Banco do Brasil, use "BANCO_DO_BRASIL"
+        - Para investimentos, fundos, aplicações, use "investimento"
+        - Para conta corrente, use "corrente"
+        - Para poupança, use "poupanca"
+        - Use como "id" o número do documento
+        - Use confiança baixa se o documento não deixar claro o banco, o período ou o tipo de conta
+        
+        {documents}
+        Retorne APENAS a lista JSON:
+        """
+        
+        results = [None] * len(items)
+        key_index = self.rate_limiter.acquire(should_continue=lambda: self.processing)
+        if key_index is None:
+            return results
+            
+        self.log_message(f"   📦 Enviando lote com {len(items)} extrato(s) (Chave {key_index + 1})...", "INFO")
+        try:
+            response, model_name, key_index = self.generate_hedged(key_index, prompt, BATCH_GENERATION_CONFIG)
+            result_text = response.text
+        except RequestCancelled:
+            return results
+        except Exception as e:
+            self.log_message(f"   ⚠️ Lote falhou (Chave {key_index + 1}): {e}", "WARNING")
+            if is_rate_limit_error(e):
+                new_rate = self.rate_limiter.record_rate_limit(key_index)
+                self.log_message(f"   🐢 Ritmo da chave {key_index + 1} reduzido para {new_rate:.1f} req/min", "WARNING")
+            return results
+            
+        self.rate_limiter.record_success(key_index)
+        
+        # Mapeia cada objeto de volta ao documento pelo ID; inválidos ficam como None
+        for entry in extract_json_array(result_text) or []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                position = int(str(entry.get('id', '')).strip()) - 1
+                if not 0 <= position < len(items) or results[position] is not None:
+                    continue
+                result = validate_analysis(entry)
+            except ValueError:
+                continue
+            result.pop('id', None)
+            result['fonte'] = 'gemini'
+            result['modelo'] = model_name
+            result['lote'] = True
+            results[position] = result
+            
+        resolved = sum(1 for result in results if result is not None)
+        for result in results:
+            self.model_selector.record_validation(model_name, result is not None)
+        with self.stats_lock:
+            self.stats['batch_requests'] = self.stats.get('batch_requests', 0) + 1
+            self.stats['batched'] = self.stats.get('batched', 0) + resolved
+            self.stats['api_calls_saved'] = self.stats.get('api_calls_saved', 0) + max(0, resolved - 1)
+        self.log_message(f"   ✅ Lote analisado: {resolved}/{len(items)} extrato(s) válidos", 
+                         "SUCCESS" if resolved == len(items) else "WARNING")
+        return results
+        
+    def generate_with_key(self, key_index, prompt, generation_config=None, model_name=None):
+        """
+        Envia o prompt ao Gemini usando o cliente e o modelo resolvido da chave
+        
+        Args:
+            generation_config: Configuração de saída estruturada (usada se o modelo suportar)
+            model_name: Modelo fixo (cascata); por padrão usa o resolvido para a chave
+            
+        Returns:
+            Tupla (resposta, nome do modelo usado)
+        """
+        self.current_api_index = key_index
+        api_key = self.run_keys[key_index]
+        fixed_model = model_name is not None
+        if not fixed_model:
+            model_name = self.model_selector.choose(api_key, self.model_resolver.model_for(api_key))
+            if model_name is None:
+                raise Exception(f"404 Nenhum modelo Gemini disponível para a chave {key_index + 1}")
+        
+        while True:
+            use_schema = generation_config is not None and model_name not in self.structured_output_unsupported
+            started = time.monotonic()
+            try:
+                request_options = {'timeout': self.request_timeout}
+                if use_schema:
+                    response = self.key_pool.generate(api_key, model_name, prompt,
+                                                      generation_config=generation_config,
+                                                      request_options=request_options)
                 else:
-                    self.log_message(f"   🔄 Todas as chaves testadas, usando análise de fallback...", "WARNING")
-                    return self.fallback_analysis(file_name)
+                    response = self.key_pool.generate(api_key, model_name, prompt,
+                                                      request_options=request_options)
+            except Exception as e:
+                # Modelos antigos não aceitam saída estruturada: repete só com o prompt
+                if use_schema and is_structured_output_error(e):
+                    self.structured_output_unsupported.add(model_name)
+                    self.log_message(f"   ℹ️ {model_name} não suporta saída estruturada - usando prompt simples", "INFO")
+                    continue
                     
+                # Só troca de modelo quando a API informa que ele não existe
+                next_model = None
+                if not fixed_model and is_model_not_found_error(e):
+                    self.model_selector.mark_unavailable(api_key, model_name)
+                    if model_name == self.model_resolver.model_for(api_key):
+                        self.model_resolver.mark_not_found(api_key, model_name)
+                    next_model = self.model_selector.choose(api_key, self.model_resolver.model_for(api_key))
+                if next_model is None:
+                    # Limite de um modelo fixo (cascata) é do modelo, não da chave: quem chamou trata
+                    model_limited = fixed_model and classify_api_error(e) in ('rate_limit', 'quota')
+                    if not is_model_not_found_error(e) and not model_limited:
+                        self.record_key_failure(key_index, e)
+                    raise
+                self.log_message(f"   🔁 Modelo {model_name} indisponível (Chave {key_index + 1}) - usando {next_model}", "WARNING")
+                model_name = next_model
+                continue
+                
+            latency = time.monotonic() - started
+            usage = getattr(response, 'usage_metadata', None)
+            self.quota_ledger.record(api_key, getattr(usage, 'total_token_count', 0) or estimate_tokens(str(prompt)))
+            self.latency_tracker.record(latency)
+            if not fixed_model:
+                self.model_selector.record_latency(model_name, latency, estimate_tokens(str(prompt)))
+            self.record_tier_latency(model_name, latency)
+            if self.key_health:
+                self.key_health.record_success(key_index, latency)
+                
+            # Persiste o modelo da chave só ao confirmar o resolvido (ou ao substituir um inexistente),
+            # não a cada exploração do seletor
+            resolved = self.model_resolver.model_for(api_key)
+            if not fixed_model and (model_name == resolved or self.model_selector.is_unavailable(api_key, resolved)):
+                self.model_resolver.mark_working(api_key, model_name)
+            return response, model_name
+            
+    def generate_hedged(self, key_index, prompt, generation_config=None, model_name=None):
+        """
+        Envia o prompt numa thread própria, com prazo e cancelamento cooperativo
+        
+        Se a resposta demorar mais que o p95 recente, envia uma cópia em outra
+        chave com ficha disponível; vence a primeira resposta bem-sucedida.
+        
+        Returns:
+            Tupla (resposta, nome do modelo usado, índice da chave que respondeu)
+            
+        Raises:
+            RequestCancelled: se o processamento for interrompido
+            TimeoutError: se nenhuma resposta chegar dentro do prazo
+        """
+        outcomes = queue.Queue()
+        
+        def launch(index):
+            def call():
+                try:
+                    outcomes.put((index, self.generate_with_key(index, prompt, generation_config, model_name), None))
+                except Exception as e:
+                    outcomes.put((index, None, e))
+            threading.Thread(target=call, daemon=True, name=f"requisicao-{index + 1}").start()
+            
+        started = time.monotonic()
+        deadline = started + self.request_timeout
+        hedge_at = None
+        if self.hedging_enabled and len(self.run_keys) > 1:
+            hedge_at = started + min(self.latency_tracker.p95(), self.request_timeout / 2)
+            
+        launch(key_index)
+        in_flight = 1
+        primary_error = None
+        
+        while True:
+            if self.cancel_event.is_set():
+                raise RequestCancelled("Processamento interrompido")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Deadline exceeded: sem resposta em {self.request_timeout}s")
+                
+            try:
+                index, outcome, error = outcomes.get(timeout=0.1)
+            except queue.Empty:
+                if hedge_at and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    backup = self.rate_limiter.try_acquire(exclude={key_index})
+                    if backup is not None:
+                        launch(backup)
+                        in_flight += 1
+                        with self.stats_lock:
+                            self.stats['hedged_requests'] = self.stats.get('hedged_requests', 0) + 1
+                        self.log_message(f"   ⚡ Chave {key_index + 1} lenta - cópia enviada pela chave {backup + 1}", "INFO")
+                continue
+                
+            if error is None:
+                if index != key_index:
+                    with self.stats_lock:
+                        self.stats['hedge_wins'] = self.stats.get('hedge_wins', 0) + 1
+                return outcome + (index,)
+                
+            in_flight -= 1
+            if index == key_index:
+                primary_error = error
+            elif is_rate_limit_error(error) and model_name is None:
+                self.rate_limiter.record_rate_limit(index)
+            if in_flight == 0:
+                raise primary_error or error
+                
+    def seed_key_health(self):
+        """Inicia a saúde das chaves a partir dos últimos testes, começando pelas que funcionaram"""
+        for key_index, api_key in enumerate(self.run_keys):
+            check = self.key_checks.get(api_key)
+            if not check:
+                continue
+            if check['ok']:
+                self.key_health.record_success(key_index, check['latency'] or 0.0)
+            elif check.get('error_class') in ('auth', 'quota'):
+                cooldown = self.key_health.record_failure(key_index, check['error_class'])
+                self.log_message(f"🔌 Chave {key_index + 1} falhou no último teste ({check['error_class']}) - "
+                                 f"em pausa por {cooldown:.0f}s", "WARNING")
+                
+    def make_key_bucket(self, key_index, rate_per_minute):
+        """Balde de fichas da chave: compartilhado entre instâncias quando possível"""
+        if self.token_store is None:
+            return TokenBucket(rate_per_minute)
+        return SharedTokenBucket(self.token_store, ModelResolver.fingerprint(self.run_keys[key_index]), rate_per_minute)
+        
+    def key_is_usable(self, key_index):
+        """Indica se a chave segue na execução e ainda tem cota diária (usado pelo limitador)"""
+        if key_index >= len(self.run_keys):
+            return False
+        api_key = self.run_keys[key_index]
+        return api_key not in self.retired_keys and not self.quota_ledger.is_exhausted(api_key)
+        
+    def attach_key_to_run(self, api_key):
+        """Inclui uma chave recém-adicionada no processamento em andamento"""
+        if not (self.processing and self.rate_limiter and self.key_health):
+            return
+        if api_key in self.run_keys:
+            # Chave removida e adicionada de novo: volta a ser usada
+            self.retired_keys.discard(api_key)
+            key_index = self.run_keys.index(api_key)
+        else:
+            # Saúde primeiro: o limitador só oferece a chave depois que ela existe nos dois
+            self.run_keys.append(api_key)
+            key_index = self.key_health.add_key()
+            self.rate_limiter.add_key()
+            check = self.key_checks.get(api_key)
+            if check and check['ok']:
+                self.key_health.record_success(key_index, check['latency'] or 0.0)
+        self.log_message(f"➕ Chave {key_index + 1} incluída no processamento em andamento - ritmo total "
+                         f"{self.rate_limiter.effective_rate():.1f} req/min", "SUCCESS")
+        self.update_rate_indicator()
+        
+    def detach_key_from_run(self, api_key):
+        """Retira uma chave removida do processamento em andamento"""
+        if not self.processing or api_key not in self.run_keys:
+            return
+        self.retired_keys.add(api_key)
+        self.log_message(f"➖ Chave {self.run_keys.index(api_key) + 1} retirada do processamento em andamento", "WARNING")
+        
+    def record_key_failure(self, key_index, error):
+        """Atualiza a saúde da chave após uma falha e informa se ela foi pausada"""
+        if not self.key_health:
+            return
+        error_class = 'auth' if is_auth_error(error) else classify_api_error(error)
+        if error_class in ('permanent', 'parse'):
+            return  # Problema do pedido, não da chave
+        if (error_class == 'quota' and key_index < len(self.run_keys)
+                and self.quota_ledger.mark_exhausted(self.run_keys[key_index], error)):
+            self.log_message(f"   📉 Chave {key_index + 1} esgotou a cota diária - pulada até a meia-noite do Pacífico", "WARNING")
+        hint = retry_after_seconds(error) if error_class == 'rate_limit' else None
+        cooldown = self.key_health.record_failure(key_index, error_class, hint)
+        if cooldown:
+            self.log_message(f"   🔌 Chave {key_index + 1} em pausa por {cooldown:.0f}s ({error_class})", "WARNING")
+            
+    def record_tier_latency(self, model_name, seconds):
+        """Contabiliza chamadas e latência por nível da cascata (rápido / avançado)"""
+        tier = 'avancado' if model_name == ESCALATION_MODEL else 'rapido'
+        with self.stats_lock:
+            tiers = self.stats.setdefault('model_tiers', {})
+            entry = tiers.setdefault(tier, {'calls': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] = round(entry['seconds'] + seconds, 3)
+            
     def fallback_analysis(self, file_name):
         """Análise de fallback baseada no nome do arquivo"""
         file_name_lower = file_name.lower()
@@ -2604,7 +6401,8 @@ class OrganizadorExtratosGUI:
             'banco': banco,
             'mes': mes,
             'ano': ano,
-            'tipo_conta': tipo_conta
+            'tipo_conta': tipo_conta,
+            'fonte': 'fallback'
         }
         
     def create_organized_structure(self, analysis_result):
@@ -2697,6 +6495,43 @@ class OrganizadorExtratosGUI:
         self.log_message(f"❌ Erros: {self.stats['errors']}", "ERROR" if self.stats['errors'] > 0 else "INFO")
         self.log_message(f"📁 Total de arquivos: {self.stats['total_files']}", "INFO")
         
+        if self.stats.get('duplicates'):
+            self.log_message(f"♻️ Cópias idênticas reaproveitadas: {self.stats['duplicates']}", "INFO")
+        if self.stats.get('local_classified'):
+            self.log_message(f"🧭 Classificados localmente (sem IA): {self.stats['local_classified']}", "INFO")
+        if self.stats.get('cache_hits'):
+            self.log_message(f"💾 Análises reaproveitadas do cache: {self.stats['cache_hits']}", "INFO")
+        if self.stats.get('batched'):
+            self.log_message(f"📦 Classificados em lote: {self.stats['batched']} em "
+                             f"{self.stats.get('batch_requests', 0)} requisição(ões)", "INFO")
+        if self.stats.get('model_tiers'):
+            self.log_message(f"🪜 Cascata: {self.stats.get('fast_tier_accepted', 0)} aceitos no modelo rápido, "
+                             f"{self.stats.get('escalations', 0)} revistos por {ESCALATION_MODEL}", "INFO")
+            for tier, label in (('rapido', 'rápido'), ('avancado', 'avançado')):
+                entry = self.stats['model_tiers'].get(tier)
+                if entry and entry['calls']:
+                    self.log_message(f"   • Modelo {label}: {entry['calls']} chamada(s), "
+                                     f"latência média {entry['seconds'] / entry['calls']:.1f}s", "INFO")
+        model_lines = self.model_selector.summary()
+        if model_lines:
+            self.log_message("🎯 Desempenho medido por modelo:", "INFO")
+            for line in model_lines:
+                self.log_message(f"   • {line}", "INFO")
+        if self.stats.get('api_calls_saved'):
+            self.log_message(f"💸 Chamadas de API economizadas: {self.stats['api_calls_saved']}", "SUCCESS")
+        if self.stats.get('hedged_requests'):
+            self.log_message(f"⚡ Requisições lentas repetidas em outra chave: {self.stats['hedged_requests']} "
+                             f"({self.stats.get('hedge_wins', 0)} responderam primeiro)", "INFO")
+        if self.stats.get('retries_by_class'):
+            backoff = self.stats.get('backoff_by_class', {})
+            details = ", ".join(f"{error_class}: {count} ({backoff.get(error_class, 0):.0f}s de espera)"
+                                for error_class, count in sorted(self.stats['retries_by_class'].items()))
+            self.log_message(f"🔁 Repetições por classe de erro: {details}", "INFO")
+        if self.key_health:
+            self.log_message("🔑 Saúde das chaves:", "INFO")
+            for key_index in range(len(self.key_health.keys)):
+                self.log_message(f"   • Chave {key_index + 1}: {self.key_health.summary(key_index)}", "INFO")
+        
         if self.stats['by_bank']:
             self.log_message("", "INFO")
             self.log_message("📈 Por banco:", "INFO")
@@ -2739,6 +6574,14 @@ class OrganizadorExtratosGUI:
 ✅ Arquivos processados com sucesso: {self.stats['success']}
 ❌ Erros encontrados: {self.stats['errors']}
 📁 Total de arquivos: {self.stats['total_files']}
+♻️ Cópias idênticas reaproveitadas: {self.stats.get('duplicates', 0)}
+🧭 Classificados localmente (sem IA): {self.stats.get('local_classified', 0)}
+💾 Análises reaproveitadas do cache: {self.stats.get('cache_hits', 0)}
+📦 Classificados em lote: {self.stats.get('batched', 0)} em {self.stats.get('batch_requests', 0)} requisição(ões)
+🪜 Aceitos no modelo rápido: {self.stats.get('fast_tier_accepted', 0)} | Revistos por {ESCALATION_MODEL}: {self.stats.get('escalations', 0)}
+🗂️ Jobs em lote: {self.stats.get('batch_jobs', 0)} com {self.stats.get('batch_job_requests', 0)} requisição(ões)
+⚡ Requisições lentas repetidas em outra chave: {self.stats.get('hedged_requests', 0)} ({self.stats.get('hedge_wins', 0)} venceram)
+💸 Chamadas de API economizadas: {self.stats.get('api_calls_saved', 0)}
 
 📈 DISTRIBUIÇÃO POR BANCO:
 """
@@ -2762,6 +6605,12 @@ class OrganizadorExtratosGUI:
             for formato, count in self.stats['by_format'].items():
                 emoji = "📄" if formato == "PDF" else "💾"
                 stats_content += f"   {emoji} {formato}: {count} arquivos\n"
+                
+        if self.stats.get('retries_by_class'):
+            stats_content += "\n🔁 REPETIÇÕES POR CLASSE DE ERRO:\n"
+            backoff = self.stats.get('backoff_by_class', {})
+            for error_class, count in sorted(self.stats['retries_by_class'].items()):
+                stats_content += f"   • {error_class}: {count} repetição(ões), {backoff.get(error_class, 0):.1f}s de espera\n"
             
         output_path = os.path.join(self.base_directory.get(), self.output_directory.get())
         stats_content += f"\n📁 LOCALIZAÇÃO DOS ARQUIVOS ORGANIZADOS:\n{output_path}"
@@ -2854,7 +6703,7 @@ class OrganizadorExtratosGUI:
         
         for i, key in enumerate(self.api_keys):
             # Mostra apenas os primeiros e últimos caracteres da chave
-            masked_key = f"Chave {i+1}: {key[:8]}...{key[-8:]}"
+            masked_key = f"Chave {i+1}: {key[:8]}...{key[-8:]}{self.key_status_text(key)}"
             self.keys_listbox.insert(END, masked_key)
             
         # Atualiza status
@@ -2863,11 +6712,15 @@ class OrganizadorExtratosGUI:
         else:
             self.api_status_label.config(text="Nenhuma chave configurada")
             
+        # A vazão total depende do número de chaves
+        self.update_time_estimate()
+            
     def set_quick_interval(self, seconds):
         """Define um intervalo rápido usando os botões predefinidos"""
         try:
             old_interval = self.processing_interval
             self.processing_interval = seconds
+            self.apply_pacing_bounds()
             
             # Atualiza o spinbox
             if hasattr(self, 'interval_var') and self.interval_var is not None:
@@ -2910,6 +6763,7 @@ class OrganizadorExtratosGUI:
             if 1 <= new_interval <= 60:
                 old_interval = self.processing_interval
                 self.processing_interval = new_interval
+                self.apply_pacing_bounds()
                 self.save_preferences()
                 
                 # Atualiza os controles visuais
@@ -2934,7 +6788,7 @@ class OrganizadorExtratosGUI:
                 messagebox.showinfo("Intervalo Atualizado", 
                                    f"✅ Intervalo configurado para {new_interval} segundos\n"
                                    f"📊 Status: {risk}\n\n"
-                                   f"Esta configuração será aplicada no próximo processamento.")
+                                   f"O ritmo adaptativo nunca ficará abaixo deste intervalo.")
                 
             else:
                 # Reverte para valor válido
@@ -2947,6 +6801,76 @@ class OrganizadorExtratosGUI:
             messagebox.showerror("Erro", f"❌ Erro ao atualizar intervalo: {e}\n"
                                         f"Valor revertido para: {self.processing_interval} segundos")
             
+    def update_max_interval(self):
+        """Atualiza o teto do ritmo adaptativo e salva nas preferências"""
+        try:
+            new_max = self.max_interval_var.get()
+            if 1 <= new_max <= 300:
+                self.max_interval = new_max
+                self.apply_pacing_bounds()
+                self.save_preferences()
+                self.update_interval_controls()
+                self.update_time_estimate()
+            else:
+                self.max_interval_var.set(self.max_interval)
+        except Exception as e:
+            self.max_interval_var.set(self.max_interval)
+            print(f"Aviso: Erro ao atualizar intervalo máximo - {e}")
+            
+    def apply_pacing_bounds(self):
+        """Mantém piso <= teto e aplica os limites ao ritmo em andamento"""
+        if self.max_interval < self.processing_interval:
+            self.max_interval = self.processing_interval
+            if self.max_interval_var is not None:
+                self.max_interval_var.set(self.max_interval)
+                
+        if self.rate_limiter:
+            self.rate_limiter.set_bounds(60 / self.max_interval, 60 / self.processing_interval)
+            
+    def current_rate_per_minute(self):
+        """Ritmo total atual (req/min): o medido em execução ou o inicial previsto"""
+        if self.rate_limiter and self.processing:
+            return self.rate_limiter.effective_rate()
+        initial = AdaptivePacer(60 / self.max_interval, 60 / self.processing_interval).rate
+        return initial * max(1, len(self.api_keys))
+        
+    def update_time_estimate(self):
+        """Atualiza a estimativa de tempo com base no ritmo efetivo atual"""
+        if not hasattr(self, 'time_estimate_label'):
+            return
+            
+        rate = self.current_rate_per_minute()
+        file_count = len(self.scanned_files)
+        if not file_count:
+            self.time_estimate_label.config(
+                text=f"📊 Ritmo: {rate:.1f} req/min ({len(self.api_keys)} chave(s)) - escaneie os arquivos para ver o tempo estimado")
+            return
+            
+        # Pior caso: todos os arquivos precisam da IA (no modo lote, vários por requisição)
+        per_request = self.batch_size if self.batch_mode_enabled else 1
+        requests_needed = file_count / per_request
+        
+        # A cota diária restante limita quanto dá para fazer hoje
+        capacity = sum(self.quota_ledger.remaining(key) for key in self.api_keys)
+        minutes = min(requests_needed, capacity) / rate if rate else 0
+        if minutes >= 60:
+            duration = f"{int(minutes // 60)}h{int(minutes % 60):02d}min"
+        else:
+            duration = f"{max(1, round(minutes))} min"
+        text = f"📊 Estimativa: até {duration} para {file_count} arquivos a {rate:.1f} req/min"
+        if requests_needed > capacity:
+            leftover = int(file_count - capacity * per_request)
+            text += f" - cota diária restante ({capacity} req) deixa ~{leftover} arquivo(s) para depois da meia-noite do Pacífico"
+        self.time_estimate_label.config(text=text)
+            
+    def update_rate_indicator(self):
+        """Mostra o ritmo efetivo na barra de status"""
+        if hasattr(self, 'rate_label'):
+            if self.rate_limiter and self.processing:
+                self.rate_label.config(text=f"⚡ {self.rate_limiter.effective_rate():.1f} req/min")
+            else:
+                self.rate_label.config(text="")
+                
     def load_preferences(self):
         """Carrega preferências do usuário"""
         # Define valores padrão primeiro
@@ -2959,6 +6883,21 @@ class OrganizadorExtratosGUI:
                     preferences = json.load(f)
                     self.current_theme = preferences.get('theme', 'light')
                     self.processing_interval = preferences.get('processing_interval', 10)
+                    self.new_files_only = preferences.get('new_files_only', False)
+                    self.ignore_globs = preferences.get('ignore_globs', [])
+                    self.local_classifier_enabled = preferences.get('local_classifier_enabled', True)
+                    self.local_confidence_threshold = preferences.get('local_confidence_threshold', 0.8)
+                    self.max_workers = preferences.get('max_workers', 4)
+                    self.extraction_workers = preferences.get('extraction_workers', self.extraction_workers)
+                    self.batch_mode_enabled = preferences.get('batch_mode_enabled', False)
+                    self.cascade_enabled = preferences.get('cascade_enabled', True)
+                    self.escalation_threshold = preferences.get('escalation_threshold', 0.7)
+                    self.batch_size = preferences.get('batch_size', 10)
+                    self.request_timeout = preferences.get('request_timeout', 60)
+                    self.hedging_enabled = preferences.get('hedging_enabled', True)
+                    self.daily_request_limit = preferences.get('daily_request_limit', 1500)
+                    self.quota_ledger.daily_limit = self.daily_request_limit
+                    self.max_interval = max(preferences.get('max_interval', 60), self.processing_interval)
                     
         except Exception as e:
             print(f"Aviso: Usando configurações padrão - {e}")
@@ -2972,6 +6911,8 @@ class OrganizadorExtratosGUI:
             # Atualiza o spinbox se já foi criado
             if hasattr(self, 'interval_var') and self.interval_var is not None:
                 self.interval_var.set(self.processing_interval)
+            if hasattr(self, 'max_interval_var') and self.max_interval_var is not None:
+                self.max_interval_var.set(self.max_interval)
             
             # Atualiza o status se já foi criado
             if hasattr(self, 'interval_status_label'):
@@ -2987,7 +6928,7 @@ class OrganizadorExtratosGUI:
                     risk = "MUITO SEGURO"
                 
                 self.interval_status_label.config(
-                    text=f"🔧 Intervalo atual: {self.processing_interval} segundos ({risk})",
+                    text=f"🔧 Intervalo por chave: {self.processing_interval}s a {self.max_interval}s ({risk})",
                     fg=color
                 )
         except Exception as e:
@@ -2998,7 +6939,21 @@ class OrganizadorExtratosGUI:
         try:
             preferences = {
                 'theme': self.current_theme,
-                'processing_interval': self.processing_interval
+                'processing_interval': self.processing_interval,
+                'new_files_only': self.new_files_only,
+                'ignore_globs': self.ignore_globs,
+                'local_classifier_enabled': self.local_classifier_enabled,
+                'local_confidence_threshold': self.local_confidence_threshold,
+                'max_workers': self.max_workers,
+                'extraction_workers': self.extraction_workers,
+                'batch_mode_enabled': self.batch_mode_enabled,
+                'cascade_enabled': self.cascade_enabled,
+                'escalation_threshold': self.escalation_threshold,
+                'batch_size': self.batch_size,
+                'request_timeout': self.request_timeout,
+                'hedging_enabled': self.hedging_enabled,
+                'daily_request_limit': self.daily_request_limit,
+                'max_interval': self.max_interval
             }
             with open(self.preferences_file, 'w', encoding='utf-8') as f:
                 json.dump(preferences, f, indent=2)
@@ -3179,7 +7134,21 @@ class OrganizadorExtratosGUI:
             # Se houver erro ao obter filhos, continua
             pass
         
-    def save_checkpoint(self, files, current_index, stats):
+    def save_progress_checkpoint(self, files, done, start_index=0):
+        """
+        Salva o checkpoint a partir dos índices concluídos no processamento concorrente
+        
+        O índice atual é o primeiro arquivo ainda não concluído; os concluídos
+        depois dele ficam em 'completed' para não serem reprocessados.
+        """
+        current_index = start_index
+        while current_index in done:
+            current_index += 1
+        completed = sorted(i for i in done if i > current_index)
+        with self.stats_lock:
+            self.save_checkpoint(files, current_index, self.stats, completed)
+            
+    def save_checkpoint(self, files, current_index, stats, completed=None):
         """Salva o checkpoint do processamento"""
         try:
             checkpoint_data = {
@@ -3187,6 +7156,7 @@ class OrganizadorExtratosGUI:
                 'base_directory': self.base_directory.get(),
                 'output_directory': self.output_directory.get(),
                 'current_index': current_index,
+                'completed': completed or [],
                 'total_files': len(files),
                 'files': [str(f) for f in files],
                 'stats': stats,
@@ -3213,7 +7183,9 @@ class OrganizadorExtratosGUI:
     def has_checkpoint(self):
         """Verifica se existe um checkpoint válido"""
         checkpoint_data = self.load_checkpoint()
-        return checkpoint_data is not None and checkpoint_data.get('current_index', 0) > 0
+        # Com análises simultâneas, arquivos posteriores podem terminar antes do primeiro
+        return checkpoint_data is not None and (checkpoint_data.get('current_index', 0) > 0
+                                                or bool(checkpoint_data.get('completed')))
         
     def view_checkpoint(self):
         """Exibe os detalhes do checkpoint atual"""
@@ -3355,6 +7327,21 @@ class OrganizadorExtratosGUI:
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao remover checkpoint: {e}")
             
+    def clear_classification_cache(self):
+        """Remove todas as análises guardadas no cache da IA"""
+        if self.processing:
+            messagebox.showwarning("Aviso", "Aguarde o fim do processamento para limpar o cache!")
+            return
+            
+        try:
+            count = self.classification_cache.count()
+            if messagebox.askyesno("Confirmar", f"Remover {count} análise(s) do cache da IA?"):
+                self.classification_cache.clear()
+                self.log_message("🧹 Cache de análises removido", "INFO")
+                self.show_toast_notification(f"🧹 Cache da IA limpo ({count} análises)", "INFO")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao limpar cache: {e}")
+            
     def check_for_checkpoint(self):
         """Verifica se há checkpoint ao iniciar o programa"""
         if self.has_checkpoint():
@@ -3362,6 +7349,7 @@ class OrganizadorExtratosGUI:
             if checkpoint_data:
                 current_index = checkpoint_data.get('current_index', 0)
                 total_files = checkpoint_data.get('total_files', 0)
+                done_files = current_index + len(checkpoint_data.get('completed', []))
                 timestamp = checkpoint_data.get('timestamp', 'Desconhecido')
                 
                 self.resume_button.config(state=NORMAL)
@@ -3373,7 +7361,7 @@ class OrganizadorExtratosGUI:
                     f"Encontrado processamento interrompido:\n\n"
                     f"📅 Data: {timestamp[:19].replace('T', ' ')}\n"
                     f"📄 Parou no arquivo: {current_index + 1}/{total_files}\n"
-                    f"📊 Progresso: {(current_index/total_files)*100:.1f}%\n\n"
+                    f"📊 Progresso: {(done_files/total_files)*100:.1f}%\n\n"
                     f"Deseja retomar automaticamente?"
                 )
                 
@@ -3410,6 +7398,7 @@ class OrganizadorExtratosGUI:
             return
             
         # Configura interface para processamento
+        self.cancel_event.clear()
         self.processing = True
         self.start_button.config(state=DISABLED)
         self.resume_button.config(state=DISABLED)
@@ -3417,7 +7406,7 @@ class OrganizadorExtratosGUI:
         self.notebook.select(1)
         
         # Inicia thread de processamento do checkpoint
-        self.processing_thread = threading.Thread(target=self.process_files, args=(files, start_index))
+        self.processing_thread = threading.Thread(target=self.process_files, args=(files, start_index, True))
         self.processing_thread.daemon = True
         self.processing_thread.start()
         
@@ -3436,4 +7425,5 @@ def main():
         messagebox.showerror("Erro Fatal", f"Erro inesperado:\n{str(e)}")
         
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Pool de extração no executável empacotado (Windows)
     main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🗂️ Teste do Cliente de Jobs em Lote
+Verificação do GeminiBatchJobClient contra um servidor local (stub)
+
+Sobe um servidor HTTP que imita a API de arquivos e a de jobs em lote e
+confere o upload do JSONL (upload_jsonl), o envio (submit), a consulta
+(get), a leitura das respostas (results_of) e o tratamento de um job que
+falhou. Não usa chave real nem acessa a internet.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from organizador_extratos_gui import GeminiBatchJobClient
+
+
+class StubBatchAPI(BaseHTTPRequestHandler):
+    """Imita a API: o job 1 termina com sucesso na segunda consulta, o job 2 falha"""
+    
+    files = {}
+    jobs = {}
+    
+    def _reply(self, status, body, headers=None, raw=None):
+        data = raw if raw is not None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        
+    def do_POST(self):
+        if self.headers.get('x-goog-api-key') != 'CHAVE_TESTE':
+            return self._reply(403, {'error': {'message': 'API key not valid'}})
+        body = self._body()
+        
+        # Upload retomável: 'start' devolve o endereço, 'upload, finalize' recebe o conteúdo
+        if self.path == '/upload/v1beta/files':
+            if self.headers.get('X-Goog-Upload-Command') != 'start':
+                return self._reply(400, {'error': {'message': 'comando de upload inválido'}})
+            name = f"files/entrada{len(self.files) + 1}"
+            self.files[name] = None
+            return self._reply(200, {}, {'X-Goog-Upload-URL': f"http://{self.headers['Host']}/sessao/{name}"})
+        if self.path.startswith('/sessao/'):
+            name = self.path[len('/sessao/'):]
+            self.files[name] = body.decode('utf-8')
+            return self._reply(200, {'file': {'name': name}})
+            
+        request = json.loads(body)
+        input_file = request['batch']['input_config']['file_name']
+        lines = [json.loads(line) for line in self.files[input_file].splitlines() if line.strip()]
+        name = f"batches/{len(self.jobs) + 1}"
+        self.jobs[name] = {'lines': lines, 'polls': 0}
+        self._reply(200, {'name': name, 'metadata': {'state': 'BATCH_STATE_PENDING'}})
+        
+    def do_GET(self):
+        path = self.path.lstrip('/')
+        if path.startswith('download/v1beta/'):
+            name = path[len('download/v1beta/'):].split(':download')[0]
+            return self._reply(200, None, raw=self.files[name].encode('utf-8'))
+            
+        job = self.jobs.get(path.split('/', 1)[1] if path.startswith('v1beta/') else path)
+        if job is None:
+            return self._reply(404, {'error': {'message': 'not found'}})
+        name = path.split('/', 1)[1]
+        job['polls'] += 1
+        if job['polls'] < 2:
+            return self._reply(200, {'name': name, 'metadata': {'state': 'BATCH_STATE_RUNNING'}})
+        if name == 'batches/2':
+            return self._reply(200, {'name': name, 'done': True, 'metadata': {'state': 'BATCH_STATE_FAILED'},
+                                     'error': {'message': 'Falha simulada'}})
+                                     
+        # Respostas num arquivo JSONL, como nos jobs criados a partir de arquivo
+        output = f"files/saida{name.rsplit('/', 1)[1]}"
+        self.files[output] = "".join(json.dumps({
+            'key': line['key'],
+            'response': {'candidates': [{'content': {'parts': [{'text': '{"banco": "CAIXA"}'}]}}]},
+        }) + "\n" for line in job['lines'])
+        self._reply(200, {'name': name, 'done': True, 'metadata': {'state': 'BATCH_STATE_SUCCEEDED'},
+                          'response': {'responsesFile': output}})
+        
+    def log_message(self, *args):
+        pass  # Silencia o log do servidor
+
+
+def check(description, condition):
+    print(f"{'✅' if condition else '❌'} {description}")
+    return condition
+
+
+def main():
+    """Executa as verificações e retorna 0 se todas passarem"""
+    server = HTTPServer(('127.0.0.1', 0), StubBatchAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}/v1beta"
+    print(f"🗂️ Servidor de teste em {endpoint}")
+    
+    client = GeminiBatchJobClient('CHAVE_TESTE', endpoint=endpoint, timeout=5)
+    job_file = os.path.join(tempfile.mkdtemp(), 'job_teste.jsonl')
+    with open(job_file, 'w', encoding='utf-8') as f:
+        for i in (1, 2):
+            f.write(json.dumps({'key': str(i), 'request': GeminiBatchJobClient.build_request(f"prompt {i}")}) + "\n")
+            
+    results = []
+    try:
+        # Job com sucesso
+        input_file = client.upload_jsonl(job_file, 'job_teste.jsonl')
+        results.append(check("upload_jsonl retorna o nome do arquivo", input_file == 'files/entrada1'))
+        name = client.submit('gemini-1.5-flash', input_file, 'job_teste.jsonl')
+        results.append(check("submit retorna o nome do job", name == 'batches/1'))
+        
+        running = client.get(name)
+        state, done = GeminiBatchJobClient.state_of(running)
+        results.append(check(f"get de job em andamento ({state}) não termina", not done))
+        
+        finished = client.get(name)
+        results.append(check("job concluído é reconhecido como sucesso", GeminiBatchJobClient.succeeded(finished)))
+        answers = client.results_of(finished)
+        results.append(check("results_of baixa as respostas e casa pelas chaves",
+                             answers == {'1': '{"banco": "CAIXA"}', '2': '{"banco": "CAIXA"}'}))
+        
+        # Job que falhou: não pode ser tratado como sucesso
+        failed_name = client.submit('gemini-1.5-flash', client.upload_jsonl(job_file, 'job_falha.jsonl'),
+                                    'job_falha.jsonl')
+        client.get(failed_name)
+        failed = client.get(failed_name)
+        results.append(check("job que falhou não é sucesso", not GeminiBatchJobClient.succeeded(failed)))
+        results.append(check("erro do job é informado", GeminiBatchJobClient.error_of(failed) == 'Falha simulada'))
+        
+        # Chave recusada pelo servidor
+        try:
+            GeminiBatchJobClient('CHAVE_ERRADA', endpoint=endpoint, timeout=5).upload_jsonl(job_file, 'x')
+            results.append(check("chave inválida gera erro", False))
+        except RuntimeError as e:
+            results.append(check("chave inválida gera erro", str(e).startswith('403')))
+    finally:
+        server.shutdown()
+        
+    print(f"\n{'🎉 Todas as verificações passaram' if all(results) else '❌ Há verificações com falha'}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())